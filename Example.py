@@ -1,8 +1,7 @@
 # proposal_generator.py
 # Complete PowerPoint Proposal Automation with Dual Image Editor
 
-from flask import Flask, render_template, request, send_file, redirect, url_for, flash, jsonify
-from pptx import Presentation
+from flask import Flask, Response, render_template, request, send_file, redirect, url_for, flash, jsonify
 from pptx.util import Cm
 import os
 import webbrowser
@@ -13,13 +12,39 @@ import sys
 from PIL import Image, ImageOps
 import io
 import base64
-import uuid
 import json
+from contextlib import nullcontext
+
+from cpu_profile import sample_cpu_profile
+from image_pipeline import (
+    IMAGE_DPI, IMAGE_EMBED_MODE, IMAGE_SPOOL_TO_DISK, add_placeholder_picture, cm_to_px, discard_image,
+    image_size_bytes, placeholder_pixel_size, resize_to_stream, source_crop, spool_to_disk
+)
+from memory_profile import MemoryProfile, ProfileBusy, log_memory_report, memory_mark
+from package_writer import save_presentation
+from prepared_images import get_prepared_images
+from progress_events import as_reporter
+from proposal_log import get_logger, is_debug, redact
+from proposal_metrics import StageTimings, as_timings, get_metrics
+from proposal_jobs import JobQueueFull, get_proposal_jobs
+from result_cache import get_result_cache
+from template_index import compile_template
+from text_substitution import PlaceholderSubstituter
+from upload_store import get_upload_store
+
+log = get_logger('Example')
 
 # Configuration
 TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "FTP_Template.pptx")
 OUTPUT_FOLDER = "generated_proposals"
 TEMP_IMAGES_FOLDER = "temp_images"
+JOBS_FOLDER = os.path.join(OUTPUT_FOLDER, "jobs")
+
+# Requests sending this header with value 1 are profiled stage by stage with
+# tracemalloc; only honoured when PROPOSAL_ALLOW_MEMORY_PROFILE=1, since
+# tracing slows the generation down considerably
+MEMORY_PROFILE_HEADER = 'X-Profile-Memory'
+ALLOW_MEMORY_PROFILE = os.environ.get('PROPOSAL_ALLOW_MEMORY_PROFILE', '') == '1'
 
 # Ensure folders exist
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
@@ -28,9 +53,11 @@ os.makedirs(TEMP_IMAGES_FOLDER, exist_ok=True)
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['MAX_FORM_MEMORY_SIZE'] = 50 * 1024 * 1024  # base64 image fields (compatibility path)
 app.config['UPLOAD_FOLDER'] = TEMP_IMAGES_FOLDER
 
-# Image dimensions (matching your PowerPoint template)
+# Image dimensions, used only when the template has no IMG_PLACEHOLDER/IMG_PLACEHOLDER2
+# shape to read the real size from
 # First image
 TARGET_WIDTH_CM = 19.05
 TARGET_HEIGHT_CM = 10.79
@@ -39,14 +66,40 @@ TARGET_HEIGHT_CM = 10.79
 TARGET_WIDTH_CM_2 = 17.69
 TARGET_HEIGHT_CM_2 = 11.38
 
-def replace_placeholders_and_images_in_pptx(template_path, form_data, image_path, image_path_2, output_path):
+def replace_placeholders_and_images_in_pptx(template_path, form_data, image_path, image_path_2, output_path, progress=None, timings=None):
     """
     Replace placeholders and images in PowerPoint template while preserving formatting
     Now handles both IMG_PLACEHOLDER and IMG_PLACEHOLDER2
+    progress is an optional callback receiving progress event dicts (see progress_events)
+    timings is an optional StageTimings the time of each stage is added to
     """
+    report = as_reporter(progress)
+    timings = as_timings(timings, 'Example')
     try:
-        # Load the PowerPoint template
-        prs = Presentation(template_path)
+        # Load the PowerPoint template from its compiled index
+        result_cache = get_result_cache()
+        compiled = compile_template(template_path)
+        timings.lap('template_load')
+        
+        # Identical template, form data and images produce the same proposal
+        if result_cache is not None:
+            result_key = result_cache.make_key(
+                compiled.digest, 'replace_placeholders_and_images_in_pptx', form_data,
+                {'IMG_PLACEHOLDER': image_path, 'IMG_PLACEHOLDER2': image_path_2}
+            )
+            hit = result_cache.fetch(compiled.digest, result_key, output_path)
+            timings.lap('result_cache')
+            if hit:
+                log.info("♻️ Result cache hit, reused cached proposal for %s", output_path)
+                report('result_cache_hit')
+                report('done', bytes=os.path.getsize(output_path))
+                get_metrics().observe('proposal_output_bytes', os.path.getsize(output_path), engine=timings.engine)
+                return True, "Proposal generated successfully with preserved formatting and proper image layering!"
+        
+        prs = compiled.open()
+        shapes = compiled.resolve_shapes(prs)
+        timings.lap('template_load')
+        report('template_loaded', slides=len(prs.slides))
         
         # Text replacement mapping
         replacements = {
@@ -73,147 +126,71 @@ def replace_placeholders_and_images_in_pptx(template_path, form_data, image_path
             '{{NETWORKSTRENGTH}}': form_data.get('network_strength', '')
         }
         
-        # Process all slides for text replacement and image insertion
-        for slide_num, slide in enumerate(prs.slides):
-            # First pass: Handle text replacement
-            for shape in slide.shapes:
-                # Handle text frames (preserves formatting)
-                if hasattr(shape, "text_frame"):
-                    text_frame = shape.text_frame
-                    
-                    for paragraph in text_frame.paragraphs:
-                        for run in paragraph.runs:
-                            original_text = run.text
-                            new_text = original_text
-                            
-                            # Replace placeholders
-                            for placeholder, value in replacements.items():
-                                if placeholder in new_text:
-                                    new_text = new_text.replace(placeholder, value)
-                                    print(f"Replaced '{placeholder}' with '{value}' on slide {slide_num + 1}")
-                            
-                            if new_text != original_text:
-                                run.text = new_text
+        # Slides whose XML changes; every other part is copied raw on save
+        touched_slides = set()
+        
+        # Text replacement only visits runs the index recorded (text frames and tables)
+        substituter = PlaceholderSubstituter(replacements)
+        text_replacements_made = 0
+        for location, run in compiled.iter_runs(shapes):
+            # Replace all placeholders in one scan of the run
+            new_text, hits = substituter.substitute(run.text)
+            if hits and is_debug(log):
+                for placeholder in hits:
+                    log.debug("📝 Replaced '%s' on slide %d", placeholder, location['slide'] + 1)
+            
+            if hits:
+                run.text = new_text
+                text_replacements_made += len(hits)
+                touched_slides.add(location['slide'])
+        substituter.report_unknown()
+        timings.lap('text_replace')
+        report('text_replaced', replacements=text_replacements_made, slides=len(touched_slides))
+        
+        # Image replacement (after text to avoid interfering with indexing)
+        for placeholder_name, placeholder_image in (('IMG_PLACEHOLDER', image_path), ('IMG_PLACEHOLDER2', image_path_2)):
+            if not placeholder_image:
+                continue
+            
+            for location in compiled.named_shapes.get(placeholder_name, []):
+                slide = prs.slides[location['slide']]
                 
-                # Handle direct text (legacy support)
-                elif hasattr(shape, "text"):
-                    original_text = shape.text
-                    new_text = original_text
-                    
-                    for placeholder, value in replacements.items():
-                        if placeholder in new_text:
-                            new_text = new_text.replace(placeholder, value)
-                    
-                    if new_text != original_text:
-                        shape.text = new_text
-            
-            # Second pass: Handle image replacement (after text to avoid interfering with indexing)
-            shapes_to_remove = []
-            image_positions = []
-            image_positions_2 = []
-            
-            for shape_idx, shape in enumerate(slide.shapes):
-                # Handle first image placeholder
-                if hasattr(shape, 'name') and shape.name == 'IMG_PLACEHOLDER' and image_path:
-                    # Store the shape's position and properties
-                    image_positions.append({
-                        'left': shape.left,
-                        'top': shape.top,
-                        'width': shape.width,
-                        'height': shape.height,
-                        'slide': slide,
-                        'shape_idx': shape_idx
-                    })
-                    shapes_to_remove.append(shape)
+                # Mark the slide before changing it, so it is never copied raw from the template
+                touched_slides.add(location['slide'])
+                
+                # Remove placeholder shape
+                slide.shapes._spTree.remove(shapes[location['slide']][location['shape']]._element)
                 
-                # Handle second image placeholder
-                elif hasattr(shape, 'name') and shape.name == 'IMG_PLACEHOLDER2' and image_path_2:
-                    # Store the shape's position and properties
-                    image_positions_2.append({
-                        'left': shape.left,
-                        'top': shape.top,
-                        'width': shape.width,
-                        'height': shape.height,
-                        'slide': slide,
-                        'shape_idx': shape_idx
-                    })
-                    shapes_to_remove.append(shape)
-            
-            # Remove placeholder shapes (in reverse order to maintain indexing)
-            for shape in reversed(shapes_to_remove):
-                slide.shapes._spTree.remove(shape._element)
-            
-            # Add first images at the stored positions
-            for pos_info in image_positions:
-                try:
-                    # Add the new image
-                    new_picture = pos_info['slide'].shapes.add_picture(
-                        image_path, 
-                        pos_info['left'], 
-                        pos_info['top'], 
-                        pos_info['width'], 
-                        pos_info['height']
-                    )
-                    
-                    # Send image to back (behind all other elements)
-                    # Get the shape element
-                    pic_element = new_picture._element
-                    
-                    # Move to the beginning of the shape tree (sends to back)
-                    spTree = pos_info['slide'].shapes._spTree
-                    spTree.insert(2, pic_element)  # Position 2 is behind most content but after background
-                    
-                    print(f"✅ Inserted IMG_PLACEHOLDER on slide {slide_num + 1}")
-                    
-                except Exception as img_error:
-                    print(f"❌ Could not insert IMG_PLACEHOLDER on slide {slide_num + 1}: {img_error}")
-            
-            # Add second images at the stored positions
-            for pos_info in image_positions_2:
                 try:
-                    # Add the new image
-                    new_picture = pos_info['slide'].shapes.add_picture(
-                        image_path_2, 
-                        pos_info['left'], 
-                        pos_info['top'], 
-                        pos_info['width'], 
-                        pos_info['height']
-                    )
+                    # Add the new image (cropped through srcRect when given a source_crop)
+                    new_picture = add_placeholder_picture(slide.shapes, placeholder_image, location)
                     
                     # Send image to back (behind all other elements)
                     # Get the shape element
                     pic_element = new_picture._element
                     
                     # Move to the beginning of the shape tree (sends to back)
-                    spTree = pos_info['slide'].shapes._spTree
+                    spTree = slide.shapes._spTree
                     spTree.insert(2, pic_element)  # Position 2 is behind most content but after background
                     
-                    print(f"✅ Inserted IMG_PLACEHOLDER2 on slide {slide_num + 1}")
+                    log.debug("✅ Inserted %s on slide %d", placeholder_name, location['slide'] + 1)
+                    report('slide_filled', slide=location['slide'] + 1, placeholder=placeholder_name)
                     
                 except Exception as img_error:
-                    print(f"❌ Could not insert IMG_PLACEHOLDER2 on slide {slide_num + 1}: {img_error}")
-        
-        # Process tables for text replacement
-        for slide_num, slide in enumerate(prs.slides):
-            for shape in slide.shapes:
-                if shape.has_table:
-                    table = shape.table
-                    for row in table.rows:
-                        for cell in row.cells:
-                            for paragraph in cell.text_frame.paragraphs:
-                                for run in paragraph.runs:
-                                    original_text = run.text
-                                    new_text = original_text
-                                    
-                                    for placeholder, value in replacements.items():
-                                        if placeholder in new_text:
-                                            new_text = new_text.replace(placeholder, value)
-                                    
-                                    if new_text != original_text:
-                                        run.text = new_text
+                    log.error("❌ Could not insert %s on slide %d: %s", placeholder_name, location['slide'] + 1, img_error)
+        timings.lap('image_insert')
         
         # Save the customized presentation
-        prs.save(output_path)
+        report('saving', slides=len(touched_slides))
+        save_stats = save_presentation(prs, compiled, output_path, touched_slides)
+        timings.lap('save')
+        report('saved', **save_stats)
+        
+        if result_cache is not None:
+            result_cache.store(compiled.digest, result_key, output_path)
+            timings.lap('result_cache')
+        get_metrics().observe('proposal_output_bytes', os.path.getsize(output_path), engine=timings.engine)
+        report('done', bytes=os.path.getsize(output_path))
         return True, "Proposal generated successfully with preserved formatting and proper image layering!"
         
     except FileNotFoundError:
@@ -221,62 +198,244 @@ def replace_placeholders_and_images_in_pptx(template_path, form_data, image_path
     except Exception as e:
         return False, f"Error generating proposal: {str(e)}"
 
+PLACEHOLDER_FALLBACK_CM = {
+    'IMG_PLACEHOLDER': (TARGET_WIDTH_CM, TARGET_HEIGHT_CM),
+    'IMG_PLACEHOLDER2': (TARGET_WIDTH_CM_2, TARGET_HEIGHT_CM_2),
+}
+
+def placeholder_target_px(placeholder_name, dpi=IMAGE_DPI):
+    """
+    Pixel size for an image placeholder, read from the shape in the template
+    Args:
+        placeholder_name: IMG_PLACEHOLDER or IMG_PLACEHOLDER2
+        dpi: Effective resolution of the image on the slide
+    Returns:
+        Tuple of (width_px, height_px)
+    """
+    try:
+        locations = compile_template(TEMPLATE_PATH).named_shapes.get(placeholder_name)
+    except OSError:
+        locations = None
+    
+    if locations:
+        return placeholder_pixel_size(locations[0], dpi)
+    
+    width_cm, height_cm = PLACEHOLDER_FALLBACK_CM[placeholder_name]
+    return cm_to_px(width_cm, dpi), cm_to_px(height_cm, dpi)
+
+def decode_data_url(image_data_url):
+    """
+    Decode a base64 data URL (or bare base64 string) into image bytes
+    """
+    if ',' in image_data_url:
+        image_data = image_data_url.split(',')[1]
+    else:
+        image_data = image_data_url
+    image_bytes = base64.b64decode(image_data)
+    memory_mark('base64_decode')
+    return image_bytes
+
 def process_cropped_image(image_data_url, crop_data, image_type="1"):
     """
     Process the cropped image from the web editor
     Now supports two different image types with different dimensions
     """
     try:
-        # Decode base64 image
-        if ',' in image_data_url:
-            image_data = image_data_url.split(',')[1]
-        else:
-            image_data = image_data_url
-            
-        image_bytes = base64.b64decode(image_data)
-        
-        # Open image with PIL
-        image = Image.open(io.BytesIO(image_bytes))
+        image_bytes = decode_data_url(image_data_url)
+    except Exception as e:
+        log.error("❌ Image %s processing error: %s", image_type, e)
+        return None, f"Error processing image {image_type}: {str(e)}"
+    
+    return prepare_cropped_image(image_bytes, crop_data, image_type)
+
+def prepared_image_handle(image_id, crop_data, image_type="1"):
+    """
+    Handle of the background preparation for a stored original, placeholder and crop
+    """
+    crop_rect = [crop_data.get(key) for key in ('x', 'y', 'width', 'height')]
+    return get_prepared_images().make_handle(image_id, image_type, crop_rect, IMAGE_EMBED_MODE)
+
+def process_stored_image(image_id, crop_data, image_type="1", fallback_bytes=None):
+    """
+    Process an original previously sent to /uploads, referenced by its ID
+    Uses the result of /prepare-image when the same crop was prepared in the
+    background; falls back to fallback_bytes when the stored original is gone
+    """
+    prepared_image = get_prepared_images().take(prepared_image_handle(image_id, crop_data, image_type))
+    if prepared_image is not None:
+        log.info("⚡ Image %s was prepared in the background (%d bytes)", image_type, image_size_bytes(prepared_image))
+        return prepared_image, None
+    
+    upload_store = get_upload_store()
+    image_bytes = upload_store.get(image_id) if upload_store is not None else None
+    if image_bytes is None:
+        if fallback_bytes:
+            return prepare_cropped_image(fallback_bytes, crop_data, image_type)
+        return None, f"Uploaded image {image_type} has expired - please upload it again"
+    
+    return prepare_cropped_image(image_bytes, crop_data, image_type, source_id=image_id)
+
+def prepare_cropped_image(image_bytes, crop_data, image_type="1", source_id=None):
+    """
+    Crop and size an original image for its placeholder
+    Args:
+        image_bytes: Encoded bytes of the original image
+        crop_data: Crop rectangle (x, y, width, height) in original pixel coordinates
+        image_type: "1" for IMG_PLACEHOLDER, "2" for IMG_PLACEHOLDER2
+        source_id: Upload store ID, so the decoded original can be reused across crops
+    Returns:
+        Tuple of (prepared image, error message)
+    """
+    try:
+        # Read the header only; pixels are decoded once inside resize_to_stream
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image_width, image_height = image.size
+        get_metrics().observe_input_image('Example', len(image_bytes), image_width, image_height)
         
         # crop_data is already a dict from json.loads, no need to re-parse
         left = max(0, int(crop_data['x']))
         top = max(0, int(crop_data['y']))
-        right = min(image.width, int(crop_data['x'] + crop_data['width']))
-        bottom = min(image.height, int(crop_data['y'] + crop_data['height']))
+        right = min(image_width, int(crop_data['x'] + crop_data['width']))
+        bottom = min(image_height, int(crop_data['y'] + crop_data['height']))
         
         # Ensure we have a valid crop area
         if right <= left or bottom <= top:
             return None, "Invalid crop area - please adjust your selection"
         
-        cropped_image = image.crop((left, top, right, bottom))
+        placeholder_name = 'IMG_PLACEHOLDER2' if image_type == "2" else 'IMG_PLACEHOLDER'
         
-        # Resize to exact PowerPoint dimensions (convert cm to pixels at 300 DPI for quality)
-        # Using higher DPI for better PowerPoint quality
-        dpi = 300
+        # Embed the original once and crop it in the picture XML instead of re-encoding pixels
+        if IMAGE_EMBED_MODE == 'srcrect':
+            crop_box = (
+                max(0.0, float(crop_data['x'])),
+                max(0.0, float(crop_data['y'])),
+                min(float(image_width), float(crop_data['x']) + float(crop_data['width'])),
+                min(float(image_height), float(crop_data['y']) + float(crop_data['height'])),
+            )
+            # The picture takes the placeholder's shape, so the crop is fitted to it around its centre
+            placeholder_width_px, placeholder_height_px = placeholder_target_px(placeholder_name)
+            processed_image = source_crop(
+                image_bytes, crop_box, (image_width, image_height), aspect=placeholder_width_px / placeholder_height_px
+            )
+            log.debug("✅ Image %s cropped via srcRect: %s (%d bytes original)", image_type, processed_image['crop'], len(image_bytes))
+            return processed_image, None
         
-        # Choose dimensions based on image type
-        if image_type == "2":
-            target_width_px = int(TARGET_WIDTH_CM_2 * dpi / 2.54)  # Convert cm to pixels
-            target_height_px = int(TARGET_HEIGHT_CM_2 * dpi / 2.54)
-        else:
-            target_width_px = int(TARGET_WIDTH_CM * dpi / 2.54)  # Convert cm to pixels
-            target_height_px = int(TARGET_HEIGHT_CM * dpi / 2.54)
+        # Resize to the placeholder shape's real size at the effective DPI
+        dpi = IMAGE_DPI
+        target_width_px, target_height_px = placeholder_target_px(placeholder_name, dpi)
         
-        final_image = cropped_image.resize((target_width_px, target_height_px), Image.Resampling.LANCZOS)
+        # Crop, resize and encode in memory; the stream goes straight to add_picture
+        processed_image = resize_to_stream(
+            image_bytes, target_width_px, target_height_px, dpi=dpi, crop_box=(left, top, right, bottom),
+            source_id=source_id
+        )
         
-        # Save processed image with high quality for PowerPoint
-        temp_filename = f"processed_image_{image_type}_{uuid.uuid4().hex}.png"
-        temp_path = os.path.join(TEMP_IMAGES_FOLDER, temp_filename)
-        final_image.save(temp_path, 'PNG', optimize=True)
+        if IMAGE_SPOOL_TO_DISK:
+            processed_image = spool_to_disk(
+                processed_image, prefix=f"processed_image_{image_type}_", directory=TEMP_IMAGES_FOLDER
+            )
         
-        print(f"✅ Image {image_type} processed: {target_width_px}×{target_height_px}px saved to {temp_filename}")
+        log.debug("✅ Image %s processed: %d×%dpx (%d bytes)", image_type, target_width_px, target_height_px, image_size_bytes(processed_image))
         
-        return temp_path, None
+        return processed_image, None
         
     except Exception as e:
-        print(f"❌ Image {image_type} processing error: {str(e)}")
+        log.error("❌ Image %s processing error: %s", image_type, e)
         return None, f"Error processing image {image_type}: {str(e)}"
 
+@app.route('/uploads', methods=['POST'])
+def upload_image():
+    """
+    Store an original image once and return its ID; /generate can then refer to
+    it with just the ID and a crop rectangle
+    """
+    upload_store = get_upload_store()
+    if upload_store is None:
+        return jsonify({'error': 'Upload store is disabled'}), 503
+    
+    uploaded_file = request.files.get('image')
+    try:
+        if uploaded_file is not None:
+            image_bytes = uploaded_file.read()
+        elif request.form.get('image_data'):
+            image_bytes = decode_data_url(request.form['image_data'])
+        else:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        stored = upload_store.put(image_bytes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OSError:
+        return jsonify({'error': 'Could not store the upload'}), 507
+    
+    log.info("📥 Stored upload %s (%d×%dpx, %d bytes)", stored['image_id'][:12], stored['width'], stored['height'], stored['bytes'])
+    return jsonify(stored)
+
+@app.route('/uploads/<image_id>', methods=['GET'])
+def uploaded_image_status(image_id):
+    """
+    Report whether an original is already stored, so clients can skip re-sending it
+    """
+    upload_store = get_upload_store()
+    if upload_store is None or not upload_store.contains(image_id):
+        return jsonify({'image_id': image_id, 'stored': False}), 404
+    return jsonify({'image_id': image_id, 'stored': True})
+
+@app.route('/prepare-image', methods=['POST'])
+def prepare_image():
+    """
+    Start preparing a stored original for its placeholder as soon as its crop is
+    confirmed, so /generate only has to pick up the finished image
+    """
+    image_id = request.form.get('image_id')
+    image_type = request.form.get('image_type', '1')
+    if image_type not in ('1', '2'):
+        return jsonify({'error': 'image_type must be 1 or 2'}), 400
+    try:
+        crop_data = json.loads(request.form.get('crop_coordinates') or '')
+    except json.JSONDecodeError:
+        return jsonify({'error': 'Invalid crop coordinates'}), 400
+    
+    upload_store = get_upload_store()
+    image_bytes = upload_store.get(image_id) if upload_store is not None else None
+    if image_bytes is None:
+        return jsonify({'error': 'Unknown or expired image_id'}), 404
+    
+    handle = get_prepared_images().submit(
+        prepared_image_handle(image_id, crop_data, image_type),
+        prepare_cropped_image, image_bytes, crop_data, image_type, image_id
+    )
+    log.info("⏳ Preparing image %s from upload %s in the background (%s)", image_type, image_id[:12], handle[:12])
+    return jsonify({'handle': handle}), 202
+
+@app.route('/prepare-image/<handle>', methods=['GET'])
+def prepared_image_status(handle):
+    """
+    Report whether a background preparation is pending, ready or failed
+    """
+    status = get_prepared_images().status(handle)
+    if status is None:
+        return jsonify({'handle': handle, 'state': 'unknown'}), 404
+    return jsonify(status)
+
+@app.route('/placeholder-sizes')
+def placeholder_sizes():
+    """
+    Size and aspect ratio of each image placeholder, so the editors crop to the template,
+    and whether the editors should upload the original image instead of a cropped copy
+    """
+    sizes = {'embed_mode': IMAGE_EMBED_MODE, 'placeholders': {}}
+    for editor_num, placeholder_name in (('1', 'IMG_PLACEHOLDER'), ('2', 'IMG_PLACEHOLDER2')):
+        width_px, height_px = placeholder_target_px(placeholder_name)
+        sizes['placeholders'][editor_num] = {
+            'placeholder': placeholder_name,
+            'width_px': width_px,
+            'height_px': height_px,
+            'dpi': IMAGE_DPI,
+            'ratio': width_px / height_px,
+        }
+    return jsonify(sizes)
+
 @app.route('/')
 def index():
     """
@@ -1347,6 +1506,8 @@ def index():
                         <!-- Hidden inputs for first image -->
                         <input type="hidden" id="croppedImageData1" name="cropped_image_data">
                         <input type="hidden" id="cropCoordinates1" name="crop_coordinates">
+                        <input type="hidden" id="imageId1" name="image_id">
+                        <input type="file" id="croppedImageFile1" name="cropped_image_file" class="hidden">
                     </div>
                     
                     <!-- Second Image Section -->
@@ -1398,6 +1559,8 @@ def index():
                         <!-- Hidden inputs for second image -->
                         <input type="hidden" id="croppedImageData2" name="cropped_image_data_2">
                         <input type="hidden" id="cropCoordinates2" name="crop_coordinates_2">
+                        <input type="hidden" id="imageId2" name="image_id_2">
+                        <input type="file" id="croppedImageFile2" name="cropped_image_file_2" class="hidden">
                     </div>
                 </div>
             </div>
@@ -1429,6 +1592,9 @@ def index():
             }
         };
         
+        // 'srcrect' uploads the whole image and lets the server crop it in the slide XML
+        let embedMode = 'pixels';
+        
         document.addEventListener('DOMContentLoaded', function() {
             // Set default dates
             document.getElementById('prepared_date').valueAsDate = new Date();
@@ -1438,6 +1604,24 @@ def index():
                 initializeEditor(i);
             }
             
+            // Match the crop frames to the placeholder shapes in the template
+            fetch('/placeholder-sizes')
+                .then(response => response.json())
+                .then(sizes => {
+                    embedMode = sizes.embed_mode;
+                    for (const [key, size] of Object.entries(sizes.placeholders)) {
+                        const editorNum = Number(key);
+                        const editor = editors[editorNum];
+                        editor.TARGET_RATIO = size.ratio;
+                        editor.FRAME_HEIGHT = Math.round(editor.FRAME_WIDTH / size.ratio);
+                        if (editor.currentImage) {
+                            redrawCanvas(editorNum);
+                            updateCropData(editorNum);
+                        }
+                    }
+                })
+                .catch(error => console.warn('Using default placeholder sizes:', error));
+            
             // Initialize step progress
             updateStepProgress();
         });
@@ -1566,6 +1750,7 @@ def index():
                             compressedImage.onload = function() {
                                 editor.originalImage = compressedImage;
                                 editor.currentImage = compressedImage;
+                                uploadOriginal(editorNum);
                                 showProgress(100, 'Ready!', editorNum);
                                 setTimeout(() => {
                                     hideProgress(editorNum);
@@ -1576,6 +1761,7 @@ def index():
                         } else {
                             editor.originalImage = img;
                             editor.currentImage = img;
+                            uploadOriginal(editorNum);
                             showProgress(100, 'Ready!', editorNum);
                             setTimeout(() => {
                                 hideProgress(editorNum);
@@ -1589,6 +1775,43 @@ def index():
             reader.readAsDataURL(file);
         }
         
+        // Store the image being edited on the server once; the form then only sends its ID and crop
+        async function uploadOriginal(editorNum) {
+            const editor = editors[editorNum];
+            const image = editor.currentImage;
+            editor.imageId = null;
+            document.getElementById(`imageId${editorNum}`).value = '';
+            
+            try {
+                const blob = await (await fetch(image.src)).blob();
+                
+                // Skip the upload when the server already has these exact bytes
+                let imageId = null;
+                if (window.crypto && crypto.subtle) {
+                    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+                    const hexDigest = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+                    const status = await fetch(`/uploads/${hexDigest}`);
+                    if (status.ok) imageId = hexDigest;
+                }
+                
+                if (!imageId) {
+                    const formData = new FormData();
+                    formData.append('image', blob, `image${editorNum}`);
+                    const response = await fetch('/uploads', { method: 'POST', body: formData });
+                    if (!response.ok) throw new Error(`upload failed with status ${response.status}`);
+                    imageId = (await response.json()).image_id;
+                }
+                
+                // Ignore results for an image that has since been replaced
+                if (editor.currentImage !== image) return;
+                editor.imageId = imageId;
+                document.getElementById(`imageId${editorNum}`).value = imageId;
+                updateCropData(editorNum);
+            } catch (error) {
+                console.warn(`Image ${editorNum} will be sent with the form instead:`, error);
+            }
+        }
+        
         function showProgress(percentage, text, editorNum) {
             document.getElementById(`uploadProgress${editorNum}`).style.display = 'block';
             document.getElementById(`progressBar${editorNum}`).style.width = percentage + '%';
@@ -1749,8 +1972,39 @@ def index():
                 `${cropX.toFixed(1)}, ${cropY.toFixed(1)}, ${cropWidth.toFixed(1)}×${cropHeight.toFixed(1)}`;
         }
         
+        // Once the crop has settled, have the server prepare the stored image in the
+        // background so generating the proposal only assembles finished images
+        const prepareTimers = {};
+        function schedulePrepare(editorNum) {
+            clearTimeout(prepareTimers[editorNum]);
+            prepareTimers[editorNum] = setTimeout(() => {
+                const formData = new FormData();
+                formData.append('image_id', editors[editorNum].imageId);
+                formData.append('image_type', String(editorNum));
+                formData.append('crop_coordinates', document.getElementById(`cropCoordinates${editorNum}`).value);
+                fetch('/prepare-image', { method: 'POST', body: formData })
+                    .catch(error => console.warn(`Image ${editorNum} will be prepared on submit instead:`, error));
+            }, 400);
+        }
+        
         function generateCroppedImageData(cropData, editorNum) {
             const editor = editors[editorNum];
+            
+            const fileInput = document.getElementById(`croppedImageFile${editorNum}`);
+            fileInput.value = '';
+            
+            // Stored originals are referenced by ID, so no image bytes go with the form
+            if (editor.imageId) {
+                document.getElementById(`croppedImageData${editorNum}`).value = '';
+                schedulePrepare(editorNum);
+                return;
+            }
+            
+            // The crop coordinates already describe the selection in the image being sent
+            if (embedMode === 'srcrect') {
+                document.getElementById(`croppedImageData${editorNum}`).value = editor.currentImage.src;
+                return;
+            }
             const croppedCanvas = document.createElement('canvas');
             const croppedCtx = croppedCanvas.getContext('2d');
             
@@ -1768,6 +2022,17 @@ def index():
                 0, 0, targetWidth, targetHeight
             );
             
+            // Send the crop as a binary multipart part; the base64 field below is only a fallback
+            if (window.DataTransfer && croppedCanvas.toBlob) {
+                croppedCanvas.toBlob(blob => {
+                    const transfer = new DataTransfer();
+                    transfer.items.add(new File([blob], `cropped_image_${editorNum}.jpg`, { type: 'image/jpeg' }));
+                    fileInput.files = transfer.files;
+                    document.getElementById(`croppedImageData${editorNum}`).value = '';
+                }, 'image/jpeg', 0.85);
+                return;
+            }
+            
             // Aggressive compression to prevent 413 errors
             let quality = 0.6;  // Start with lower quality
             let imageData = croppedCanvas.toDataURL('image/jpeg', quality);
@@ -1856,8 +2121,10 @@ def index():
         // Form validation
         document.getElementById('proposalForm').addEventListener('submit', function(e) {
             // Check if images are uploaded
-            const imageData1 = document.getElementById('croppedImageData1').value;
-            const imageData2 = document.getElementById('croppedImageData2').value;
+            const imageData1 = document.getElementById('croppedImageData1').value || document.getElementById('imageId1').value
+                || document.getElementById('croppedImageFile1').files.length;
+            const imageData2 = document.getElementById('croppedImageData2').value || document.getElementById('imageId2').value
+                || document.getElementById('croppedImageFile2').files.length;
             
             if (!imageData1 && !imageData2) {
                 const proceed = confirm('No images uploaded. Do you want to generate the proposal without any images?');
@@ -1871,160 +2138,451 @@ def index():
             const submitBtn = document.getElementById('generateBtn');
             submitBtn.disabled = true;
             submitBtn.textContent = 'Generating Proposal...';
+            
+            // Generate through the job API so no single request has to outlast the generation;
+            // the plain form POST to /generate stays as the fallback
+            if (window.fetch) {
+                e.preventDefault();
+                generateViaJob(this, submitBtn);
+            }
         });
+        
+        const JOB_STAGE_LABELS = {
+            queued: 'Waiting to start...',
+            started: 'Starting...',
+            images: 'Preparing images...',
+            rendering: 'Building presentation...',
+            saving: 'Saving presentation...',
+            done: 'Downloading...'
+        };
+        
+        // Progress events sent by /jobs/<id>/events (see progress_events.py)
+        const JOB_EVENTS = ['preparing_images', 'image_prepared', 'result_cache_hit', 'template_loaded',
+            'text_replaced', 'slide_filled', 'saving', 'saved', 'done'];
+        
+        function describeJobEvent(record) {
+            if (record.event === 'image_prepared') return `Image ${record.image} ready...`;
+            if (record.event === 'slide_filled') return `Filled slide ${record.slide}...`;
+            return JOB_STAGE_LABELS[record.stage] || 'Generating Proposal...';
+        }
+        
+        // Resolves with the final job status; live events update the button as they arrive
+        function followJobEvents(jobId, submitBtn) {
+            return new Promise((resolve, reject) => {
+                const source = new EventSource(`/jobs/${jobId}/events`);
+                JOB_EVENTS.forEach(name => {
+                    source.addEventListener(name, event => {
+                        const record = JSON.parse(event.data);
+                        submitBtn.textContent = describeJobEvent(record);
+                        console.log(`[${record.elapsed_ms} ms] ${record.event}`, record);
+                    });
+                });
+                source.addEventListener('end', event => {
+                    source.close();
+                    resolve(JSON.parse(event.data));
+                });
+                source.onerror = () => {
+                    // EventSource reconnects on its own while the stream is open; give up on a hard failure
+                    if (source.readyState === EventSource.CLOSED) reject(new Error('event stream closed'));
+                };
+            });
+        }
+        
+        async function generateViaJob(form, submitBtn) {
+            const finish = () => {
+                submitBtn.disabled = false;
+                submitBtn.textContent = 'Generate Proposal Template';
+            };
+            
+            let status;
+            try {
+                const response = await fetch('/jobs', { method: 'POST', body: new FormData(form) });
+                status = await response.json();
+                if (!response.ok) {
+                    alert(status.error || 'Could not start generating the proposal');
+                    finish();
+                    return;
+                }
+            } catch (error) {
+                console.warn('Job API unavailable, submitting the form directly:', error);
+                form.submit();
+                return;
+            }
+            
+            if (window.EventSource) {
+                try {
+                    status = await followJobEvents(status.id, submitBtn);
+                } catch (error) {
+                    console.warn('Progress stream unavailable, polling instead:', error);
+                }
+            }
+            
+            while (status.state === 'queued' || status.state === 'running') {
+                submitBtn.textContent = JOB_STAGE_LABELS[status.stage] || 'Generating Proposal...';
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                try {
+                    const response = await fetch(`/jobs/${status.id}`);
+                    status = await response.json();
+                } catch (error) {
+                    // Keep polling through brief network drops
+                    console.warn('Polling the job failed, retrying:', error);
+                }
+            }
+            
+            if (status.state === 'done') {
+                window.location = status.result_url;
+            } else {
+                alert(status.error || 'Proposal generation failed');
+            }
+            finish();
+        }
     </script>
 </body>
 </html>
     '''
 
-@app.route('/generate', methods=['POST'])
-def generate_proposal():
+class ProposalError(Exception):
     """
-    Generate the proposal from form data including both processed images
+    A generation problem to report back to the user as-is
+    """
+
+# Form fields read for a proposal; the ones in FORM_FIELDS_STRIPPED are free text
+FORM_FIELDS = [
+    'building_name', 'type_building', 'address', 'survey_date', 'prepared_by', 'prepared_date',
+    'building_manager_name', 'building_manager_email', 'building_manager_phone', 'building_manager_company',
+    'otic', 'tap_new_or_spare', 'tapping_location', 'tapping_location_level', 'site_assessment_mccb',
+    'tnb_meter', 'tnb_na', 'parking_location', 'ev_charger_model', 'network_strength',
+]
+FORM_FIELDS_STRIPPED = {
+    'building_name', 'address', 'prepared_by', 'building_manager_name', 'building_manager_email',
+    'building_manager_phone', 'building_manager_company', 'otic', 'tapping_location',
+    'tapping_location_level', 'site_assessment_mccb', 'tnb_na', 'parking_location',
+}
+
+def read_proposal_submission(form, files):
+    """
+    Copy everything a generation needs out of the request, so it can run after
+    the request has finished (the uploaded file parts are read into memory)
+    Args:
+        form: request.form
+        files: request.files
+    Returns:
+        Dictionary with 'form_data' and one 'images' entry per image placeholder
+    """
+    form_data = {}
+    for field in FORM_FIELDS:
+        value = form.get(field, '')
+        form_data[field] = value.strip() if field in FORM_FIELDS_STRIPPED else value
+    
+    images = []
+    for suffix in ('', '_2'):
+        image_file = files.get(f'cropped_image_file{suffix}')
+        images.append({
+            'image_id': form.get(f'image_id{suffix}'),
+            'crop_coordinates': form.get(f'crop_coordinates{suffix}'),
+            'image_file_bytes': image_file.read() if image_file is not None and image_file.filename else None,
+            'image_data': form.get(f'cropped_image_data{suffix}'),
+        })
+    
+    return {'form_data': form_data, 'images': images}
+
+def prepare_submitted_image(image, image_type, ordinal, report=None):
     """
+    Prepare one submitted image for its placeholder
+    Args:
+        image: Entry of read_proposal_submission()['images']
+        image_type: "1" for IMG_PLACEHOLDER, "2" for IMG_PLACEHOLDER2
+        ordinal: 'first' or 'second', for messages
+        report: Optional ProgressReporter told when the image is ready
+    Returns:
+        The prepared image, or None if no image was submitted
+    Raises:
+        ProposalError: If the image cannot be used
+    """
+    has_image_bytes = bool(image['image_data'] or image['image_file_bytes'])
+    if not ((has_image_bytes or image['image_id']) and image['crop_coordinates']):
+        return None
+    
+    log.debug("🖼️ Processing %s uploaded image...", ordinal)
     try:
-        print("📝 Processing form submission with dual images...")
-        
-        # Get form data
-        form_data = {
-            'building_name': request.form.get('building_name', '').strip(),
-            'type_building': request.form.get('type_building', ''),
-            'address': request.form.get('address', '').strip(),
-            'survey_date': request.form.get('survey_date', ''),
-            'prepared_by': request.form.get('prepared_by', '').strip(),
-            'prepared_date': request.form.get('prepared_date', ''),
-            'building_manager_name': request.form.get('building_manager_name', '').strip(),
-            'building_manager_email': request.form.get('building_manager_email', '').strip(),
-            'building_manager_phone': request.form.get('building_manager_phone', '').strip(),
-            'building_manager_company': request.form.get('building_manager_company', '').strip(),
-            'otic': request.form.get('otic', '').strip(),
-            'tap_new_or_spare': request.form.get('tap_new_or_spare', ''),
-            'tapping_location': request.form.get('tapping_location', '').strip(),
-            'tapping_location_level': request.form.get('tapping_location_level', '').strip(),
-            'site_assessment_mccb': request.form.get('site_assessment_mccb', '').strip(),
-            'tnb_meter': request.form.get('tnb_meter', ''),
-            'tnb_na': request.form.get('tnb_na', '').strip(),
-            'parking_location': request.form.get('parking_location', '').strip(),
-            'ev_charger_model': request.form.get('ev_charger_model', ''),
-            'network_strength': request.form.get('network_strength', '')
-        }
-        
-        print(f"📋 Form data received: {form_data['prepared_by']} - {form_data['address'][:50]}...")
-        print(f"🏢 Building Type received: '{form_data['type_building']}'")
-        print(f"📊 All form data: {form_data}")
-        
-        # Format dates
-        if form_data['survey_date']:
-            survey_date_obj = datetime.strptime(form_data['survey_date'], '%Y-%m-%d')
-            form_data['survey_date'] = survey_date_obj.strftime('%B %d, %Y')
-        
-        if form_data['prepared_date']:
-            prepared_date_obj = datetime.strptime(form_data['prepared_date'], '%Y-%m-%d')
-            form_data['prepared_date'] = prepared_date_obj.strftime('%B %d, %Y')
-        
-        # Process both uploaded images
-        image_path = None
-        image_path_2 = None
-        
-        # Process first image
-        cropped_image_data = request.form.get('cropped_image_data')
-        crop_coordinates = request.form.get('crop_coordinates')
-        
-        if cropped_image_data and crop_coordinates:
-            print("🖼️  Processing first uploaded image...")
-            try:
-                crop_data = json.loads(crop_coordinates)
-                image_path, img_error = process_cropped_image(cropped_image_data, crop_data, "1")
-                
-                if img_error:
-                    print(f"❌ First image processing error: {img_error}")
-                    flash(f"First image processing error: {img_error}", 'error')
-                    return redirect(url_for('index'))
-                else:
-                    print(f"✅ First image processed successfully: {image_path}")
-                    
-            except json.JSONDecodeError as json_err:
-                print(f"❌ Invalid first image coordinates: {json_err}")
-                flash("Invalid first image coordinates. Please try uploading the image again.", 'error')
-                return redirect(url_for('index'))
-            except Exception as img_e:
-                print(f"❌ First image processing failed: {str(img_e)}")
-                flash(f"First image processing failed: {str(img_e)}", 'error')
-                return redirect(url_for('index'))
-        
-        # Process second image
-        cropped_image_data_2 = request.form.get('cropped_image_data_2')
-        crop_coordinates_2 = request.form.get('crop_coordinates_2')
-        
-        if cropped_image_data_2 and crop_coordinates_2:
-            print("🖼️  Processing second uploaded image...")
-            try:
-                crop_data_2 = json.loads(crop_coordinates_2)
-                image_path_2, img_error_2 = process_cropped_image(cropped_image_data_2, crop_data_2, "2")
-                
-                if img_error_2:
-                    print(f"❌ Second image processing error: {img_error_2}")
-                    flash(f"Second image processing error: {img_error_2}", 'error')
-                    return redirect(url_for('index'))
-                else:
-                    print(f"✅ Second image processed successfully: {image_path_2}")
-                    
-            except json.JSONDecodeError as json_err:
-                print(f"❌ Invalid second image coordinates: {json_err}")
-                flash("Invalid second image coordinates. Please try uploading the image again.", 'error')
-                return redirect(url_for('index'))
-            except Exception as img_e:
-                print(f"❌ Second image processing failed: {str(img_e)}")
-                flash(f"Second image processing failed: {str(img_e)}", 'error')
-                return redirect(url_for('index'))
+        crop_data = json.loads(image['crop_coordinates'])
+        # Stored originals are referenced by ID; binary parts and data URLs are the fallback
+        image_bytes = image['image_file_bytes']
+        if image_bytes is None and image['image_data']:
+            image_bytes = decode_data_url(image['image_data'])
+        if image['image_id']:
+            prepared_image, img_error = process_stored_image(image['image_id'], crop_data, image_type, image_bytes)
+        else:
+            prepared_image, img_error = prepare_cropped_image(image_bytes, crop_data, image_type)
+    except json.JSONDecodeError as json_err:
+        log.error("❌ Invalid %s image coordinates: %s", ordinal, json_err)
+        raise ProposalError(f"Invalid {ordinal} image coordinates. Please try uploading the image again.")
+    except Exception as img_e:
+        log.error("❌ %s image processing failed: %s", ordinal.capitalize(), img_e)
+        raise ProposalError(f"{ordinal.capitalize()} image processing failed: {str(img_e)}")
+    
+    if img_error:
+        log.error("❌ %s image processing error: %s", ordinal.capitalize(), img_error)
+        raise ProposalError(f"{ordinal.capitalize()} image processing error: {img_error}")
+    
+    log.debug("✅ %s image processed successfully", ordinal.capitalize())
+    if report is not None:
+        report('image_prepared', image=int(image_type), bytes=image_size_bytes(prepared_image))
+    return prepared_image
+
+def build_proposal(submission, output_folder=OUTPUT_FOLDER, progress=None):
+    """
+    Generate a proposal from a read_proposal_submission() snapshot
+    Args:
+        submission: Snapshot of the form and images
+        output_folder: Directory to write the proposal to
+        progress: Optional callback receiving progress event dicts (see progress_events)
+    Returns:
+        Tuple of (output_path, output_filename)
+    Raises:
+        ProposalError: If the images or the generation fail
+    """
+    report = as_reporter(progress)
+    timings = StageTimings('Example')
+    form_data = dict(submission['form_data'])
+    
+    # Field values are customer data; only their presence and length are logged
+    if is_debug(log):
+        log.debug("📊 Form data received: %s", redact(form_data))
+    
+    # Format dates
+    if form_data['survey_date']:
+        survey_date_obj = datetime.strptime(form_data['survey_date'], '%Y-%m-%d')
+        form_data['survey_date'] = survey_date_obj.strftime('%B %d, %Y')
+    
+    if form_data['prepared_date']:
+        prepared_date_obj = datetime.strptime(form_data['prepared_date'], '%Y-%m-%d')
+        form_data['prepared_date'] = prepared_date_obj.strftime('%B %d, %Y')
+    
+    # Process both uploaded images
+    report('preparing_images')
+    image_path = None
+    image_path_2 = None
+    try:
+        image_path = prepare_submitted_image(submission['images'][0], "1", 'first', report)
+        image_path_2 = prepare_submitted_image(submission['images'][1], "2", 'second', report)
+        timings.lap('image_prepare')
         
         if not image_path and not image_path_2:
-            print("ℹ️  No images provided - generating text-only proposal")
+            log.info("ℹ️ No images provided - generating text-only proposal")
         
         # Generate output filename
         client_name = form_data['address'].split(',')[0].strip()[:20]
         safe_client_name = "".join(c for c in client_name if c.isalnum() or c in (' ', '_')).strip()
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         output_filename = f"proposal_{safe_client_name.replace(' ', '_')}_{timestamp}.pptx"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+        output_path = os.path.join(output_folder, output_filename)
         
-        print(f"📄 Generating proposal with dual images: {output_filename}")
+        log.info("📄 Generating proposal with dual images: %s", output_filename)
         
         # Generate the proposal (now with both image paths)
         success, message = replace_placeholders_and_images_in_pptx(
-            TEMPLATE_PATH, form_data, image_path, image_path_2, output_path
+            TEMPLATE_PATH, form_data, image_path, image_path_2, output_path, progress=report, timings=timings
         )
-        
-        # Clean up temporary images
+    except ProposalError:
+        timings.finish('failure')
+        raise
+    finally:
+        # Clean up temporary images (only present when spooling to disk)
         for temp_image in [image_path, image_path_2]:
-            if temp_image and os.path.exists(temp_image):
-                try:
-                    os.remove(temp_image)
-                    print("🗑️  Cleaned up temporary image file")
-                except:
-                    pass  # Ignore cleanup errors
+            try:
+                if discard_image(temp_image):
+                    log.debug("🗑️ Cleaned up temporary image file")
+            except:
+                pass  # Ignore cleanup errors
+    
+    stage_timings = timings.finish('success' if success else 'failure')
+    if is_debug(log):
+        log.debug("⏱️ Stage timings: %s", stage_timings)
+    
+    if not success:
+        log.error("❌ Generation failed: %s", message)
+        raise ProposalError(f"Error: {message}")
+    
+    log.info("✅ Proposal generated successfully: %s", output_path)
+    return output_path, output_filename
+
+@app.route('/generate', methods=['POST'])
+def generate_proposal():
+    """
+    Generate the proposal from form data including both processed images
+    """
+    try:
+        log.debug("📝 Processing form submission with dual images...")
         
-        if success:
-            print(f"✅ Proposal generated successfully: {output_path}")
-            return send_file(output_path, as_attachment=True, download_name=output_filename)
-        else:
-            print(f"❌ Generation failed: {message}")
-            flash(f"Error: {message}", 'error')
-            return redirect(url_for('index'))
-            
+        profile = requested_memory_profile()
+        cpu_profile = sample_cpu_profile('Example')
+        with profile or nullcontext(), cpu_profile or nullcontext():
+            submission = read_proposal_submission(request.form, request.files)
+            memory_mark('read_request')
+            output_path, output_filename = build_proposal(submission)
+        
+        response = send_file(output_path, as_attachment=True, download_name=output_filename)
+        if profile is not None:
+            report = profile.report()
+            log_memory_report(report)
+            response.headers['X-Memory-Profile'] = json.dumps({
+                'peak_bytes': report['peak_bytes'],
+                'stages': {stage['stage']: stage['peak_bytes'] for stage in report['stages']},
+            })
+        return response
+        
+    except ProfileBusy as e:
+        return jsonify({'error': str(e)}), 409
+    except ProposalError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
     except Exception as e:
-        print(f"❌ Unexpected error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Unexpected error: %s", e)
         flash(f"Unexpected error: {str(e)}", 'error')
         return redirect(url_for('index'))
 
+def requested_memory_profile():
+    """
+    MemoryProfile for a request that opted in with the X-Profile-Memory header
+    Returns:
+        MemoryProfile, or None if the request did not ask or profiling is not allowed
+    """
+    if ALLOW_MEMORY_PROFILE and request.headers.get(MEMORY_PROFILE_HEADER) == '1':
+        return MemoryProfile()
+    return None
+
+def run_proposal_job(work_dir, progress, submission):
+    """
+    Job body for POST /jobs: generate into the job's own directory
+    """
+    try:
+        with sample_cpu_profile('Example') or nullcontext():
+            output_path, output_filename = build_proposal(submission, output_folder=work_dir, progress=progress)
+    except ProposalError:
+        raise
+    except Exception as e:
+        log.exception("❌ Unexpected error: %s", e)
+        raise ProposalError(f"Unexpected error: {str(e)}")
+    
+    return {'path': output_path, 'filename': output_filename}
+
+def job_status_response(status):
+    """
+    JSON body for a job, with the download URL once the result is ready
+    """
+    if status['state'] == 'done':
+        status['result_url'] = url_for('proposal_job_result', job_id=status['id'])
+    return status
+
+@app.route('/jobs', methods=['POST'])
+def submit_proposal_job():
+    """
+    Accept the same form as /generate, queue the generation and return its job ID
+    straight away; poll GET /jobs/<id> and download from GET /jobs/<id>/result
+    """
+    submission = read_proposal_submission(request.form, request.files)
+    try:
+        job_id = get_proposal_jobs(JOBS_FOLDER).submit(run_proposal_job, submission)
+    except JobQueueFull as e:
+        log.warning("⚠️ Job rejected: %s", e)
+        return jsonify({'error': 'Too many proposals are being generated - please try again shortly'}), 503
+    
+    log.info("📥 Queued proposal job %s", job_id)
+    status = get_proposal_jobs(JOBS_FOLDER).status(job_id)
+    response = jsonify(job_status_response(status))
+    response.headers['Location'] = url_for('proposal_job_status', job_id=job_id)
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def proposal_job_status(job_id):
+    """
+    Report a job's state (queued, running, done, failed) and current stage
+    """
+    status = get_proposal_jobs(JOBS_FOLDER).status(job_id)
+    if status is None:
+        return jsonify({'id': job_id, 'error': 'Unknown or expired job'}), 404
+    return jsonify(job_status_response(status))
+
+# Comment line sent on an idle event stream so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def proposal_job_events(job_id):
+    """
+    Stream a job's progress events as Server-Sent Events, ending with an 'end'
+    event carrying the final job status; reconnecting clients resume after
+    the Last-Event-ID they saw
+    """
+    jobs = get_proposal_jobs(JOBS_FOLDER)
+    if jobs.status(job_id) is None:
+        return jsonify({'id': job_id, 'error': 'Unknown or expired job'}), 404
+    
+    try:
+        start = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        start = 0
+    
+    result_url = url_for('proposal_job_result', job_id=job_id)
+    
+    def stream():
+        index = start
+        while True:
+            waited = jobs.wait_events(job_id, index, SSE_KEEPALIVE_SECONDS)
+            if waited is None:
+                return
+            events, finished = waited
+            
+            for record in events:
+                yield f"id: {index}\nevent: {record['event']}\ndata: {json.dumps(record)}\n\n"
+                index += 1
+            
+            if finished:
+                status = jobs.status(job_id)
+                if status is not None:
+                    if status['state'] == 'done':
+                        status['result_url'] = result_url
+                    yield f"event: end\ndata: {json.dumps(status)}\n\n"
+                return
+            if not events:
+                yield ": keepalive\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def proposal_job_result(job_id):
+    """
+    Download the proposal generated by a finished job
+    """
+    status = get_proposal_jobs(JOBS_FOLDER).status(job_id)
+    if status is None:
+        return jsonify({'id': job_id, 'error': 'Unknown or expired job'}), 404
+    if status['state'] != 'done':
+        return jsonify(job_status_response(status)), 409
+    
+    # The job can expire (and its directory be removed) after the status check
+    result = get_proposal_jobs(JOBS_FOLDER).result(job_id)
+    if result is None:
+        return jsonify({'id': job_id, 'error': 'Unknown or expired job'}), 404
+    try:
+        return send_file(result['path'], as_attachment=True, download_name=result['filename'])
+    except FileNotFoundError:
+        return jsonify({'id': job_id, 'error': 'Unknown or expired job'}), 404
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Stage latency, image size and cache metrics in the Prometheus text format
+    """
+    return Response(get_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.errorhandler(413)
 def too_large(e):
     """
     Handle file too large errors
     """
-    print("❌ File too large error caught")
+    log.warning("❌ File too large error caught")
     flash("Image file is too large. Please use a smaller image (under 50MB).", 'error')
     return redirect(url_for('index'))
 
@@ -2033,7 +2591,7 @@ def shutdown():
     """
     Shutdown the server
     """
-    print("🔥 Shutting down server...")
+    log.info("🔥 Shutting down server...")
     func = request.environ.get('werkzeug.server.shutdown')
     if func is None:
         raise RuntimeError('Not running with the Werkzeug Server')
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark for the proposal generation engines
+Builds a synthetic template and synthetic photos (seeded, so every run sees
+the same inputs), then times proposal_processor.replace_placeholders_in_pptx
+and Example.replace_placeholders_and_images_in_pptx on them. Each engine and
+photo size runs in its own process so peak RSS belongs to that case alone.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --photo-mp 12,48 --slides 40 --baseline bench.json --threshold 0.1
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ENGINES = ('proposal_processor', 'Example')
+
+# Tokens both engines fill from form data, and the processor's image tokens
+TEXT_TOKENS = (
+    'BUILDINGNAME', 'ADDRESS', 'SURVEYDATE', 'PREPAREDBY', 'PREPAREDDATE', 'TYPEBUILDING',
+    'BUILDINGMANAGERNAME', 'BUILDINGMANAGEREMAIL', 'BUILDINGMANAGERPHONE', 'BUILDINGMANAGERCOMPANY',
+    'OTIC', 'TAPNEWORSPARE', 'TAPPINGLOCATION', 'TAPPINGLOCATIONLEVEL', 'SITEASSESTMENTMCCB',
+    'TNBMETER', 'TNBNA', 'PARKINGLOCATION', 'EVCHARGERMODEL', 'NETWORKSTRENGTH',
+)
+PROCESSOR_IMAGE_TOKENS = (
+    'TP_MSB', 'TP_MCCB', 'TP_SLD', 'TP_MCCB_COMPARTMENT', 'TP_TAPPING_LOC',
+    'TP_ROUTING_1', 'TP_ROUTING_2', 'TP_ROUTING_3',
+)
+
+# Cached results would turn every iteration after the first into a file copy
+UNCACHED_ENV = {
+    'PROPOSAL_RESULT_CACHE_MB': '0',
+    'PROPOSAL_IMAGE_CACHE_MB': '0',
+    'PROPOSAL_IMAGE_CACHE_DISK_MB': '0',
+    'PROPOSAL_DECODED_CACHE_MB': '0',
+}
+
+# Metrics compared against a baseline, and whether higher is worse
+COMPARED_METRICS = (
+    ('latency_p50_ms', True),
+    ('latency_p95_ms', True),
+    ('peak_rss_mb', True),
+    ('throughput_per_sec', False),
+)
+
+
+def make_template(path, slides, shapes_per_slide, tokens_per_shape, table_rows, table_cols):
+    """
+    Write a synthetic template with text tokens, optional tables and the image
+    placeholders of both engines
+    Args:
+        path: Where to save the .pptx
+        slides: Number of slides
+        shapes_per_slide: Text boxes per slide
+        tokens_per_shape: Placeholder tokens in each text box
+        table_rows: Rows of the table added to every slide (0 for no tables)
+        table_cols: Columns of that table
+    """
+    from pptx import Presentation
+    from pptx.enum.shapes import MSO_SHAPE
+    from pptx.util import Cm, Inches, Pt
+
+    prs = Presentation()
+    prs.slide_width, prs.slide_height = Inches(13.333), Inches(7.5)
+    token_cycle = 0
+
+    def next_tokens(count):
+        nonlocal token_cycle
+        tokens = [TEXT_TOKENS[(token_cycle + i) % len(TEXT_TOKENS)] for i in range(count)]
+        token_cycle += count
+        return ' - '.join(f'{{{{{token}}}}}' for token in tokens)
+
+    columns = max(1, math.ceil(math.sqrt(shapes_per_slide)))
+    for slide_idx in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+
+        for shape_idx in range(shapes_per_slide):
+            row, col = divmod(shape_idx, columns)
+            box = slide.shapes.add_textbox(Inches(0.3 + col * 1.6), Inches(0.3 + row * 0.5), Inches(1.5), Inches(0.4))
+            box.text_frame.text = f'Field {shape_idx}: {next_tokens(tokens_per_shape)}'
+            box.text_frame.paragraphs[0].runs[0].font.size = Pt(10)
+
+        if table_rows and table_cols:
+            table = slide.shapes.add_table(table_rows, table_cols, Inches(7), Inches(0.3), Inches(6), Inches(0.3 * table_rows)).table
+            for cell_idx in range(table_rows * table_cols):
+                table.cell(*divmod(cell_idx, table_cols)).text = next_tokens(1)
+
+    # proposal_processor: text boxes holding only an image token
+    for image_idx, token in enumerate(PROCESSOR_IMAGE_TOKENS):
+        slide = prs.slides[image_idx % slides]
+        box = slide.shapes.add_textbox(Inches(0.5 + (image_idx % 2) * 6.3), Inches(3.2), Inches(6), Inches(4))
+        box.text_frame.text = f'{{{{{token}}}}}'
+
+    # Example: shapes named after its two image placeholders
+    for image_idx, (name, width_cm, height_cm) in enumerate((('IMG_PLACEHOLDER', 19.05, 10.79), ('IMG_PLACEHOLDER2', 17.69, 11.38))):
+        slide = prs.slides[image_idx % slides]
+        shape = slide.shapes.add_shape(MSO_SHAPE.RECTANGLE, Cm(1), Cm(6), Cm(width_cm), Cm(height_cm))
+        shape.name = name
+
+    prs.save(path)
+
+
+def make_photo(path, megapixels, seed):
+    """
+    Write a seeded synthetic 4:3 JPEG photo: smooth colour blobs with fine
+    noise, so it compresses (and decodes) roughly like a real photo
+    """
+    from PIL import Image
+
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = int(width * 3 / 4)
+    rng = random.Random(seed)
+
+    blob_size = (max(2, width // 64), max(2, height // 64))
+    blobs = Image.frombytes('RGB', blob_size, rng.randbytes(blob_size[0] * blob_size[1] * 3))
+    grain_size = (max(2, width // 4), max(2, height // 4))
+    grain = Image.frombytes('RGB', grain_size, rng.randbytes(grain_size[0] * grain_size[1] * 3))
+
+    photo = Image.blend(
+        blobs.resize((width, height), Image.Resampling.BICUBIC),
+        grain.resize((width, height), Image.Resampling.NEAREST),
+        0.15,
+    )
+    photo.save(path, 'JPEG', quality=90)
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def form_data(iteration):
+    """
+    Form data that differs per iteration, so no run can be served from a cache
+    """
+    return {
+        'building_name': f'Benchmark Tower {iteration}',
+        'address': f'{iteration} Synthetic Road, Test City',
+        'survey_date': 'January 01, 2025',
+        'prepared_by': 'Benchmark',
+        'prepared_date': 'January 02, 2025',
+        'type_building': 'Commercial',
+    }
+
+
+def run_case(case):
+    """
+    Time one engine on one photo size; runs in its own process
+    Returns:
+        Result dictionary for the case
+    """
+    os.chdir(case['work_dir'])
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from image_pipeline import discard_image
+    from proposal_metrics import StageTimings
+
+    output_path = os.path.join(case['work_dir'], f"out_{case['engine']}.pptx")
+    if case['engine'] == 'proposal_processor':
+        from proposal_processor import replace_placeholders_in_pptx
+
+        def generate(iteration, timings):
+            return replace_placeholders_in_pptx(
+                case['template'], form_data(iteration), *[case['photo']] * len(PROCESSOR_IMAGE_TOKENS),
+                output_path, timings=timings
+            )
+    else:
+        import Example
+        Example.TEMPLATE_PATH = case['template']
+        with open(case['photo'], 'rb') as photo_file:
+            photo_bytes = photo_file.read()
+        from PIL import Image
+        with Image.open(case['photo']) as photo:
+            crop = {'x': 0, 'y': 0, 'width': photo.width, 'height': photo.height}
+
+        def generate(iteration, timings):
+            images = [Example.prepare_cropped_image(photo_bytes, crop, image_type)[0] for image_type in ('1', '2')]
+            timings.lap('image_prepare')
+            try:
+                success, _ = Example.replace_placeholders_and_images_in_pptx(
+                    case['template'], form_data(iteration), images[0], images[1], output_path, timings=timings
+                )
+            finally:
+                for image in images:
+                    discard_image(image)
+            return success
+
+    rss_before = peak_rss_mb()
+    latencies = []
+    stages = {}
+    output_bytes = 0
+    measured_started = None
+    for iteration in range(case['warmup'] + case['iterations']):
+        if iteration == case['warmup']:
+            measured_started = time.perf_counter()
+        timings = StageTimings(case['engine'])
+        if not generate(iteration, timings):
+            raise RuntimeError(f"{case['engine']} failed on iteration {iteration}")
+        result = timings.as_dict()
+        if iteration >= case['warmup']:
+            latencies.append(result['total_ms'])
+            for stage, stage_ms in result['stages_ms'].items():
+                stages.setdefault(stage, []).append(stage_ms)
+            output_bytes = os.path.getsize(output_path)
+    elapsed = time.perf_counter() - measured_started
+
+    return {
+        'name': case['name'],
+        'engine': case['engine'],
+        'photo_mp': case['photo_mp'],
+        'iterations': case['iterations'],
+        'throughput_per_sec': round(case['iterations'] / elapsed, 3),
+        'latency_p50_ms': round(percentile(latencies, 50), 1),
+        'latency_p95_ms': round(percentile(latencies, 95), 1),
+        'latency_mean_ms': round(sum(latencies) / len(latencies), 1),
+        'stages_p50_ms': {stage: round(percentile(values, 50), 1) for stage, values in stages.items()},
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_before_mb': rss_before,
+        'output_bytes': output_bytes,
+    }
+
+
+def run_case_subprocess(case, env):
+    """
+    Run a case in a fresh interpreter and collect its result
+    """
+    result_path = os.path.join(case['work_dir'], f"result_{case['name'].replace('/', '_')}.json")
+    command = [sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(dict(case, result_path=result_path))]
+    subprocess.run(command, env=env, check=True)
+    with open(result_path, encoding='utf-8') as result_file:
+        return json.load(result_file)
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of results against a baseline results file
+    Returns:
+        List of human-readable regression descriptions
+    """
+    baseline_cases = {case['name']: case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        previous = baseline_cases.get(case['name'])
+        if previous is None:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            old, new = previous.get(metric), case.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append(f"{case['name']} {metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the proposal generation engines on synthetic inputs')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='Comma-separated engines to run (default: both)')
+    parser.add_argument('--photo-mp', default='2,12', dest='photo_mp', help='Comma-separated synthetic photo sizes in megapixels')
+    parser.add_argument('--slides', type=int, default=20, help='Slides in the synthetic template')
+    parser.add_argument('--shapes-per-slide', type=int, default=12, dest='shapes_per_slide', help='Text boxes per slide')
+    parser.add_argument('--tokens-per-shape', type=int, default=2, dest='tokens_per_shape', help='Placeholder tokens per text box')
+    parser.add_argument('--table-rows', type=int, default=6, dest='table_rows', help='Rows of the table on every slide (0 for none)')
+    parser.add_argument('--table-cols', type=int, default=4, dest='table_cols', help='Columns of the table on every slide')
+    parser.add_argument('--iterations', type=int, default=10, help='Measured generations per case')
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured generations before timing starts')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic photos')
+    parser.add_argument('--with-caches', action='store_true', dest='with_caches', help='Keep the image and result caches enabled')
+    parser.add_argument('--work-dir', dest='work_dir', help='Directory for synthetic inputs and outputs (default: a temp dir)')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Results JSON to compare against; exits 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed relative regression against the baseline (default: 0.10)')
+    parser.add_argument('--run-case', dest='run_case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        case = json.loads(args.run_case)
+        with open(case['result_path'], 'w', encoding='utf-8') as result_file:
+            json.dump(run_case(case), result_file)
+        return
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(sorted(unknown))}")
+    photo_sizes = [float(size) for size in args.photo_mp.split(',') if size.strip()]
+
+    work_dir = os.path.abspath(args.work_dir or os.path.join(tempfile.gettempdir(), 'proposal-benchmark'))
+    os.makedirs(work_dir, exist_ok=True)
+
+    template_config = {
+        'slides': args.slides,
+        'shapes_per_slide': args.shapes_per_slide,
+        'tokens_per_shape': args.tokens_per_shape,
+        'table_rows': args.table_rows,
+        'table_cols': args.table_cols,
+    }
+    template_path = os.path.join(work_dir, 'template_{slides}s_{shapes_per_slide}x{tokens_per_shape}_{table_rows}x{table_cols}.pptx'.format(**template_config))
+    if not os.path.exists(template_path):
+        print(f"🧱 Building synthetic template {os.path.basename(template_path)}")
+        make_template(template_path, **template_config)
+
+    env = dict(os.environ)
+    env.setdefault('PROPOSAL_LOG_LEVEL', 'error')
+    if not args.with_caches:
+        env.update(UNCACHED_ENV)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': dict(template_config, iterations=args.iterations, warmup=args.warmup, seed=args.seed,
+                       with_caches=args.with_caches),
+        'cases': [],
+    }
+
+    for photo_mp in photo_sizes:
+        photo_path = os.path.join(work_dir, f'photo_{photo_mp:g}mp_seed{args.seed}.jpg')
+        if not os.path.exists(photo_path):
+            print(f"📷 Building synthetic {photo_mp:g} MP photo")
+            make_photo(photo_path, photo_mp, args.seed)
+
+        for engine in engines:
+            case = {
+                'name': f'{engine}/{photo_mp:g}mp',
+                'engine': engine,
+                'photo_mp': photo_mp,
+                'template': template_path,
+                'photo': photo_path,
+                'work_dir': work_dir,
+                'iterations': args.iterations,
+                'warmup': args.warmup,
+            }
+            print(f"⏱️ {case['name']}: {args.warmup} warmup + {args.iterations} measured runs")
+            result = run_case_subprocess(case, env)
+            results['cases'].append(result)
+            print(f"   p50 {result['latency_p50_ms']} ms, p95 {result['latency_p95_ms']} ms, "
+                  f"{result['throughput_per_sec']}/s, peak RSS {result['peak_rss_mb']} MB, "
+                  f"output {result['output_bytes']} bytes")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
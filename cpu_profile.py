@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Sampled CPU profiling of production generations
+One in every PROPOSAL_CPU_PROFILE_SAMPLE_RATE generations runs under cProfile
+and its stats are written as a .prof file (pstats format) to
+PROPOSAL_CPU_PROFILE_DIR (cpu_profiles/ next to this module). The oldest
+files are deleted once the directory grows past PROPOSAL_CPU_PROFILE_MAX_MB.
+Read the files with `python -m pstats FILE` or turn them into flame graphs
+with snakeviz or flameprof. Sampling is off by default and then costs one
+counter check per generation.
+"""
+
+import cProfile
+import os
+import threading
+import time
+from datetime import datetime
+
+from proposal_log import get_logger
+
+log = get_logger('cpu_profile')
+
+# Profile one generation in N (0 disables sampling)
+CPU_PROFILE_SAMPLE_RATE = int(os.environ.get('PROPOSAL_CPU_PROFILE_SAMPLE_RATE', '0'))
+CPU_PROFILE_DIR = os.environ.get(
+    'PROPOSAL_CPU_PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cpu_profiles')
+)
+CPU_PROFILE_MAX_MB = float(os.environ.get('PROPOSAL_CPU_PROFILE_MAX_MB', '256'))
+
+_sample_lock = threading.Lock()
+_sample_count = 0
+
+# Only one profiler can be enabled per process; overlapping samples are skipped
+_active_lock = threading.Lock()
+
+
+class CpuProfile:
+    """
+    Context manager running one generation under cProfile
+    Only the entering thread is profiled, so sampled runs should prepare
+    their images on that thread. If another profile is already running the
+    generation runs unprofiled.
+    """
+
+    def __init__(self, engine, directory=None, max_mb=None):
+        self.engine = engine
+        self.directory = directory or CPU_PROFILE_DIR
+        self.max_bytes = (CPU_PROFILE_MAX_MB if max_mb is None else max_mb) * 1024 ** 2
+        self.path = None
+        self._profiler = None
+        self._started = None
+
+    @property
+    def recording(self):
+        """
+        Whether this generation is actually being profiled (inside the with block)
+        """
+        return self._profiler is not None
+
+    def __enter__(self):
+        if not _active_lock.acquire(blocking=False):
+            log.debug("🔬 CPU profile skipped: another generation is being profiled")
+            return self
+
+        self._profiler = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self._profiler is None:
+            return False
+
+        try:
+            self._profiler.disable()
+            elapsed_ms = (time.perf_counter() - self._started) * 1000
+            self.path = self._write()
+            log.info("🔬 CPU profile of %s generation (%.0f ms) written to %s", self.engine, elapsed_ms, self.path)
+            prune_profiles(self.directory, self.max_bytes, keep=self.path)
+        except OSError as e:
+            log.warning("⚠️ Could not write CPU profile: %s", e)
+        finally:
+            self._profiler = None
+            _active_lock.release()
+        return False
+
+    def _write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{self.engine}_{os.getpid()}.prof"
+        path = os.path.join(self.directory, name)
+        # Written under a temporary name so pruning never sees a partial file
+        self._profiler.dump_stats(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return path
+
+
+def sample_cpu_profile(engine, rate=None):
+    """
+    Decide whether this generation is sampled
+    Args:
+        engine: Name recorded in the profile's file name
+        rate: Profile one call in this many (default CPU_PROFILE_SAMPLE_RATE; 0 disables)
+    Returns:
+        CpuProfile for a sampled generation, otherwise None
+    """
+    global _sample_count
+    rate = CPU_PROFILE_SAMPLE_RATE if rate is None else rate
+    if rate <= 0:
+        return None
+
+    with _sample_lock:
+        _sample_count += 1
+        sampled = _sample_count % rate == 0
+    return CpuProfile(engine) if sampled else None
+
+
+def prune_profiles(directory, max_bytes, keep=None):
+    """
+    Delete the oldest .prof files until the directory fits in max_bytes
+    Args:
+        directory: Profile directory
+        max_bytes: Size cap for all profiles together
+        keep: Path that is never deleted (the profile just written)
+    Returns:
+        Number of files deleted
+    """
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith('.prof'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # pruned by another worker process
+        profiles.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in profiles)
+    deleted = 0
+    for _, size, path in sorted(profiles):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+
+    if deleted:
+        log.debug("🗑️ Pruned %d old CPU profiles from %s", deleted, directory)
+    return deleted
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Quality check for the fast JPEG downscale path
+Builds seeded synthetic JPEG photos, prepares them the way placeholder images
+are prepared (draft() decode at reduced DCT scale plus reducing_gap) and
+compares each result with a full-resolution LANCZOS resize of the same crop.
+Exits non-zero when any case falls below the PSNR floor.
+
+Usage:
+    python downscale_check.py
+    python downscale_check.py --photo-mp 12,48 --min-psnr 35
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+import image_pipeline
+from benchmark import make_photo
+from image_encoder import psnr
+
+# (name, target size, crop as fractions of (left, top, right, bottom) or None)
+CASES = (
+    ('full frame', (2250, 1274), None),
+    ('centre crop', (2250, 1274), (0.2, 0.25, 0.8, 0.6)),
+    ('thumbnail', (600, 340), None),
+    ('small crop', (900, 510), (0.55, 0.5, 0.85, 0.67)),
+)
+
+
+def crop_box(size, fractions):
+    """
+    Crop box in pixels for crop fractions of an image size
+    """
+    if fractions is None:
+        return None
+    width, height = size
+    left, top, right, bottom = fractions
+    return (round(left * width), round(top * height), round(right * width), round(bottom * height))
+
+
+def check_photo(path, min_psnr):
+    """
+    Compare the fast path with the full-resolution resize for every case
+    Returns:
+        List of result dictionaries, one per case
+    """
+    with open(path, 'rb') as photo_file:
+        source_bytes = photo_file.read()
+    started = time.perf_counter()
+    full = image_pipeline.decode_image(source_bytes)
+    decode_ms = (time.perf_counter() - started) * 1000
+
+    results = []
+    for name, (width, height), fractions in CASES:
+        box = crop_box(full.size, fractions)
+
+        started = time.perf_counter()
+        reference = full.resize((width, height), Image.Resampling.LANCZOS, box=box)
+        reference_ms = decode_ms + (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        fast = image_pipeline._decode_and_resize(source_bytes, width, height, box)
+        fast_ms = (time.perf_counter() - started) * 1000
+
+        score = psnr(reference, fast)
+        results.append({
+            'case': name,
+            'target': f'{width}x{height}',
+            'psnr_db': round(score, 2),
+            'fast_ms': round(fast_ms, 1),
+            'reference_ms': round(reference_ms, 1),
+            'ok': score >= min_psnr,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the fast JPEG downscale path against a full-resolution resize')
+    parser.add_argument('--photo-mp', default='24,48', help='Comma-separated photo sizes in megapixels')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic photos')
+    parser.add_argument('--min-psnr', type=float, default=32.0, help='Lowest acceptable PSNR in dB')
+    args = parser.parse_args()
+
+    # The module-level switch may be off in this environment; the fast path is what is checked
+    image_pipeline.FAST_DOWNSCALE = True
+
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix='downscale_check_') as work_dir:
+        for megapixels in (float(value) for value in args.photo_mp.split(',')):
+            path = os.path.join(work_dir, f'photo_{megapixels:g}mp.jpg')
+            make_photo(path, megapixels, args.seed)
+            for result in check_photo(path, args.min_psnr):
+                failed += not result['ok']
+                print(f"{'✅' if result['ok'] else '❌'} {megapixels:g} MP {result['case']:<12} -> {result['target']:<9} "
+                      f"PSNR {result['psnr_db']:6.2f} dB  fast {result['fast_ms']:7.1f} ms, "
+                      f"full resolution {result['reference_ms']:7.1f} ms")
+
+    if failed:
+        print(f"❌ {failed} case(s) below {args.min_psnr} dB")
+        return 1
+    print(f"✅ All cases at or above {args.min_psnr} dB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of prepared (resized and encoded) placeholder images
+Entries are keyed by the SHA-256 of the source bytes plus every setting that
+affects the output, held in a size-bounded in-memory LRU and mirrored to a
+size-bounded directory on disk so repeat generations skip image work entirely
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from proposal_log import get_logger
+
+log = get_logger('image_cache')
+
+# Cache configuration (sizes in megabytes; 0 disables that tier)
+IMAGE_CACHE_MEMORY_MB = float(os.environ.get('PROPOSAL_IMAGE_CACHE_MB', '64'))
+IMAGE_CACHE_DISK_MB = float(os.environ.get('PROPOSAL_IMAGE_CACHE_DISK_MB', '512'))
+IMAGE_CACHE_DIR = os.environ.get(
+    'PROPOSAL_IMAGE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.image_cache')
+)
+
+# Decoded (full-resolution) pixels of stored uploads, so re-cropping skips decoding
+DECODED_CACHE_MB = float(os.environ.get('PROPOSAL_DECODED_CACHE_MB', '128'))
+
+
+class ImageCache:
+    """
+    Two-tier LRU cache of encoded image blobs
+    """
+
+    def __init__(self, max_memory_bytes, cache_dir=None, max_disk_bytes=0):
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = cache_dir if max_disk_bytes > 0 else None
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(source_bytes, **settings):
+        """
+        Build a cache key from the source bytes and the output settings
+        Args:
+            source_bytes: Raw bytes of the source image
+            settings: Everything that changes the output (size, DPI, crop, encoder...)
+        Returns:
+            Hex digest identifying the prepared image
+        """
+        digest = hashlib.sha256(source_bytes).hexdigest()
+        settings_json = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha256(f'{digest}:{settings_json}'.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.bin')
+
+    def get(self, key):
+        """
+        Look up a prepared image
+        Returns:
+            The cached blob, or None on a miss
+        """
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return blob
+
+        if self.cache_dir:
+            disk_path = self._disk_path(key)
+            try:
+                with open(disk_path, 'rb') as cache_file:
+                    blob = cache_file.read()
+                # Refresh the entry's age for disk LRU eviction
+                os.utime(disk_path)
+            except OSError:
+                blob = None
+
+            if blob is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._remember(key, blob)
+                return blob
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, blob):
+        """
+        Store a prepared image in memory and on disk
+        """
+        self._remember(key, blob)
+
+        if self.cache_dir:
+            disk_path = self._disk_path(key)
+            if os.path.exists(disk_path):
+                return
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(disk_path), suffix='.tmp')
+                with os.fdopen(temp_fd, 'wb') as temp_file:
+                    temp_file.write(blob)
+                # Atomic so concurrent workers never read a half-written entry
+                os.replace(temp_path, disk_path)
+            except OSError as e:
+                log.warning("⚠️ Could not write image cache entry: %s", e)
+                return
+            self._evict_disk(len(blob))
+
+    def _remember(self, key, blob):
+        if len(blob) > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = blob
+            self._memory_bytes += len(blob)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _iter_disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.bin'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _evict_disk(self, added_bytes):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._iter_disk_entries())
+            else:
+                self._disk_bytes += added_bytes
+
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            # Oldest (least recently used) entries go first
+            for _, size, path in sorted(self._iter_disk_entries()):
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    self._disk_bytes -= size
+                except OSError:
+                    pass
+
+    def stats(self):
+        """
+        Hit/miss counters and current sizes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'memory_bytes': self._memory_bytes,
+            }
+
+
+class DecodedImageCache:
+    """
+    In-memory LRU of decoded PIL images keyed by a stable source ID, bounded
+    by the size of their pixel buffers
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, source_id):
+        """
+        Look up a decoded image
+        Returns:
+            The decoded image (treat as read-only), or None on a miss
+        """
+        with self._lock:
+            image = self._entries.get(source_id)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(source_id)
+            self.hits += 1
+            return image
+
+    def put(self, source_id, image):
+        """
+        Keep a decoded image for later crops of the same source
+        """
+        size = self._image_bytes(image)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if source_id in self._entries:
+                self._entries.move_to_end(source_id)
+                return
+            self._entries[source_id] = image
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._image_bytes(evicted)
+
+    def stats(self):
+        """
+        Hit/miss counters and current size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+_decoded_image_cache = None
+
+
+def get_image_cache():
+    """
+    Return the process-wide image cache, or None if caching is disabled
+    """
+    global _image_cache
+    if IMAGE_CACHE_MEMORY_MB <= 0 and IMAGE_CACHE_DISK_MB <= 0:
+        return None
+
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache(
+                max_memory_bytes=int(IMAGE_CACHE_MEMORY_MB * 1024 * 1024),
+                cache_dir=IMAGE_CACHE_DIR,
+                max_disk_bytes=int(IMAGE_CACHE_DISK_MB * 1024 * 1024),
+            )
+        return _image_cache
+
+
+def get_decoded_image_cache():
+    """
+    Return the process-wide decoded-image cache, or None if it is disabled
+    """
+    global _decoded_image_cache
+    if DECODED_CACHE_MB <= 0:
+        return None
+
+    with _image_cache_lock:
+        if _decoded_image_cache is None:
+            _decoded_image_cache = DecodedImageCache(int(DECODED_CACHE_MB * 1024 * 1024))
+        return _decoded_image_cache
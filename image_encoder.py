@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Content-aware encoder selection for prepared placeholder images
+Each resized image is classified as a photo, line art or an image with real
+transparency, and encoded with the format that suits it: JPEG for photos,
+palette-quantized PNG for diagrams and lossless PNG when nothing lossy stays
+above the quality floor
+"""
+
+import math
+import os
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageStat
+
+# 'auto' picks an encoder per image; 'png' keeps the old PNG optimize=True output
+IMAGE_ENCODER = os.environ.get('PROPOSAL_IMAGE_ENCODER', 'auto')
+JPEG_QUALITY = int(os.environ.get('PROPOSAL_JPEG_QUALITY', '85'))
+
+# Lossy encodings whose PSNR against the resized image falls below this are
+# replaced by lossless PNG
+QUALITY_FLOOR_DB = float(os.environ.get('PROPOSAL_IMAGE_QUALITY_FLOOR_DB', '30'))
+
+# Images with at most this many distinct colors (and no more than one new color
+# per LINE_ART_PIXELS_PER_COLOR pixels) are treated as line art; anti-aliased
+# diagrams stay well below it, photos are far above
+LINE_ART_MAX_COLORS = 8192
+LINE_ART_PIXELS_PER_COLOR = 8
+
+# Set PROPOSAL_ENCODER_REPORT=1 to also encode the PNG optimize=True baseline
+# and report the bytes and encode time each choice saved
+ENCODER_REPORT = os.environ.get('PROPOSAL_ENCODER_REPORT', '') == '1'
+
+_totals = {'images': 0, 'bytes': 0, 'encode_ms': 0.0, 'saved_bytes': 0, 'saved_ms': 0.0}
+_totals_lock = threading.Lock()
+
+
+def encoder_settings():
+    """
+    Everything about encoding that changes the output bytes (for cache keys)
+    """
+    if IMAGE_ENCODER == 'png':
+        return 'png-optimize'
+    return f'auto:jpeg{JPEG_QUALITY}:floor{QUALITY_FLOOR_DB:g}'
+
+
+def flatten_opaque_alpha(img):
+    """
+    Drop the alpha channel when every pixel is fully opaque
+    """
+    if img.mode == 'RGBA' and img.getchannel('A').getextrema()[0] == 255:
+        return img.convert('RGB')
+    return img
+
+
+def classify_image(img):
+    """
+    Classify an RGB/RGBA image
+    Returns:
+        Tuple of (kind, distinct color count or None when above the line-art limit);
+        kind is 'photo', 'photo-alpha', 'line-art' or 'line-art-alpha'
+    """
+    max_colors = min(LINE_ART_MAX_COLORS, img.width * img.height // LINE_ART_PIXELS_PER_COLOR)
+    colors = img.getcolors(maxcolors=max(256, max_colors))
+    kind = 'photo' if colors is None else 'line-art'
+    if img.mode == 'RGBA':
+        kind += '-alpha'
+    return kind, (len(colors) if colors is not None else None)
+
+
+def psnr(original, encoded):
+    """
+    Peak signal-to-noise ratio in dB between two images of the same size
+    """
+    if encoded.mode != original.mode:
+        encoded = encoded.convert(original.mode)
+    rms = ImageStat.Stat(ImageChops.difference(original, encoded)).rms
+    mse = sum(value * value for value in rms) / len(rms)
+    if mse == 0:
+        return math.inf
+    return 10 * math.log10(255 * 255 / mse)
+
+
+def _save(img, image_format, dpi, **options):
+    stream = BytesIO()
+    img.save(stream, image_format, dpi=(dpi, dpi), **options)
+    return stream.getvalue()
+
+
+def _encode_lossless(img, dpi):
+    # compress_level 6 is zlib's default; the optimize pass costs far more time than it saves bytes
+    return _save(img, 'PNG', dpi, compress_level=6), 'png'
+
+
+def _encode_line_art(img, dpi, color_count):
+    # Pillow only quantizes RGBA images with the octree method
+    method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+    if color_count <= 256:
+        # Already fits a palette, so quantizing is lossless
+        return _save(img.quantize(colors=color_count, method=method), 'PNG', dpi, compress_level=9), 'png-palette'
+
+    quantized = img.quantize(colors=256, method=method, dither=Image.Dither.NONE)
+    if psnr(img, quantized.convert(img.mode)) >= QUALITY_FLOOR_DB:
+        return _save(quantized, 'PNG', dpi, compress_level=9), 'png-palette'
+    return _encode_lossless(img, dpi)
+
+
+def _encode_photo(img, dpi):
+    blob = _save(img, 'JPEG', dpi, quality=JPEG_QUALITY, subsampling='4:2:0')
+    with Image.open(BytesIO(blob)) as decoded:
+        if psnr(img, decoded) >= QUALITY_FLOOR_DB:
+            return blob, 'jpeg'
+    return _encode_lossless(img, dpi)
+
+
+def encode_image(img, dpi=300):
+    """
+    Encode a resized RGB/RGBA image with the encoder that suits its content
+    Args:
+        img: Resized PIL image
+        dpi: DPI recorded in the encoded image
+    Returns:
+        Tuple of (encoded bytes, info dict with kind, encoder, bytes and encode_ms)
+    """
+    start = time.perf_counter()
+
+    if IMAGE_ENCODER == 'png':
+        kind = 'any'
+        blob, encoder = _save(img, 'PNG', dpi, optimize=True), 'png-optimize'
+    else:
+        img = flatten_opaque_alpha(img)
+        kind, color_count = classify_image(img)
+        if kind.startswith('line-art'):
+            blob, encoder = _encode_line_art(img, dpi, color_count)
+        elif kind == 'photo':
+            blob, encoder = _encode_photo(img, dpi)
+        else:
+            # JPEG has no alpha and PowerPoint cannot embed WebP, so real transparency stays PNG
+            blob, encoder = _encode_lossless(img, dpi)
+
+    info = {
+        'kind': kind,
+        'encoder': encoder,
+        'bytes': len(blob),
+        'encode_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+    if ENCODER_REPORT and IMAGE_ENCODER != 'png':
+        baseline_start = time.perf_counter()
+        baseline = _save(img, 'PNG', dpi, optimize=True)
+        info['saved_bytes'] = len(baseline) - len(blob)
+        info['saved_ms'] = round((time.perf_counter() - baseline_start) * 1000 - info['encode_ms'], 1)
+
+    with _totals_lock:
+        _totals['images'] += 1
+        _totals['bytes'] += info['bytes']
+        _totals['encode_ms'] += info['encode_ms']
+        _totals['saved_bytes'] += info.get('saved_bytes', 0)
+        _totals['saved_ms'] += info.get('saved_ms', 0.0)
+
+    return blob, info
+
+
+def describe_encoding(info):
+    """
+    One-line summary of an encode_image() result for logging
+    """
+    summary = f"{info['kind']} -> {info['encoder']}, {info['bytes']} bytes in {info['encode_ms']}ms"
+    if 'saved_bytes' in info:
+        summary += f" (saved {info['saved_bytes']} bytes, {info['saved_ms']}ms vs PNG optimize)"
+    return summary
+
+
+def encoder_stats():
+    """
+    Totals over every image encoded by this process
+    """
+    with _totals_lock:
+        return dict(_totals, encode_ms=round(_totals['encode_ms'], 1), saved_ms=round(_totals['saved_ms'], 1))
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+In-memory image pipeline for the proposal generators
+Decode, crop, resize and encode all happen on memory buffers that are handed
+straight to python-pptx's add_picture; disk is only used as an explicit fallback
+"""
+
+import math
+import os
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+
+from image_cache import get_decoded_image_cache, get_image_cache
+from image_encoder import describe_encoding, encode_image, encoder_settings
+from memory_profile import memory_mark
+from proposal_log import get_logger, is_debug
+
+log = get_logger('image_pipeline')
+
+# Set PROPOSAL_IMAGE_SPOOL_TO_DISK=1 to write prepared images to temp files
+# instead of keeping them in memory (e.g. on very memory-constrained hosts)
+IMAGE_SPOOL_TO_DISK = os.environ.get('PROPOSAL_IMAGE_SPOOL_TO_DISK', '') == '1'
+
+# Threads used to prepare placeholder images concurrently (Pillow releases the
+# GIL while decoding, resizing and encoding)
+IMAGE_WORKERS = int(os.environ.get('PROPOSAL_IMAGE_WORKERS', str(min(8, os.cpu_count() or 1))))
+
+# Downscale fast path for large photos: JPEGs are decoded at a reduced scale with
+# draft(), then resize() applies integer reduce() steps until the image is within
+# REDUCING_GAP times the target size and resamples only that last factor with
+# LANCZOS. Set PROPOSAL_FAST_DOWNSCALE=0 to always decode and resample at full size.
+FAST_DOWNSCALE = os.environ.get('PROPOSAL_FAST_DOWNSCALE', '1') == '1'
+REDUCING_GAP = 3.0
+
+# Effective resolution placeholder images are prepared at; pixel sizes come from
+# the placeholder shape's real size in the template, so nothing is encoded that
+# PowerPoint would only scale away
+IMAGE_DPI = int(os.environ.get('PROPOSAL_IMAGE_DPI', '300'))
+
+EMU_PER_INCH = 914400
+
+# 'pixels' crops and resizes uploads on the server; 'srcrect' embeds the original
+# upload once and expresses the crop through the picture's a:srcRect offsets
+IMAGE_EMBED_MODE = os.environ.get('PROPOSAL_IMAGE_EMBED', 'pixels')
+
+
+def cm_to_px(size_cm, dpi):
+    """
+    Convert a length in centimeters to pixels at the given DPI
+    """
+    return int(size_cm * dpi / 2.54)
+
+
+def pipeline_settings():
+    """
+    Process-wide settings that change prepared image bytes (for result cache keys)
+    """
+    return {
+        'dpi': IMAGE_DPI,
+        'fast_downscale': FAST_DOWNSCALE,
+        'reducing_gap': REDUCING_GAP,
+        'encoder': encoder_settings(),
+    }
+
+
+def emu_to_px(size_emu, dpi=IMAGE_DPI):
+    """
+    Convert a length in EMU (English Metric Units) to pixels at the given DPI
+    """
+    return max(1, round(size_emu * dpi / EMU_PER_INCH))
+
+
+def placeholder_pixel_size(location, dpi=IMAGE_DPI):
+    """
+    Pixel dimensions for an image filling an indexed placeholder shape
+    Args:
+        location: Location dict from the compiled template index
+        dpi: Effective resolution of the image on the slide
+    Returns:
+        Tuple of (width_px, height_px)
+    """
+    return emu_to_px(location['width'], dpi), emu_to_px(location['height'], dpi)
+
+
+def open_image(source):
+    """
+    Open an image from a path, raw bytes or a file-like object
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    return Image.open(source)
+
+
+def draft_decode(img, width_px, height_px, crop_box=None):
+    """
+    Ask the JPEG decoder for the smallest DCT scale (1/2, 1/4 or 1/8) that still
+    covers the target size, and map the crop box onto the reduced image
+    Args:
+        img: Freshly opened, not yet loaded JPEG image
+        width_px: Target width in pixels
+        height_px: Target height in pixels
+        crop_box: Optional (left, top, right, bottom) in full-size coordinates
+    Returns:
+        Crop box in the coordinates of the (possibly) reduced image, or None
+    """
+    full_width, full_height = img.size
+    left, top, right, bottom = crop_box or (0, 0, full_width, full_height)
+
+    # Size the whole image has to decode at so the crop region still has enough pixels
+    requested = (
+        math.ceil(width_px * full_width / max(1, right - left)),
+        math.ceil(height_px * full_height / max(1, bottom - top)),
+    )
+    img.draft(img.mode, requested)
+
+    if crop_box is None:
+        return None
+    scale_x = img.size[0] / full_width
+    scale_y = img.size[1] / full_height
+    return (left * scale_x, top * scale_y, right * scale_x, bottom * scale_y)
+
+
+def fit_crop_to_aspect(crop_box, image_size, aspect):
+    """
+    Grow a crop box around its centre to a target aspect ratio, so a picture
+    cropped in its XML is not stretched by a placeholder of another shape
+    The box is widened (or heightened) first and shifted to stay inside the
+    image; only when the image itself is too small is the other side trimmed
+    Args:
+        crop_box: (left, top, right, bottom) in original pixel coordinates
+        image_size: (width, height) of the original image
+        aspect: Target width / height
+    Returns:
+        (left, top, right, bottom) with the target aspect ratio
+    """
+    width, height = image_size
+    left, top, right, bottom = crop_box
+    crop_width, crop_height = right - left, bottom - top
+    centre_x, centre_y = (left + right) / 2, (top + bottom) / 2
+
+    if crop_width / crop_height < aspect:
+        crop_width = crop_height * aspect
+    else:
+        crop_height = crop_width / aspect
+    if crop_width > width:
+        crop_width, crop_height = width, width / aspect
+    if crop_height > height:
+        crop_width, crop_height = height * aspect, height
+
+    left = min(max(0.0, centre_x - crop_width / 2), width - crop_width)
+    top = min(max(0.0, centre_y - crop_height / 2), height - crop_height)
+    return (left, top, left + crop_width, top + crop_height)
+
+
+def source_crop(source_bytes, crop_box, image_size, aspect=None):
+    """
+    Describe an original image plus the crop to show, for srcRect embedding
+    Args:
+        source_bytes: Encoded bytes of the original upload
+        crop_box: (left, top, right, bottom) in original pixel coordinates
+        image_size: (width, height) of the original image
+        aspect: Optional width / height of the placeholder; the crop is fitted
+                to it (see fit_crop_to_aspect)
+    Returns:
+        Dictionary with the source bytes and the crop as fractions of each side
+    """
+    width, height = image_size
+    if aspect:
+        crop_box = fit_crop_to_aspect(crop_box, image_size, aspect)
+    left, top, right, bottom = crop_box
+    return {
+        'source_bytes': source_bytes,
+        'crop': {
+            'left': left / width,
+            'top': top / height,
+            'right': (width - right) / width,
+            'bottom': (height - bottom) / height,
+        },
+    }
+
+
+def add_placeholder_picture(shapes, image, location):
+    """
+    Add a prepared image at a placeholder location
+    Args:
+        shapes: Shape collection of the slide
+        image: Prepared image (stream or path), or a source_crop() dictionary
+        location: Location dict from the compiled template index
+    Returns:
+        The new picture shape
+    """
+    if not isinstance(image, dict):
+        return shapes.add_picture(image, location['left'], location['top'], location['width'], location['height'])
+
+    # Identical source bytes are stored as a single media part by python-pptx
+    picture = shapes.add_picture(
+        BytesIO(image['source_bytes']), location['left'], location['top'], location['width'], location['height']
+    )
+    picture.crop_left = image['crop']['left']
+    picture.crop_top = image['crop']['top']
+    picture.crop_right = image['crop']['right']
+    picture.crop_bottom = image['crop']['bottom']
+    return picture
+
+
+def read_source_bytes(source):
+    """
+    Read the raw bytes of an image given as a path, bytes or file-like object
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, 'rb') as source_file:
+            return source_file.read()
+    source.seek(0)
+    return source.read()
+
+
+def decode_image(source_bytes):
+    """
+    Fully decode an image at its original resolution into RGB/RGBA pixels
+    """
+    with open_image(source_bytes) as img:
+        if img.mode not in ('RGB', 'RGBA'):
+            return img.convert('RGB')
+        img.load()
+        return img.copy()
+
+
+def _decode_and_resize(source_bytes, width_px, height_px, crop_box):
+    """
+    Decode (at reduced scale for JPEGs when possible), crop and resize in one pass
+    """
+    with open_image(source_bytes) as img:
+        box = crop_box
+        if FAST_DOWNSCALE and img.format == 'JPEG':
+            box = draft_decode(img, width_px, height_px, crop_box)
+
+        # Convert to RGB if necessary
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+        else:
+            img.load()
+        memory_mark('pil_decode')
+
+        # The crop is applied through resize's box so no cropped copy is made
+        resized_img = img.resize(
+            (width_px, height_px), Image.Resampling.LANCZOS, box=box,
+            reducing_gap=REDUCING_GAP if FAST_DOWNSCALE else None
+        )
+        memory_mark('resize')
+        return resized_img
+
+
+def resize_to_stream(source, width_px, height_px, dpi=300, crop_box=None, use_cache=True, source_id=None):
+    """
+    Decode, optionally crop, resize and encode an image into memory
+    Args:
+        source: Path, bytes or file-like object holding the input image
+        width_px: Target width in pixels
+        height_px: Target height in pixels
+        dpi: DPI recorded in the encoded image
+        crop_box: Optional (left, top, right, bottom) crop applied before resizing
+        use_cache: Look the result up in (and store it to) the image cache
+        source_id: Stable ID of the source (e.g. an upload store ID); when given,
+                   the full decode is kept in the decoded-image cache so later
+                   crops of the same source skip decoding
+    Returns:
+        BytesIO positioned at the start of the encoded image (JPEG or PNG,
+        chosen per image by the encoder planner)
+    """
+    source_bytes = read_source_bytes(source)
+    memory_mark('read_source')
+
+    decoded_cache = get_decoded_image_cache() if source_id else None
+
+    cache = get_image_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(
+            source_bytes, width=width_px, height=height_px, dpi=dpi,
+            crop_box=crop_box, encoder=encoder_settings(), resample='lanczos',
+            fast_downscale=FAST_DOWNSCALE and decoded_cache is None, reducing_gap=REDUCING_GAP
+        )
+        cached_blob = cache.get(cache_key)
+        if cached_blob is not None:
+            log.debug("♻️ Image cache hit for %dx%dpx image", width_px, height_px)
+            return BytesIO(cached_blob)
+
+    if decoded_cache is not None:
+        img = decoded_cache.get(source_id)
+        if img is None:
+            img = decode_image(source_bytes)
+            decoded_cache.put(source_id, img)
+        else:
+            log.debug("♻️ Decoded image cache hit for %.12s", source_id)
+        memory_mark('pil_decode')
+        resized_img = img.resize(
+            (width_px, height_px), Image.Resampling.LANCZOS, box=crop_box,
+            reducing_gap=REDUCING_GAP if FAST_DOWNSCALE else None
+        )
+        memory_mark('resize')
+    else:
+        resized_img = _decode_and_resize(source_bytes, width_px, height_px, crop_box)
+
+    blob, encoding = encode_image(resized_img, dpi=dpi)
+    memory_mark('encode')
+    if is_debug(log):
+        log.debug("🗜️ Encoded %dx%dpx image: %s", width_px, height_px, describe_encoding(encoding))
+
+    if cache is not None:
+        cache.put(cache_key, blob)
+
+    return BytesIO(blob)
+
+
+def image_extension(stream):
+    """
+    File extension matching the format of an encoded image
+    """
+    return '.jpg' if stream.getvalue()[:3] == b'\xff\xd8\xff' else '.png'
+
+
+def spool_to_disk(stream, prefix, directory=None):
+    """
+    Write an in-memory image to a temporary file (disk fallback)
+    Args:
+        stream: BytesIO holding the encoded image
+        prefix: Temporary file name prefix
+        directory: Directory for the file (defaults to the system temp dir)
+    Returns:
+        Path to the written file; the caller is responsible for removing it
+    """
+    temp_fd, temp_path = tempfile.mkstemp(suffix=image_extension(stream), prefix=prefix, dir=directory)
+    with os.fdopen(temp_fd, 'wb') as temp_file:
+        temp_file.write(stream.getvalue())
+    return temp_path
+
+
+def image_size_bytes(image):
+    """
+    Size in bytes of a prepared image, whether it is in memory or on disk
+    """
+    if isinstance(image, dict):
+        return len(image['source_bytes'])
+    if isinstance(image, str):
+        return os.path.getsize(image)
+    return image.getbuffer().nbytes
+
+
+def discard_image(image):
+    """
+    Release a prepared image; only spooled temp files need removing
+    Returns:
+        True if a temporary file was removed
+    """
+    if isinstance(image, str) and os.path.exists(image):
+        os.unlink(image)
+        return True
+    return False
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the proposal front ends
+Replays synthetic (or recorded) form submissions with real photo uploads
+against Example.py's /generate or server.js's /api/generate-proposal, at a
+fixed concurrency and optionally a fixed arrival rate, and reports latency
+percentiles, error rate, throughput and the server's RSS over time. Only
+local servers are accepted, so a run never leaves the machine.
+
+Usage:
+    python loadtest.py --target flask --requests 40 --concurrency 4
+    python loadtest.py --target node --rate 2 --duration 60 --server-pid 12345 --output load.json
+
+Recorded submissions (--replay) are JSON lines of
+    {"fields": {"building_name": "...", ...}, "files": {"imageData": "/path/to/photo.jpg", ...}}
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from benchmark import form_data, make_photo, percentile
+
+TARGETS = {
+    'flask': 'http://localhost:5000/generate',
+    'node': 'http://localhost:3000/api/generate-proposal',
+}
+
+# Multipart file fields each front end reads photos from
+FLASK_IMAGE_FIELDS = (('cropped_image_file', 'crop_coordinates'), ('cropped_image_file_2', 'crop_coordinates_2'))
+NODE_IMAGE_FIELDS = (
+    'imageData', 'mccbImageData', 'tpsldImageData', 'tpmccbcompartmentImageData',
+    'tptappinglocImageData', 'tprouting1ImageData', 'tprouting2ImageData', 'tprouting3ImageData',
+)
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def synthetic_submissions(target, photo_paths):
+    """
+    One submission template per front end: every image field gets its own
+    synthetic photo, and Flask gets crop rectangles covering the whole photo
+    Returns:
+        Submission dictionary with 'fields' and 'files'
+    """
+    from PIL import Image
+
+    if target == 'flask':
+        fields, files = {}, {}
+        for (file_field, crop_field), photo_path in zip(FLASK_IMAGE_FIELDS, photo_paths):
+            with Image.open(photo_path) as photo:
+                fields[crop_field] = json.dumps({'x': 0, 'y': 0, 'width': photo.width, 'height': photo.height})
+            files[file_field] = photo_path
+        return {'fields': fields, 'files': files}
+
+    return {'fields': {}, 'files': dict(zip(NODE_IMAGE_FIELDS, photo_paths))}
+
+
+def encode_multipart(fields, files, file_bytes, salt=None):
+    """
+    Build a multipart/form-data body
+    Args:
+        fields: Text fields
+        files: Field name -> photo path
+        file_bytes: Photo path -> bytes (read once, shared by every request)
+        salt: When given, appended after each JPEG's end marker so the bytes
+              (and every content-keyed cache) differ while the pixels do not
+    Returns:
+        Tuple of (content type, body bytes)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        )
+    for name, photo_path in files.items():
+        content = file_bytes[photo_path]
+        if salt is not None:
+            content += salt
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{os.path.basename(photo_path)}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def process_tree_rss_mb(root_pid):
+    """
+    Resident memory of a process and all its descendants (Linux /proc only)
+    Returns:
+        RSS in MB, or None if the process is gone
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', encoding='utf-8') as stat_file:
+                # The command name may contain spaces; fields resume after its ')'
+                ppid = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total_kb = 0
+    pending = [root_pid]
+    found = False
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/status', encoding='utf-8') as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+            found = True
+        except OSError:
+            continue
+        pending.extend(children.get(pid, []))
+    return round(total_kb / 1024, 1) if found else None
+
+
+class LoadTest:
+    """
+    Sends submissions from a pool of client threads and records every request
+    """
+
+    def __init__(self, url, submissions, concurrency, rate, total_requests, duration, vary_images, timeout):
+        self.url = urlsplit(url)
+        self.submissions = submissions
+        self.concurrency = concurrency
+        self.rate = rate
+        self.total_requests = total_requests
+        self.duration = duration
+        self.vary_images = vary_images
+        self.timeout = timeout
+        self.records = []
+        self.rss_samples = []
+        self._records_lock = threading.Lock()
+        self._file_bytes = {}
+        for submission in submissions:
+            for photo_path in submission['files'].values():
+                if photo_path not in self._file_bytes:
+                    with open(photo_path, 'rb') as photo_file:
+                        self._file_bytes[photo_path] = photo_file.read()
+
+    def _send(self, sequence):
+        submission = self.submissions[sequence % len(self.submissions)]
+        # The front ends take dates as the browser's date inputs send them
+        fields = dict(form_data(sequence), survey_date='2025-01-01', prepared_date='2025-01-02')
+        fields.update(submission['fields'])
+        salt = f'\n{sequence}'.encode('ascii') if self.vary_images else None
+        content_type, body = encode_multipart(fields, submission['files'], self._file_bytes, salt)
+
+        connection = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+        try:
+            connection.request('POST', self.url.path or '/', body=body,
+                               headers={'Content-Type': content_type, 'Content-Length': str(len(body))})
+            response = connection.getresponse()
+            payload = response.read()
+            # Example.py answers failures with a redirect back to the form
+            return response.status, len(payload), None if response.status == 200 else f'HTTP {response.status}'
+        except (OSError, http.client.HTTPException) as e:
+            return None, 0, f'{type(e).__name__}: {e}'
+        finally:
+            connection.close()
+
+    def _worker(self, schedule, started):
+        while True:
+            item = schedule.get()
+            if item is None:
+                return
+            sequence, due = item
+            if due is not None:
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            status, response_bytes, error = self._send(sequence)
+            finished = time.perf_counter()
+            record = {
+                'sequence': sequence,
+                'sent_s': round(sent - started, 3),
+                # Measured from the scheduled arrival, so time spent queued
+                # behind a slow server counts against it
+                'latency_ms': round((finished - (due if due is not None else sent)) * 1000, 1),
+                'status': status,
+                'bytes': response_bytes,
+                'error': error,
+            }
+            with self._records_lock:
+                self.records.append(record)
+
+    def _sample_rss(self, server_pids, interval, started, stop):
+        while not stop.is_set():
+            sample = {'t_s': round(time.perf_counter() - started, 2)}
+            for pid in server_pids:
+                sample[str(pid)] = process_tree_rss_mb(pid)
+            self.rss_samples.append(sample)
+            stop.wait(interval)
+
+    def run(self, server_pids=(), rss_interval=0.5):
+        """
+        Run the load test
+        Returns:
+            Elapsed wall-clock seconds
+        """
+        schedule = queue.Queue(maxsize=self.concurrency * 2)
+        started = time.perf_counter()
+        stop_sampling = threading.Event()
+
+        sampler = None
+        if server_pids:
+            sampler = threading.Thread(target=self._sample_rss, args=(server_pids, rss_interval, started, stop_sampling), daemon=True)
+            sampler.start()
+
+        workers = [threading.Thread(target=self._worker, args=(schedule, started), daemon=True) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        # Open loop with --rate (arrivals every 1/rate seconds regardless of
+        # responses), closed loop otherwise (each client sends when it is free)
+        sequence = 0
+        while True:
+            if self.total_requests and sequence >= self.total_requests:
+                break
+            due = started + sequence / self.rate if self.rate else None
+            if self.duration and (due or time.perf_counter()) - started >= self.duration:
+                break
+            schedule.put((sequence, due))
+            sequence += 1
+
+        for _ in workers:
+            schedule.put(None)
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        stop_sampling.set()
+        if sampler is not None:
+            sampler.join()
+        return elapsed
+
+    def summary(self, elapsed):
+        """
+        Aggregate results of a finished run
+        """
+        ok = [record for record in self.records if record['error'] is None]
+        latencies = [record['latency_ms'] for record in ok]
+        errors = {}
+        for record in self.records:
+            if record['error'] is not None:
+                errors[record['error']] = errors.get(record['error'], 0) + 1
+
+        result = {
+            'requests': len(self.records),
+            'succeeded': len(ok),
+            'error_rate': round(1 - len(ok) / len(self.records), 4) if self.records else 0.0,
+            'errors': errors,
+            'elapsed_s': round(elapsed, 2),
+            'throughput_per_sec': round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        }
+        if latencies:
+            result.update({
+                'latency_p50_ms': round(percentile(latencies, 50), 1),
+                'latency_p99_ms': round(percentile(latencies, 99), 1),
+                'latency_max_ms': max(latencies),
+            })
+        peaks = {}
+        for sample in self.rss_samples:
+            for pid, rss in sample.items():
+                if pid != 't_s' and rss is not None:
+                    peaks[pid] = max(peaks.get(pid, 0.0), rss)
+        if peaks:
+            result['server_peak_rss_mb'] = peaks
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the proposal front ends on localhost')
+    parser.add_argument('--target', choices=sorted(TARGETS), default='flask', help='Front end to load (default: flask)')
+    parser.add_argument('--url', help='Override the endpoint URL (must be a local address)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads (default: 4)')
+    parser.add_argument('--rate', type=float, default=0, help='Arrivals per second (default: closed loop, as fast as clients free up)')
+    parser.add_argument('--requests', type=int, default=40, help='Total requests (0 to run for --duration only)')
+    parser.add_argument('--duration', type=float, default=0, help='Stop scheduling requests after this many seconds')
+    parser.add_argument('--replay', help='JSON-lines file of recorded submissions to replay round-robin')
+    parser.add_argument('--photo-mp', type=float, default=12, dest='photo_mp', help='Size of the synthetic photos in megapixels')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic photos')
+    parser.add_argument('--vary-images', action='store_true', dest='vary_images',
+                        help='Make every request\'s photo bytes unique so server-side caches cannot answer')
+    parser.add_argument('--server-pid', type=int, action='append', default=[], dest='server_pids',
+                        help='Server process to sample RSS from, children included (repeatable)')
+    parser.add_argument('--rss-interval', type=float, default=0.5, dest='rss_interval', help='Seconds between RSS samples')
+    parser.add_argument('--timeout', type=float, default=300, help='Per-request timeout in seconds')
+    parser.add_argument('--work-dir', dest='work_dir', help='Directory for synthetic photos (default: a temp dir)')
+    parser.add_argument('--output', help='Write the summary, every request and the RSS samples to this JSON file')
+    args = parser.parse_args()
+
+    url = args.url or TARGETS[args.target]
+    if urlsplit(url).hostname not in LOCAL_HOSTS:
+        parser.error(f'refusing to load a non-local server: {url}')
+    if not (args.requests or args.duration):
+        parser.error('give --requests, --duration or both')
+
+    if args.replay:
+        with open(args.replay, encoding='utf-8') as replay_file:
+            submissions = [json.loads(line) for line in replay_file if line.strip()]
+    else:
+        work_dir = os.path.abspath(args.work_dir or os.path.join(tempfile.gettempdir(), 'proposal-benchmark'))
+        os.makedirs(work_dir, exist_ok=True)
+        image_count = len(FLASK_IMAGE_FIELDS) if args.target == 'flask' else len(NODE_IMAGE_FIELDS)
+        photo_paths = []
+        for index in range(image_count):
+            photo_path = os.path.join(work_dir, f'photo_{args.photo_mp:g}mp_seed{args.seed + index}.jpg')
+            if not os.path.exists(photo_path):
+                print(f"📷 Building synthetic {args.photo_mp:g} MP photo {index + 1}/{image_count}")
+                make_photo(photo_path, args.photo_mp, args.seed + index)
+            photo_paths.append(photo_path)
+        submissions = [synthetic_submissions(args.target, photo_paths)]
+
+    load_test = LoadTest(url, submissions, max(1, args.concurrency), args.rate, args.requests, args.duration,
+                         args.vary_images, args.timeout)
+    mode = f'{args.rate:g} req/s open loop' if args.rate else 'closed loop'
+    print(f"🚀 Loading {url} with {args.concurrency} client(s), {mode}")
+    elapsed = load_test.run(args.server_pids, args.rss_interval)
+    summary = load_test.summary(elapsed)
+
+    print(f"📊 {summary['succeeded']}/{summary['requests']} succeeded in {summary['elapsed_s']}s "
+          f"({summary['throughput_per_sec']}/s, error rate {summary['error_rate']:.1%})")
+    if 'latency_p50_ms' in summary:
+        print(f"⏱️ p50 {summary['latency_p50_ms']} ms, p99 {summary['latency_p99_ms']} ms, max {summary['latency_max_ms']} ms")
+    for error, count in summary['errors'].items():
+        print(f"❌ {count} x {error}")
+    for pid, peak in summary.get('server_peak_rss_mb', {}).items():
+        print(f"🧠 Server {pid} peak RSS {peak} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({
+                'url': url,
+                'config': {
+                    'concurrency': args.concurrency, 'rate': args.rate, 'requests': args.requests,
+                    'duration': args.duration, 'photo_mp': args.photo_mp, 'vary_images': args.vary_images,
+                    'replay': args.replay,
+                },
+                'summary': summary,
+                'requests': sorted(load_test.records, key=lambda record: record['sequence']),
+                'rss_samples': load_test.rss_samples,
+            }, output_file, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
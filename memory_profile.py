@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Per-stage memory profiling for single generations
+While a MemoryProfile is active, every stage boundary (StageTimings laps and
+the memory_mark() calls in the image pipeline) records the peak traced
+memory since the previous boundary and the allocation sites that grew the
+most. Pillow allocates pixel buffers outside the Python allocator, so
+tracemalloc does not see them; each stage therefore also records how much
+it raised the process's peak RSS. With no profile active memory_mark() is a
+single global check and tracemalloc is never started.
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from proposal_log import get_logger
+
+log = get_logger('memory_profile')
+
+# Allocation sites reported per stage, and stack depth recorded per allocation
+MEMORY_PROFILE_TOP = int(os.environ.get('PROPOSAL_MEMORY_PROFILE_TOP', '10'))
+MEMORY_PROFILE_FRAMES = int(os.environ.get('PROPOSAL_MEMORY_PROFILE_FRAMES', '1'))
+
+# Tracing is process-wide, so only one generation is profiled at a time
+_active = None
+_active_lock = threading.Lock()
+
+# The profiler's own bookkeeping and lazy imports would otherwise top every stage
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ProfileBusy(Exception):
+    """
+    Raised when a profile is started while another generation is being profiled
+    """
+
+
+class MemoryProfile:
+    """
+    Context manager tracing allocations of one generation, stage by stage
+    Allocations from other threads are traced too, so profiled runs should
+    prepare their images on a single thread
+    """
+
+    def __init__(self, top=MEMORY_PROFILE_TOP, frames=MEMORY_PROFILE_FRAMES):
+        self.top = top
+        self.frames = frames
+        self.stages = {}
+        self.peak_bytes = 0
+        self.peak_rss_growth_bytes = 0
+        self._snapshot = None
+        self._peak_rss = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        global _active
+        if not _active_lock.acquire(blocking=False):
+            raise ProfileBusy("Another generation is already being profiled")
+
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(self.frames)
+        self._snapshot = self._take_snapshot()
+        self._peak_rss = _peak_rss_bytes()
+        tracemalloc.reset_peak()
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        global _active
+        try:
+            self.mark('finish')
+        finally:
+            _active = None
+            self._snapshot = None
+            if self._started_tracing:
+                tracemalloc.stop()
+            _active_lock.release()
+        return False
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def mark(self, stage):
+        """
+        Close the current stage: charge the peak since the previous mark and
+        the net growth per allocation site to it
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        peak_rss = _peak_rss_bytes()
+        snapshot = self._take_snapshot()
+
+        entry = self.stages.setdefault(stage, {'calls': 0, 'peak_bytes': 0, 'peak_rss_growth_bytes': 0, 'sites': {}})
+        entry['calls'] += 1
+        entry['peak_bytes'] = max(entry['peak_bytes'], peak)
+        self.peak_bytes = max(self.peak_bytes, peak)
+        if peak_rss is not None:
+            entry['peak_rss_growth_bytes'] += peak_rss - self._peak_rss
+            self.peak_rss_growth_bytes += peak_rss - self._peak_rss
+            self._peak_rss = peak_rss
+        for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            site = f'{frame.filename}:{frame.lineno}'
+            size, count = entry['sites'].get(site, (0, 0))
+            entry['sites'][site] = (size + stat.size_diff, count + stat.count_diff)
+
+        self._snapshot = snapshot
+        # Snapshots allocate too; start the next stage's peak after this one
+        tracemalloc.reset_peak()
+
+    def report(self):
+        """
+        Results of the profile
+        Returns:
+            Dictionary with the overall traced 'peak_bytes' and
+            'peak_rss_growth_bytes' and, per stage in the order first seen,
+            the same two figures and its top allocation sites
+        """
+        stages = []
+        for stage, entry in self.stages.items():
+            sites = sorted(entry['sites'].items(), key=lambda item: item[1][0], reverse=True)[:self.top]
+            stages.append({
+                'stage': stage,
+                'calls': entry['calls'],
+                'peak_bytes': entry['peak_bytes'],
+                'peak_rss_growth_bytes': entry['peak_rss_growth_bytes'],
+                'top_sites': [{'site': site, 'size_bytes': size, 'count': count} for site, (size, count) in sites],
+            })
+        return {'peak_bytes': self.peak_bytes, 'peak_rss_growth_bytes': self.peak_rss_growth_bytes, 'stages': stages}
+
+
+def memory_mark(stage):
+    """
+    Mark the end of a stage for the active profile; does nothing otherwise
+    """
+    if _active is not None:
+        _active.mark(stage)
+
+
+def log_memory_report(report):
+    """
+    Log a profile report: one line per stage with its peak and biggest site
+    """
+    log.info("🧠 Peak traced memory %.1f MB, peak RSS grew %.1f MB", report['peak_bytes'] / 1024 ** 2,
+             report['peak_rss_growth_bytes'] / 1024 ** 2, extra={'fields': {'memory_profile': report}})
+    for stage in report['stages']:
+        top = stage['top_sites'][0] if stage['top_sites'] else None
+        log.info("🧠 %-14s traced peak %7.1f MB, RSS peak +%7.1f MB%s", stage['stage'],
+                 stage['peak_bytes'] / 1024 ** 2, stage['peak_rss_growth_bytes'] / 1024 ** 2,
+                 f" (top: {top['site']} +{top['size_bytes'] / 1024 ** 2:.1f} MB)" if top else '')
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Zip-level writer for rendered proposals
+Only the slide parts that were changed (plus their relationships, new media and
+[Content_Types].xml) are serialized and compressed; every other member of the
+template zip is streamed into the output as its raw compressed bytes, so save
+time follows what a render actually changed instead of the size of the package
+"""
+
+import copy
+import os
+import struct
+import time
+import weakref
+import zipfile
+from io import BytesIO
+
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.package import XmlPart
+from pptx.opc.packuri import CONTENT_TYPES_URI
+from pptx.opc.serialized import _ContentTypesItem
+
+from proposal_log import get_logger
+
+log = get_logger('package_writer')
+
+# 'zip' copies untouched parts raw; 'pptx' falls back to python-pptx's prs.save()
+RENDER_BACKEND = os.environ.get('PROPOSAL_RENDER_BACKEND', 'zip')
+
+# Local file header: signature, versions, flags, method, time, date, CRC,
+# sizes, then the file name and extra field lengths
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# Package -> {partname: (part, content)} as loaded from the template
+_template_parts = weakref.WeakKeyDictionary()
+
+
+def _part_content(part):
+    # XmlPart serializes its element on demand; binary parts hold their bytes
+    return part._element if isinstance(part, XmlPart) else part._blob
+
+
+def remember_template_parts(prs):
+    """
+    Record which parts of a freshly opened presentation came from the template
+    Only these parts, while still the same objects with the same content, are
+    copied raw by save_presentation(); python-pptx may give a new part the
+    name of an unreferenced template part (e.g. orphaned media), and that
+    part must not be replaced by the template's bytes
+    """
+    package = prs.part.package
+    _template_parts[package] = {
+        str(part.partname): (part, _part_content(part)) for part in package.iter_parts()
+    }
+    return prs
+
+
+def _from_template(template_parts, part):
+    loaded = template_parts.get(str(part.partname))
+    return loaded is not None and loaded[0] is part and loaded[1] is _part_content(part)
+
+
+def _raw_member(template_bytes, info):
+    """
+    Compressed bytes of one template zip member, exactly as stored
+    """
+    header = _LOCAL_HEADER.unpack_from(template_bytes, info.header_offset)
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise ValueError(f"No local file header for {info.filename}")
+    name_length, extra_length = header[-2], header[-1]
+    start = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+    return template_bytes[start:start + info.compress_size]
+
+
+def _copy_raw(output_zip, template_bytes, info):
+    """
+    Append a template member to output_zip without inflating or deflating it
+    This relies on ZipFile internals (fp, start_dir, NameToInfo); nothing is
+    registered until the member is fully written, and the next write starts
+    at start_dir again, so callers can fall back to writestr() on failure
+    """
+    raw_bytes = _raw_member(template_bytes, info)
+    raw_info = copy.copy(info)
+    raw_info.extra = b''
+    # Sizes and CRC go in the local header, so no trailing data descriptor is written
+    raw_info.flag_bits &= ~0x08
+
+    output_zip.fp.seek(output_zip.start_dir)
+    raw_info.header_offset = output_zip.fp.tell()
+    output_zip.fp.write(raw_info.FileHeader())
+    output_zip.fp.write(raw_bytes)
+    output_zip.start_dir = output_zip.fp.tell()
+
+    output_zip.filelist.append(raw_info)
+    output_zip.NameToInfo[raw_info.filename] = raw_info
+
+
+def save_presentation(prs, compiled, output_path, touched_slides):
+    """
+    Save a rendered presentation, re-serializing only the parts that changed
+    Args:
+        prs: Presentation opened from compiled.open() and rendered in place;
+             parts of other presentations are all re-serialized
+        compiled: CompiledTemplate the presentation was opened from
+        output_path: Path where to save the output file
+        touched_slides: Indexes of slides whose XML or relationships changed
+    Returns:
+        Dictionary with the number of parts copied raw and re-serialized
+    """
+    if RENDER_BACKEND != 'zip':
+        prs.save(output_path)
+        return {'backend': 'pptx'}
+
+    started = time.perf_counter()
+    touched_partnames = {compiled.slide_partnames[slide_idx] for slide_idx in touched_slides}
+    template_parts = _template_parts.get(prs.part.package, {})
+    parts = tuple(prs.part.package.iter_parts())
+    copied = written = 0
+    raw_copy_failed = False
+
+    with zipfile.ZipFile(BytesIO(compiled.template_bytes)) as template_zip, \
+            zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as output_zip:
+        template_members = {info.filename: info for info in template_zip.infolist()}
+
+        def write_member(membername, blob_factory, unchanged):
+            nonlocal copied, written, raw_copy_failed
+            info = template_members.get(membername)
+            if info is not None and unchanged and not raw_copy_failed:
+                try:
+                    _copy_raw(output_zip, compiled.template_bytes, info)
+                    copied += 1
+                    return
+                except Exception as e:
+                    log.warning("⚠️ Raw copy of %s failed, re-serializing instead: %s", membername, e)
+                    raw_copy_failed = True
+            output_zip.writestr(membername, blob_factory())
+            written += 1
+
+        # New media can introduce new extensions, so content types are always rebuilt
+        output_zip.writestr(CONTENT_TYPES_URI.membername,
+                            serialize_part_xml(_ContentTypesItem.xml_for(parts)))
+        # Package relationships belong to no part, so they are not tracked; they are tiny
+        output_zip.writestr('_rels/.rels', prs.part.package._rels.xml)
+        written += 1
+
+        for part in parts:
+            unchanged = str(part.partname) not in touched_partnames and _from_template(template_parts, part)
+            write_member(part.partname.membername, lambda: part.blob, unchanged)
+            if len(part.rels):
+                write_member(part.partname.rels_uri.membername, lambda: part.rels.xml, unchanged)
+
+    stats = {
+        'backend': 'zip',
+        'copied_parts': copied,
+        'written_parts': written,
+        'save_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    log.info("💾 Saved %s: %d parts written, %d copied raw in %s ms", output_path, written, copied, stats['save_ms'],
+             extra={'fields': stats})
+    return stats
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Background preparation of placeholder images ahead of generation
+Each image is submitted as soon as its crop is known and processed on a
+thread pool; the generate request then only collects the finished result
+(or waits for the one still running) instead of doing the image work itself
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from image_pipeline import IMAGE_WORKERS, discard_image
+from proposal_log import get_logger
+
+log = get_logger('prepared_images')
+
+# Unclaimed results are dropped after this long
+PREPARED_IMAGE_TTL_SECONDS = float(os.environ.get('PROPOSAL_PREPARED_IMAGE_TTL_SECONDS', '900'))
+
+# How long a generate request waits for a preparation that is still running
+PREPARED_IMAGE_WAIT_SECONDS = float(os.environ.get('PROPOSAL_PREPARED_IMAGE_WAIT_SECONDS', '60'))
+
+
+class PreparedImages:
+    """
+    Registry of background image preparations, keyed by a handle derived from
+    everything that determines the result, so the same request never runs twice
+    and a generate request can find the work without being sent the handle
+    """
+
+    def __init__(self, workers, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prepare-image')
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_handle(*parts):
+        """
+        Handle for a preparation request (e.g. image ID, placeholder and crop)
+        """
+        canonical = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+    def submit(self, handle, func, *args):
+        """
+        Start func(*args) in the background unless the same handle is already
+        pending or ready; func must return an (image, error) tuple
+        Returns:
+            The handle
+        """
+        self._expire()
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is not None and not self._failed(entry):
+                return handle
+            self._entries[handle] = {
+                'future': self._executor.submit(func, *args),
+                'created': time.time(),
+            }
+        return handle
+
+    @staticmethod
+    def _failed(entry):
+        future = entry['future']
+        if not future.done():
+            return False
+        if future.exception() is not None:
+            return True
+        image, _ = future.result()
+        return image is None
+
+    def status(self, handle):
+        """
+        Report a preparation as pending, ready or failed
+        Returns:
+            Status dictionary, or None if the handle is unknown or expired
+        """
+        with self._lock:
+            entry = self._entries.get(handle)
+        if entry is None:
+            return None
+
+        future = entry['future']
+        if not future.done():
+            return {'handle': handle, 'state': 'pending'}
+        if future.exception() is not None:
+            return {'handle': handle, 'state': 'failed', 'error': str(future.exception())}
+        image, error = future.result()
+        if image is None:
+            return {'handle': handle, 'state': 'failed', 'error': error}
+        return {'handle': handle, 'state': 'ready'}
+
+    def take(self, handle, timeout=PREPARED_IMAGE_WAIT_SECONDS):
+        """
+        Claim a prepared image; the caller then owns it (and discards it when done)
+        Returns:
+            The prepared image, or None if there is no usable result
+        """
+        with self._lock:
+            entry = self._entries.pop(handle, None)
+        if entry is None:
+            return None
+
+        try:
+            image, error = entry['future'].result(timeout=timeout)
+        except TimeoutError:
+            # The caller prepares the image itself; nobody can claim this result any more
+            entry['future'].add_done_callback(_discard_result)
+            log.warning("⚠️ Background image preparation still running after %ss, not waiting", timeout)
+            return None
+        except Exception as e:
+            log.warning("⚠️ Background image preparation unusable: %s", e)
+            return None
+        if error:
+            log.warning("⚠️ Background image preparation failed: %s", error)
+        return image
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [handle for handle, entry in self._entries.items()
+                       if entry['future'].done() and now - entry['created'] > self.ttl_seconds]
+            entries = [self._entries.pop(handle) for handle in expired]
+
+        for entry in entries:
+            _discard_result(entry['future'])
+
+
+def _discard_result(future):
+    """
+    Discard the image of a finished preparation nobody will claim
+    """
+    if future.exception() is None:
+        discard_image(future.result()[0])
+
+
+_prepared_images = None
+_prepared_images_lock = threading.Lock()
+
+
+def get_prepared_images():
+    """
+    Return the process-wide background preparation registry
+    """
+    global _prepared_images
+    with _prepared_images_lock:
+        if _prepared_images is None:
+            _prepared_images = PreparedImages(IMAGE_WORKERS, PREPARED_IMAGE_TTL_SECONDS)
+        return _prepared_images
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Structured progress events from the proposal engines
+Engines take an optional progress callback and report what they are doing
+(template loaded, image prepared, slide filled, saving, done) as small dicts,
+so callers can relay real progress instead of parsing log output
+"""
+
+import time
+
+from proposal_log import get_logger
+
+log = get_logger('progress_events')
+
+# Stage each event belongs to, for callers that only show a coarse status
+EVENT_STAGES = {
+    'preparing_images': 'images',
+    'image_prepared': 'images',
+    'result_cache_hit': 'rendering',
+    'template_loaded': 'rendering',
+    'text_replaced': 'rendering',
+    'slide_filled': 'rendering',
+    'saving': 'saving',
+    'saved': 'saving',
+    'done': 'done',
+}
+
+
+class ProgressReporter:
+    """
+    Stamps progress events with their stage and the time since the reporter
+    was created, and hands them to a callback
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.started = time.perf_counter()
+
+    def __call__(self, event, **fields):
+        """
+        Report one event, e.g. report('slide_filled', slide=3)
+        """
+        if self.callback is None:
+            return
+
+        record = {
+            'event': event,
+            'stage': EVENT_STAGES.get(event, event),
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1),
+        }
+        record.update(fields)
+        try:
+            self.callback(record)
+        except Exception as e:
+            # A broken listener must never fail the generation
+            log.warning("⚠️ Progress callback failed: %s", e)
+
+
+def as_reporter(progress):
+    """
+    Wrap a progress callback (or None) in a ProgressReporter; reporters are
+    passed through so nested calls share one clock
+    """
+    if isinstance(progress, ProgressReporter):
+        return progress
+    return ProgressReporter(progress)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Background jobs for proposal generation
+A request submits a job and gets its ID back straight away; a bounded thread
+pool runs the generation, clients poll the job (or follow its progress
+events) and download the result once it is done. Finished jobs and their
+files expire.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from proposal_log import get_logger
+
+log = get_logger('proposal_jobs')
+
+# Generations running at once, and jobs accepted (queued plus running) before
+# submissions are refused
+JOB_WORKERS = int(os.environ.get('PROPOSAL_JOB_WORKERS', '2'))
+JOB_QUEUE_LIMIT = int(os.environ.get('PROPOSAL_JOB_QUEUE_LIMIT', '32'))
+
+# Finished jobs (and their output files) are removed this long after finishing
+JOB_TTL_SECONDS = float(os.environ.get('PROPOSAL_JOB_TTL_SECONDS', '3600'))
+
+JOB_STATUS_FIELDS = ('id', 'state', 'stage', 'created', 'started', 'finished', 'error')
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a job is submitted while JOB_QUEUE_LIMIT jobs are already waiting or running
+    """
+
+
+class ProposalJobs:
+    """
+    Registry of generation jobs, each with its own working directory for output files
+    """
+
+    def __init__(self, jobs_dir, workers, queue_limit, ttl_seconds):
+        self.jobs_dir = jobs_dir
+        self.queue_limit = queue_limit
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='proposal-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Notified whenever any job records a progress event or finishes
+        self._changed = threading.Condition(self._lock)
+
+        # Results left behind by a previous process can no longer be looked up
+        shutil.rmtree(jobs_dir, ignore_errors=True)
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def submit(self, func, *args):
+        """
+        Queue func(work_dir, progress, *args); progress takes progress event dicts
+        (see progress_events) and func's return value becomes the job result
+        Returns:
+            The job ID
+        Raises:
+            JobQueueFull: If JOB_QUEUE_LIMIT jobs are already queued or running
+        """
+        self.expire()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'state': 'queued',
+            'stage': 'queued',
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'error': None,
+            'result': None,
+            'events': [],
+            'work_dir': os.path.join(self.jobs_dir, job_id),
+        }
+
+        with self._lock:
+            active = sum(1 for other in self._jobs.values() if other['state'] in ('queued', 'running'))
+            if active >= self.queue_limit:
+                raise JobQueueFull(f"{active} jobs are already waiting or running")
+            self._jobs[job_id] = job
+
+        os.makedirs(job['work_dir'], exist_ok=True)
+        self._executor.submit(self._run, job, func, args)
+        return job_id
+
+    def _run(self, job, func, args):
+        job['state'] = 'running'
+        job['stage'] = 'started'
+        job['started'] = time.time()
+
+        def progress(record):
+            with self._changed:
+                job['events'].append(record)
+                job['stage'] = record.get('stage', job['stage'])
+                self._changed.notify_all()
+
+        try:
+            result = func(job['work_dir'], progress, *args)
+            state, error = 'done', None
+        except Exception as e:
+            result, state, error = None, 'failed', str(e)
+
+        with self._changed:
+            job['result'], job['state'], job['error'] = result, state, error
+            job['finished'] = time.time()
+            self._changed.notify_all()
+
+    def status(self, job_id):
+        """
+        Public view of a job
+        Returns:
+            Status dictionary, or None if the job is unknown or expired
+        """
+        self.expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {field: job[field] for field in JOB_STATUS_FIELDS}
+
+    def wait_events(self, job_id, start, timeout):
+        """
+        Progress events of a job from index start on, waiting up to timeout
+        seconds for one when there are none yet
+        Returns:
+            Tuple of (events, finished), or None if the job is unknown or expired
+        """
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if len(job['events']) <= start and job['finished'] is None:
+                self._changed.wait(timeout)
+            return job['events'][start:], job['finished'] is not None
+
+    def result(self, job_id):
+        """
+        Result of a finished job
+        Returns:
+            Whatever the job function returned, or None if the job is not done
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job['state'] != 'done':
+            return None
+        return job['result']
+
+    def expire(self):
+        """
+        Remove jobs (and their working directories) that finished more than ttl_seconds ago
+        """
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and now - job['finished'] > self.ttl_seconds]
+            jobs = [self._jobs.pop(job_id) for job_id in expired]
+
+        for job in jobs:
+            shutil.rmtree(job['work_dir'], ignore_errors=True)
+        if jobs:
+            log.info("🧹 Expired %d finished job(s)", len(jobs))
+
+
+_proposal_jobs = None
+_proposal_jobs_lock = threading.Lock()
+
+
+def get_proposal_jobs(jobs_dir):
+    """
+    Return the process-wide job registry, keeping job files under jobs_dir
+    """
+    global _proposal_jobs
+    with _proposal_jobs_lock:
+        if _proposal_jobs is None:
+            _proposal_jobs = ProposalJobs(jobs_dir, JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_TTL_SECONDS)
+        return _proposal_jobs
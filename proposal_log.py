@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Logging for the proposal generators
+Every module logs through a 'proposal.<module>' logger with lazy %-style
+arguments, so messages below the configured level are never formatted, and
+loops that only exist to produce debug output check is_debug() first.
+Output goes to stdout as plain text or, with PROPOSAL_LOG_FORMAT=json, as
+one JSON object per line.
+"""
+
+import json
+import logging
+import os
+import sys
+
+# debug, info, warning or error
+LOG_LEVEL = os.environ.get('PROPOSAL_LOG_LEVEL', 'info')
+
+# 'text' keeps the familiar emoji lines; 'json' writes JSON lines for log collectors
+LOG_FORMAT = os.environ.get('PROPOSAL_LOG_FORMAT', 'text')
+
+ROOT_LOGGER = 'proposal'
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    Writes to whatever sys.stdout is at the time (--serve points it at stderr
+    so stdout stays free for result records)
+    """
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record; structured values passed as
+    extra={'fields': {...}} are merged into it
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, log_format=None):
+    """
+    Set the level and format of all proposal loggers
+    Args:
+        level: debug, info, warning or error (defaults to PROPOSAL_LOG_LEVEL)
+        log_format: 'text' or 'json' (defaults to PROPOSAL_LOG_FORMAT)
+    """
+    level = (level or LOG_LEVEL).upper()
+    log_format = log_format or LOG_FORMAT
+
+    handler = _StdoutHandler()
+    if log_format == 'json':
+        handler.setFormatter(JsonLinesFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers[:] = [handler]
+    logger.setLevel(getattr(logging, level, logging.INFO))
+    # Flask/werkzeug configure the root logger; keep our lines out of theirs
+    logger.propagate = False
+
+
+def get_logger(name):
+    """
+    Logger for a module, e.g. get_logger(__name__)
+    """
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def redact(data):
+    """
+    Stand-in for form data in logs: field names with the length of their
+    values, never the values themselves (they are customer details)
+    """
+    return {key: f'<{len(str(value))} chars>' if value else '<empty>' for key, value in (data or {}).items()}
+
+
+def is_debug(logger):
+    """
+    Whether debug output is on, for guarding loops that only exist to log
+    """
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+configure_logging()
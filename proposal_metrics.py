@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Per-stage timings and process-wide metrics for the proposal generators
+Engines mark the end of each stage (template load, image prepare, slide
+mutation, save, ...) on a StageTimings; every lap is also folded into
+histograms that Example.py serves at /metrics in the Prometheus text format,
+together with the image, decoded-image and result cache counters
+"""
+
+import threading
+import time
+
+from image_cache import get_decoded_image_cache, get_image_cache
+from image_encoder import encoder_stats
+from memory_profile import memory_mark
+from result_cache import get_result_cache
+
+# Histogram buckets (upper bounds; +Inf is implied)
+STAGE_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+PIXELS_BUCKETS = (250_000, 1_000_000, 4_000_000, 12_000_000, 24_000_000, 50_000_000)
+
+# name -> (help text, buckets, label names)
+HISTOGRAMS = {
+    'proposal_stage_seconds': ('Time spent in each generation stage', STAGE_SECONDS_BUCKETS, ('engine', 'stage')),
+    'proposal_generation_seconds': ('End-to-end time to generate one proposal', STAGE_SECONDS_BUCKETS, ('engine', 'outcome')),
+    'proposal_input_image_bytes': ('Encoded size of the source images', BYTES_BUCKETS, ('engine',)),
+    'proposal_input_image_pixels': ('Pixel count of the source images', PIXELS_BUCKETS, ('engine',)),
+    'proposal_output_bytes': ('Size of the generated .pptx files', BYTES_BUCKETS, ('engine',)),
+}
+
+
+class StageTimings:
+    """
+    Wall-clock time per stage of one generation
+    lap(stage) charges the time since the previous lap (or since creation) to
+    that stage, so engines only mark stage boundaries
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages = {}
+
+    def lap(self, stage):
+        """
+        Close the current stage
+        Returns:
+            Seconds charged to the stage
+        """
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._last = now
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        get_metrics().observe('proposal_stage_seconds', seconds, engine=self.engine, stage=stage)
+        memory_mark(stage)
+        return seconds
+
+    def finish(self, outcome='success'):
+        """
+        Record the end-to-end time of the generation
+        Returns:
+            Timings dictionary (see as_dict)
+        """
+        total = time.perf_counter() - self.started
+        get_metrics().observe('proposal_generation_seconds', total, engine=self.engine, outcome=outcome)
+        return self.as_dict()
+
+    def as_dict(self):
+        """
+        Timings in milliseconds, for --timings files and result records
+        """
+        return {
+            'engine': self.engine,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'stages_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+        }
+
+
+def as_timings(timings, engine):
+    """
+    Use the caller's StageTimings, or start one so an engine's stages are
+    still counted in the metrics when nobody asked for the breakdown
+    """
+    return timings if timings is not None else StageTimings(engine)
+
+
+class ProposalMetrics:
+    """
+    Cumulative histograms for this process, rendered in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> {label values: [bucket counts..., sum, count]}
+        self._series = {name: {} for name in HISTOGRAMS}
+
+    def observe(self, name, value, **labels):
+        """
+        Add one observation, e.g. observe('proposal_output_bytes', 81234, engine='Example')
+        """
+        _, buckets, label_names = HISTOGRAMS[name]
+        key = tuple(str(labels.get(label, '')) for label in label_names)
+        with self._lock:
+            series = self._series[name].get(key)
+            if series is None:
+                series = self._series[name][key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def observe_input_image(self, engine, size_bytes, width, height):
+        """
+        Record the size of a source image before it is cropped and resized
+        """
+        self.observe('proposal_input_image_bytes', size_bytes, engine=engine)
+        self.observe('proposal_input_image_pixels', width * height, engine=engine)
+
+    def render(self):
+        """
+        All histograms plus cache and encoder counters as Prometheus text
+        """
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets, label_names) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, series in sorted(self._series[name].items()):
+                    labels = list(zip(label_names, key))
+                    for bound, count in zip(buckets, series):
+                        lines.append(f'{name}_bucket{_labels(labels + [("le", _number(bound))])} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels + [("le", "+Inf")])} {series[-1]}')
+                    lines.append(f'{name}_sum{_labels(labels)} {_number(series[-2])}')
+                    lines.append(f'{name}_count{_labels(labels)} {series[-1]}')
+
+        caches = {
+            'image': get_image_cache(),
+            'decoded_image': get_decoded_image_cache(),
+            'result': get_result_cache(),
+        }
+        cache_stats = {cache: instance.stats() for cache, instance in caches.items() if instance is not None}
+        for metric, field, metric_type, help_text in (
+            ('proposal_cache_hits_total', 'hits', 'counter', 'Cache lookups that found an entry'),
+            ('proposal_cache_misses_total', 'misses', 'counter', 'Cache lookups that found nothing'),
+            ('proposal_cache_hit_ratio', 'hit_ratio', 'gauge', 'Hits over lookups since the process started'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {metric_type}')
+            for cache, stats in cache_stats.items():
+                lines.append(f'{metric}{_labels([("cache", cache)])} {_number(stats[field])}')
+
+        encoded = encoder_stats()
+        for metric, value, help_text in (
+            ('proposal_images_encoded_total', encoded['images'], 'Placeholder images encoded'),
+            ('proposal_encoded_image_bytes_total', encoded['bytes'], 'Bytes written by the image encoder'),
+            ('proposal_image_encode_seconds_total', encoded['encode_ms'] / 1000, 'Time spent encoding images'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Return the process-wide metrics registry
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = ProposalMetrics()
+        return _metrics
@@ -5,11 +5,14 @@ Handles image placeholder {{TP_MSB}} replacement and form data processing
 """
 
 import argparse
+import csv
 import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-import tempfile
 
 # Fix for Python 3.12+ compatibility with python-pptx
 try:
@@ -29,50 +32,97 @@ except ImportError:
     pass
 
 # Now import python-pptx
-from pptx import Presentation
 from pptx.util import Cm
-from PIL import Image
 
-def resize_image_to_powerpoint_dimensions(image_path, width_cm, height_cm, suffix=''):
+from cpu_profile import sample_cpu_profile
+from image_cache import get_image_cache
+from image_pipeline import IMAGE_DPI, IMAGE_SPOOL_TO_DISK, IMAGE_WORKERS, discard_image, image_size_bytes, open_image, placeholder_pixel_size, resize_to_stream, spool_to_disk
+from memory_profile import MemoryProfile, log_memory_report
+from package_writer import save_presentation
+from progress_events import as_reporter
+from proposal_log import configure_logging, get_logger, is_debug, redact
+from proposal_metrics import StageTimings, as_timings, get_metrics
+from result_cache import get_result_cache
+from template_index import compile_template
+from text_substitution import PlaceholderSubstituter
+
+log = get_logger('proposal_processor')
+
+def resize_image_to_powerpoint_dimensions(image_path, width_px, height_px, suffix='', dpi=IMAGE_DPI):
     """
     Resize image to exact PowerPoint dimensions
     Args:
         image_path: Path to the input image
-        width_cm: Target width in centimeters
-        height_cm: Target height in centimeters
-        suffix: Optional suffix for temporary file naming
+        width_px: Target width in pixels (from the placeholder shape size)
+        height_px: Target height in pixels (from the placeholder shape size)
+        suffix: Optional suffix for temporary file naming (disk fallback only)
+        dpi: Effective resolution the pixel size was computed at
     Returns:
-        Path to resized image
+        In-memory encoded image stream, or a temporary file path when
+        PROPOSAL_IMAGE_SPOOL_TO_DISK=1 is set
     """
     try:
-        # Open and process image
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode not in ('RGB', 'RGBA'):
-                img = img.convert('RGB')
-            
-            # Calculate target pixel dimensions (300 DPI for high quality)
-            dpi = 300
-            target_width_px = int(width_cm * dpi / 2.54)
-            target_height_px = int(height_cm * dpi / 2.54)
-            
-            # Resize image
-            resized_img = img.resize((target_width_px, target_height_px), Image.Resampling.LANCZOS)
-            
-            # Save to temporary file
-            temp_fd, temp_path = tempfile.mkstemp(suffix='.png', prefix=f'resized_{suffix}_')
-            os.close(temp_fd)  # Close file descriptor, we'll use the path
-            
-            resized_img.save(temp_path, 'PNG', optimize=True, dpi=(dpi, dpi))
-            
-            print(f"✅ Image resized to {target_width_px}x{target_height_px}px ({width_cm}x{height_cm}cm)")
-            return temp_path
+        # Decode, resize and encode without touching disk
+        resized_image = resize_to_stream(image_path, width_px, height_px, dpi=dpi)
+        
+        if IMAGE_SPOOL_TO_DISK:
+            resized_image = spool_to_disk(resized_image, prefix=f'resized_{suffix}_')
+        
+        log.debug("✅ Image resized to %dx%dpx at %d DPI", width_px, height_px, dpi)
+        return resized_image
             
     except Exception as e:
-        print(f"❌ Error resizing image: {str(e)}")
+        log.error("❌ Error resizing image: %s", e)
         return None
 
-def replace_placeholders_in_pptx(template_path, form_data, msb_image_path, mccb_image_path, tpsld_image_path, tpmccbcompartment_image_path, tptappingloc_image_path, tprouting1_image_path, tprouting2_image_path, tprouting3_image_path, output_path):
+def prepare_placeholder_images(image_placeholders, image_workers=None, report=None):
+    """
+    Resize every placeholder image up front on a thread pool
+    Args:
+        image_placeholders: Dicts with 'placeholder', 'image_path', 'width_px',
+                            'height_px' and 'suffix', one per distinct size
+        image_workers: Thread pool size (defaults to IMAGE_WORKERS)
+        report: Optional ProgressReporter told as each image is ready
+    Returns:
+        Dictionary of (placeholder, width_px, height_px) -> prepared image
+        (None if resizing failed)
+    """
+    if not image_placeholders:
+        return {}
+    
+    def prepare(placeholder_info):
+        started = time.perf_counter()
+        prepared = resize_image_to_powerpoint_dimensions(
+            placeholder_info['image_path'],
+            width_px=placeholder_info['width_px'],
+            height_px=placeholder_info['height_px'],
+            suffix=placeholder_info['suffix']
+        )
+        duration_ms = (time.perf_counter() - started) * 1000
+        if report is not None and prepared is not None:
+            report('image_prepared', placeholder=placeholder_info['placeholder'],
+                   width_px=placeholder_info['width_px'], height_px=placeholder_info['height_px'],
+                   duration_ms=round(duration_ms, 1))
+        return prepared, duration_ms
+    
+    workers = max(1, min(image_workers or IMAGE_WORKERS, len(image_placeholders)))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(prepare, image_placeholders))
+    wall_ms = (time.perf_counter() - started) * 1000
+    
+    prepared_images = {}
+    sequential_ms = 0.0
+    for placeholder_info, (prepared, duration_ms) in zip(image_placeholders, results):
+        prepared_images[(placeholder_info['placeholder'], placeholder_info['width_px'], placeholder_info['height_px'])] = prepared
+        sequential_ms += duration_ms
+        log.debug("⏱️ %s image prepared in %.0f ms", placeholder_info['placeholder'], duration_ms)
+    
+    log.info("⏱️ Prepared %d images on %d thread(s) in %.0f ms wall-clock (%.0f ms of image work, saved %.0f ms)",
+             len(image_placeholders), workers, wall_ms, sequential_ms, max(0.0, sequential_ms - wall_ms))
+    return prepared_images
+
+def replace_placeholders_in_pptx(template_path, form_data, msb_image_path, mccb_image_path, tpsld_image_path, tpmccbcompartment_image_path, tptappingloc_image_path, tprouting1_image_path, tprouting2_image_path, tprouting3_image_path, output_path, image_workers=None, progress=None, timings=None):
     """
     Replace placeholders in PowerPoint template and insert images
     Args:
@@ -84,77 +134,56 @@ def replace_placeholders_in_pptx(template_path, form_data, msb_image_path, mccb_
         tpmccbcompartment_image_path: Path to the TP_MCCB_COMPARTMENT image file (can be None)
         tptappingloc_image_path: Path to the TP_TAPPING_LOC image file (can be None)
         output_path: Path where to save the output file
+        image_workers: Threads used to prepare images (defaults to IMAGE_WORKERS)
+        progress: Optional callback receiving progress event dicts (see progress_events)
+        timings: Optional StageTimings the time of each stage is added to
     """
+    report = as_reporter(progress)
+    timings = as_timings(timings, 'proposal_processor')
     try:
-        print("📖 Loading PowerPoint template...")
-        print(f"📁 Template path: {template_path}")
-        print(f"🖼️ MSB Image path: {msb_image_path}")
-        print(f"🖼️ MCCB Image path: {mccb_image_path}")
-        print(f"🖼️ TP_SLD Image path: {tpsld_image_path}")
-        print(f"🖼️ TP_MCCB_COMPARTMENT Image path: {tpmccbcompartment_image_path}")
-        print(f"🖼️ TP_TAPPING_LOC Image path: {tptappingloc_image_path}")
-        print(f"📊 Form data: {form_data}")
-        
-        prs = Presentation(template_path)
-        print(f"✅ Loaded presentation with {len(prs.slides)} slides")
-        
-        # First, let's inspect all slides and shapes to find what we're working with
-        print("\n🔍 DEBUGGING: Inspecting all slides and shapes...")
-        for slide_num, slide in enumerate(prs.slides):
-            print(f"\n--- SLIDE {slide_num + 1} ---")
-            print(f"Number of shapes: {len(slide.shapes)}")
-            
-            for shape_idx, shape in enumerate(slide.shapes):
-                print(f"  Shape {shape_idx + 1}:")
-                print(f"    Type: {shape.shape_type}")
-                print(f"    Has name attr: {hasattr(shape, 'name')}")
-                
-                if hasattr(shape, 'name'):
-                    print(f"    Name: '{shape.name}'")
-                    if shape.name == '{{TP_MSB}}' or shape.name == 'TP_MSB':
-                        print(f"    *** FOUND {{TP_MSB}} PLACEHOLDER! ***")
-                        print(f"    Position: left={shape.left}, top={shape.top}")
-                        print(f"    Size: width={shape.width}, height={shape.height}")
-                    elif shape.name == '{{TP_MCCB}}' or shape.name == 'TP_MCCB':
-                        print(f"    *** FOUND {{TP_MCCB}} PLACEHOLDER! ***")
-                        print(f"    Position: left={shape.left}, top={shape.top}")
-                        print(f"    Size: width={shape.width}, height={shape.height}")
-                    elif shape.name == '{{TP_SLD}}' or shape.name == 'TP_SLD':
-                        print(f"    *** FOUND {{TP_SLD}} PLACEHOLDER! ***")
-                        print(f"    Position: left={shape.left}, top={shape.top}")
-                        print(f"    Size: width={shape.width}, height={shape.height}")
-                    elif shape.name == '{{TP_MCCB_COMPARTMENT}}' or shape.name == 'TP_MCCB_COMPARTMENT':
-                        print(f"    *** FOUND {{TP_MCCB_COMPARTMENT}} PLACEHOLDER! ***")
-                        print(f"    Position: left={shape.left}, top={shape.top}")
-                        print(f"    Size: width={shape.width}, height={shape.height}")
-                    elif shape.name == '{{TP_TAPPING_LOC}}' or shape.name == 'TP_TAPPING_LOC':
-                        print(f"    *** FOUND {{TP_TAPPING_LOC}} PLACEHOLDER! ***")
-                        print(f"    Position: left={shape.left}, top={shape.top}")
-                        print(f"    Size: width={shape.width}, height={shape.height}")
-                
-                if hasattr(shape, 'text_frame') and shape.text_frame:
-                    print(f"    Has text_frame: True")
-                    all_text = ""
-                    for paragraph in shape.text_frame.paragraphs:
-                        for run in paragraph.runs:
-                            all_text += run.text
-                    if all_text.strip():
-                        print(f"    Text content: '{all_text[:100]}{'...' if len(all_text) > 100 else ''}'")
-                        if '{{TP_MSB}}' in all_text or 'TP_MSB' in all_text:
-                            print(f"    *** CONTAINS {{TP_MSB}} TEXT! ***")
-                        elif '{{TP_MCCB}}' in all_text or 'TP_MCCB' in all_text:
-                            print(f"    *** CONTAINS {{TP_MCCB}} TEXT! ***")
-                        elif '{{TP_SLD}}' in all_text or 'TP_SLD' in all_text:
-                            print(f"    *** CONTAINS {{TP_SLD}} TEXT! ***")
-                
-                if hasattr(shape, 'text') and shape.text:
-                    print(f"    Direct text: '{shape.text[:100]}{'...' if len(shape.text) > 100 else ''}'")
-                    if '{{TP_MSB}}' in shape.text or 'TP_MSB' in shape.text:
-                        print(f"    *** CONTAINS {{TP_MSB}} TEXT! ***")
-                    elif '{{TP_MCCB}}' in shape.text or 'TP_MCCB' in shape.text:
-                        print(f"    *** CONTAINS {{TP_MCCB}} TEXT! ***")
-                    elif '{{TP_SLD}}' in shape.text or 'TP_SLD' in shape.text:
-                        print(f"    *** CONTAINS {{TP_SLD}} TEXT! ***")
+        log.info("📖 Loading PowerPoint template %s", template_path)
+        if is_debug(log):
+            for label, image_path in (('MSB', msb_image_path), ('MCCB', mccb_image_path), ('TP_SLD', tpsld_image_path),
+                                      ('TP_MCCB_COMPARTMENT', tpmccbcompartment_image_path),
+                                      ('TP_TAPPING_LOC', tptappingloc_image_path), ('TP_ROUTING_1', tprouting1_image_path),
+                                      ('TP_ROUTING_2', tprouting2_image_path), ('TP_ROUTING_3', tprouting3_image_path)):
+                log.debug("🖼️ %s Image path: %s", label, image_path)
+            # Field values are customer data; only their presence and length are logged
+            log.debug("📊 Form data: %s", redact(form_data))
+        
+        result_cache = get_result_cache()
+        compiled = compile_template(template_path)
+        timings.lap('template_load')
+        
+        # Identical template, form data and images produce the same proposal
+        if result_cache is not None:
+            result_key = result_cache.make_key(compiled.digest, 'replace_placeholders_in_pptx', form_data, {
+                name: image_path if image_path and os.path.exists(image_path) else None
+                for name, image_path in (
+                    ('msb', msb_image_path), ('mccb', mccb_image_path), ('tpsld', tpsld_image_path),
+                    ('tpmccbcompartment', tpmccbcompartment_image_path), ('tptappingloc', tptappingloc_image_path),
+                    ('tprouting1', tprouting1_image_path), ('tprouting2', tprouting2_image_path),
+                    ('tprouting3', tprouting3_image_path),
+                )
+            })
+            hit = result_cache.fetch(compiled.digest, result_key, output_path)
+            timings.lap('result_cache')
+            if hit:
+                log.info("♻️ Result cache hit, reused cached proposal for %s", output_path)
+                report('result_cache_hit')
+                report('done', bytes=os.path.getsize(output_path))
+                get_metrics().observe('proposal_output_bytes', os.path.getsize(output_path), engine=timings.engine)
+                return True
+        
+        prs = compiled.open()
+        shapes = compiled.resolve_shapes(prs)
+        timings.lap('template_load')
+        log.debug("✅ Loaded presentation with %d slides", len(prs.slides))
+        report('template_loaded', slides=len(prs.slides))
+        
+        # Report what the compiled index found instead of re-walking every shape
+        if is_debug(log):
+            log.debug("🔍 Text tokens in template index: %s", sorted(compiled.tokens))
         
         # Prepare replacement mappings
         replacements = {
@@ -162,286 +191,240 @@ def replace_placeholders_in_pptx(template_path, form_data, msb_image_path, mccb_
             '{{ADDRESS}}': form_data.get('address', ''),
         }
         
-        print(f"\n🔄 Processing image replacements...")
+        log.debug("🔄 Processing image replacements...")
         
-        # Define image placeholders and their dimensions
+        # Define image placeholders; target sizes come from the placeholder shapes
         image_placeholders = [
             {
                 'placeholder': '{{TP_MSB}}',
                 'alt_placeholder': 'TP_MSB', 
                 'image_path': msb_image_path,
-                'width_cm': 9.05,
-                'height_cm': 9.25,
                 'suffix': 'msb'
             },
             {
                 'placeholder': '{{TP_MCCB}}',
                 'alt_placeholder': 'TP_MCCB',
                 'image_path': mccb_image_path, 
-                'width_cm': 4.22,
-                'height_cm': 4.57,
                 'suffix': 'mccb'
             },
             {
                 'placeholder': '{{TP_SLD}}',
                 'alt_placeholder': 'TP_SLD',
                 'image_path': tpsld_image_path, 
-                'width_cm': 4.22,
-                'height_cm': 4.57,
                 'suffix': 'tpsld'
             },
             {
                 'placeholder': '{{TP_MCCB_COMPARTMENT}}',
                 'alt_placeholder': 'TP_MCCB_COMPARTMENT',
                 'image_path': tpmccbcompartment_image_path, 
-                'width_cm': 4.22,
-                'height_cm': 4.57,
                 'suffix': 'tpmccbcompartment'
             },
             {
                 'placeholder': '{{TP_TAPPING_LOC}}',
                 'alt_placeholder': 'TP_TAPPING_LOC',
                 'image_path': tptappingloc_image_path, 
-                'width_cm': 4.22,
-                'height_cm': 4.57,
                 'suffix': 'tptappingloc'
             },
             {
                 'placeholder': '{{TP_ROUTING_1}}',
                 'alt_placeholder': 'TP_ROUTING_1',
                 'image_path': tprouting1_image_path, 
-                'width_cm': 8.85,
-                'height_cm': 10.45,
                 'suffix': 'tprouting1'
             },
             {
                 'placeholder': '{{TP_ROUTING_2}}',
                 'alt_placeholder': 'TP_ROUTING_2',
                 'image_path': tprouting2_image_path, 
-                'width_cm': 8.85,
-                'height_cm': 10.45,
                 'suffix': 'tprouting2'
             },
             {
                 'placeholder': '{{TP_ROUTING_3}}',
                 'alt_placeholder': 'TP_ROUTING_3',
                 'image_path': tprouting3_image_path, 
-                'width_cm': 17.74,
-                'height_cm': 9.28,
                 'suffix': 'tprouting3'
             }
         ]
         
         total_replacements_made = 0
+        removed_shapes = set()
+        touched_slides = set()
+        
+        # Find placeholder locations and decide which images are needed
+        images_to_prepare = []
+        for placeholder_info in image_placeholders:
+            placeholder_info['locations'] = compiled.image_locations(placeholder_info['placeholder'], placeholder_info['alt_placeholder'])
+            placeholder_info['sizes_px'] = [placeholder_pixel_size(location) for location in placeholder_info['locations']]
+            if is_debug(log):
+                for location, (width_px, height_px) in zip(placeholder_info['locations'], placeholder_info['sizes_px']):
+                    log.debug("🔍 Found %s placeholder on slide %d at left=%d, top=%d, size %dx%d EMU (%dx%dpx at %d DPI)",
+                              placeholder_info['placeholder'], location['slide'] + 1, location['left'], location['top'],
+                              location['width'], location['height'], width_px, height_px, IMAGE_DPI)
+            
+            if placeholder_info['image_path'] and os.path.exists(placeholder_info['image_path']):
+                # Only the header is read here; pixels are decoded by the resize
+                with open_image(placeholder_info['image_path']) as source_image:
+                    get_metrics().observe_input_image(timings.engine, os.path.getsize(placeholder_info['image_path']), *source_image.size)
+                
+                # One prepared image per distinct placeholder size
+                for width_px, height_px in dict.fromkeys(placeholder_info['sizes_px']):
+                    images_to_prepare.append({
+                        'placeholder': placeholder_info['placeholder'],
+                        'image_path': placeholder_info['image_path'],
+                        'width_px': width_px,
+                        'height_px': height_px,
+                        'suffix': placeholder_info['suffix'],
+                    })
+        
+        # Prepare all images before touching the slides
+        if images_to_prepare:
+            report('preparing_images', images=len(images_to_prepare))
+        prepared_images = prepare_placeholder_images(images_to_prepare, image_workers, report)
+        timings.lap('image_prepare')
         
         # Process each image placeholder
         for placeholder_info in image_placeholders:
+            locations = placeholder_info['locations']
+            
             if placeholder_info['image_path'] and os.path.exists(placeholder_info['image_path']):
-                print(f"🖼️ Processing {placeholder_info['placeholder']} image: {placeholder_info['image_path']}")
-                print(f"📏 Image file size: {os.path.getsize(placeholder_info['image_path'])} bytes")
+                if is_debug(log):
+                    log.debug("🖼️ Processing %s image: %s (%d bytes)", placeholder_info['placeholder'],
+                              placeholder_info['image_path'], os.path.getsize(placeholder_info['image_path']))
                 
-                # Resize image to exact PowerPoint dimensions
-                resized_image_path = resize_image_to_powerpoint_dimensions(
-                    placeholder_info['image_path'], 
-                    width_cm=placeholder_info['width_cm'],
-                    height_cm=placeholder_info['height_cm'],
-                    suffix=placeholder_info['suffix']
-                )
+                # Inline occurrences of the token inside longer text are removed by the text pass
+                replacements[placeholder_info['placeholder']] = ''
+                
+                if not locations:
+                    log.info("ℹ️ No %s placeholder shapes in template", placeholder_info['placeholder'])
+                    continue
                 
-                if resized_image_path:
-                    print(f"✅ Resized image created: {resized_image_path}")
-                    print(f"📏 Resized image file size: {os.path.getsize(resized_image_path)} bytes")
+                # Each location gets the image prepared for its own shape size
+                prepared_keys = [(placeholder_info['placeholder'], width_px, height_px) for width_px, height_px in placeholder_info['sizes_px']]
+                resized_images = [prepared_images.get(prepared_key) for prepared_key in prepared_keys]
+                
+                if all(resized_images):
+                    if is_debug(log):
+                        for prepared_key in dict.fromkeys(prepared_keys):
+                            log.debug("📏 Resized %s image: %d bytes (%dx%dpx)", placeholder_info['placeholder'],
+                                      image_size_bytes(prepared_images[prepared_key]), prepared_key[1], prepared_key[2])
                     
                     replacements_made = 0
                     
-                    # Process slides to find and replace image placeholder
-                    for slide_num, slide in enumerate(prs.slides):
-                        print(f"\n🔍 Processing slide {slide_num + 1} for {placeholder_info['placeholder']}...")
-                        shapes_to_remove = []
-                        image_positions = []
+                    for pos_idx, (location, resized_image) in enumerate(zip(locations, resized_images)):
+                        slide = prs.slides[location['slide']]
+                        shape = shapes[location['slide']][location['shape']]
                         
-                        # Find placeholder by name
-                        print(f"  Looking for shapes named '{placeholder_info['placeholder']}'...")
-                        for shape_idx, shape in enumerate(slide.shapes):
-                            if hasattr(shape, 'name'):
-                                print(f"    Shape {shape_idx + 1} name: '{shape.name}'")
-                                if (shape.name == placeholder_info['placeholder'] or 
-                                    shape.name == placeholder_info['alt_placeholder']):
-                                    print(f"🎯 Found {placeholder_info['placeholder']} placeholder on slide {slide_num + 1}")
-                                    print(f"    Position: left={shape.left}, top={shape.top}")
-                                    print(f"    Size: width={shape.width}, height={shape.height}")
-                                    image_positions.append({
-                                        'left': shape.left,
-                                        'top': shape.top,
-                                        'width': shape.width,
-                                        'height': shape.height,
-                                        'slide': slide
-                                    })
-                                    shapes_to_remove.append(shape)
-                    
-                        # Also check for text placeholders
-                        print(f"  Looking for text containing '{placeholder_info['placeholder']}'...")
-                        for shape_idx, shape in enumerate(slide.shapes):
-                            shape_has_placeholder = False
-                            
-                            if hasattr(shape, 'text_frame') and shape.text_frame:
-                                for paragraph in shape.text_frame.paragraphs:
-                                    for run in paragraph.runs:
-                                        if (placeholder_info['placeholder'] in run.text or 
-                                            placeholder_info['alt_placeholder'] in run.text):
-                                            print(f"🎯 Found {placeholder_info['placeholder']} text placeholder on slide {slide_num + 1}")
-                                            print(f"    Shape type: {shape.shape_type}")
-                                            print(f"    Full text: '{run.text}'")
-                                            print(f"    Shape position: left={shape.left}, top={shape.top}")
-                                            print(f"    Shape size: width={shape.width}, height={shape.height}")
-                                            
-                                            # If text contains only the placeholder, treat this shape as image placeholder
-                                            if (run.text.strip() == placeholder_info['placeholder'] or 
-                                                run.text.strip() == placeholder_info['alt_placeholder']):
-                                                print("    → This appears to be a text-based image placeholder!")
-                                                image_positions.append({
-                                                    'left': shape.left,
-                                                    'top': shape.top,
-                                                    'width': shape.width,
-                                                    'height': shape.height,
-                                                    'slide': slide
-                                                })
-                                                shapes_to_remove.append(shape)
-                                                shape_has_placeholder = True
-                                            else:
-                                                # Remove the text placeholder but keep the shape
-                                                run.text = run.text.replace(placeholder_info['placeholder'], '')
-                                                run.text = run.text.replace(placeholder_info['alt_placeholder'], '')
-                                                print(f"    Text after replacement: '{run.text}'")
-                            
-                            if (not shape_has_placeholder and hasattr(shape, 'text') and 
-                                (placeholder_info['placeholder'] in shape.text or 
-                                 placeholder_info['alt_placeholder'] in shape.text)):
-                                print(f"🎯 Found {placeholder_info['placeholder']} in direct text on slide {slide_num + 1}")
-                                print(f"    Shape type: {shape.shape_type}")
-                                print(f"    Full text: '{shape.text}'")
-                                print(f"    Shape position: left={shape.left}, top={shape.top}")
-                                print(f"    Shape size: width={shape.width}, height={shape.height}")
-                                
-                                # If text contains only the placeholder, treat this shape as image placeholder
-                                if (shape.text.strip() == placeholder_info['placeholder'] or 
-                                    shape.text.strip() == placeholder_info['alt_placeholder']):
-                                    print("    → This appears to be a text-based image placeholder!")
-                                    image_positions.append({
-                                        'left': shape.left,
-                                        'top': shape.top,
-                                        'width': shape.width,
-                                        'height': shape.height,
-                                        'slide': slide
-                                    })
-                                    shapes_to_remove.append(shape)
-                                else:
-                                    shape.text = shape.text.replace(placeholder_info['placeholder'], '')
-                                    shape.text = shape.text.replace(placeholder_info['alt_placeholder'], '')
-                                    print(f"    Text after replacement: '{shape.text}'")
-                    
+                        # The slide's XML and rels change below whether or not the removal
+                        # works, so it must never be copied raw from the template
+                        touched_slides.add(location['slide'])
                         
-                        # Remove placeholder shapes
-                        print(f"  Removing {len(shapes_to_remove)} placeholder shapes...")
-                        for shape in shapes_to_remove:
-                            try:
-                                slide.shapes._spTree.remove(shape._element)
-                                print("  ✅ Removed placeholder shape")
-                            except Exception as e:
-                                print(f"  ⚠️ Could not remove placeholder shape: {e}")
+                        # Remove placeholder shape
+                        try:
+                            slide.shapes._spTree.remove(shape._element)
+                            removed_shapes.add((location['slide'], location['shape']))
+                            log.debug("✅ Removed placeholder shape")
+                        except Exception as e:
+                            log.warning("⚠️ Could not remove placeholder shape: %s", e)
                         
-                        # Add images at the stored positions
-                        print(f"  Adding images at {len(image_positions)} positions...")
-                        for pos_idx, pos_info in enumerate(image_positions):
-                            try:
-                                print(f"    Position {pos_idx + 1}:")
-                                print(f"      left={pos_info['left']}, top={pos_info['top']}")
-                                print(f"      width={pos_info['width']}, height={pos_info['height']}")
-                                
-                                new_picture = pos_info['slide'].shapes.add_picture(
-                                    resized_image_path,
-                                    pos_info['left'],
-                                    pos_info['top'],
-                                    pos_info['width'],
-                                    pos_info['height']
-                                )
-                                
-                                # Bring image to front instead of sending to back
-                                pic_element = new_picture._element
-                                spTree = pos_info['slide'].shapes._spTree
-                                # Remove from current position
-                                spTree.remove(pic_element)
-                                # Add to the end (front-most layer)
-                                spTree.append(pic_element)
-                                
-                                print(f"  ✅ Inserted {placeholder_info['placeholder']} image on slide {slide_num + 1} at position {pos_idx + 1}")
-                                replacements_made += 1
-                                
-                            except Exception as img_error:
-                                print(f"  ❌ Could not insert {placeholder_info['placeholder']} image on slide {slide_num + 1}: {img_error}")
-                                import traceback
-                                traceback.print_exc()
+                        # Add image at the placeholder position
+                        try:
+                            new_picture = slide.shapes.add_picture(
+                                resized_image,
+                                location['left'],
+                                location['top'],
+                                location['width'],
+                                location['height']
+                            )
+                            
+                            # Bring image to front instead of sending to back
+                            pic_element = new_picture._element
+                            spTree = slide.shapes._spTree
+                            # Remove from current position
+                            spTree.remove(pic_element)
+                            # Add to the end (front-most layer)
+                            spTree.append(pic_element)
+                            
+                            log.debug("✅ Inserted %s image on slide %d at position %d", placeholder_info['placeholder'], location['slide'] + 1, pos_idx + 1)
+                            replacements_made += 1
+                            report('slide_filled', slide=location['slide'] + 1, placeholder=placeholder_info['placeholder'])
+                            
+                        except Exception as img_error:
+                            log.exception("❌ Could not insert %s image on slide %d: %s",
+                                          placeholder_info['placeholder'], location['slide'] + 1, img_error)
                     
-                    print(f"\n📊 Total {placeholder_info['placeholder']} replacements made: {replacements_made}")
+                    log.debug("📊 Total %s replacements made: %d", placeholder_info['placeholder'], replacements_made)
                     total_replacements_made += replacements_made
                     
-                    # Clean up resized image
-                    try:
-                        os.unlink(resized_image_path)
-                        print("🗑️ Cleaned up temporary resized image")
-                    except Exception as cleanup_error:
-                        print(f"⚠️ Could not clean up resized image: {cleanup_error}")
+                    # Clean up resized images (only spooled temp files exist on disk)
+                    for prepared_key in dict.fromkeys(prepared_keys):
+                        try:
+                            if discard_image(prepared_images[prepared_key]):
+                                log.debug("🗑️ Cleaned up temporary resized image")
+                        except Exception as cleanup_error:
+                            log.warning("⚠️ Could not clean up resized image: %s", cleanup_error)
                 else:
-                    print(f"❌ Failed to resize {placeholder_info['placeholder']} image, continuing without image")
+                    log.error("❌ Failed to resize %s image, continuing without image", placeholder_info['placeholder'])
+                    for resized_image in resized_images:
+                        discard_image(resized_image)
             else:
-                print(f"ℹ️ No {placeholder_info['placeholder']} image provided or image file not found")
+                log.debug("ℹ️ No %s image provided or image file not found", placeholder_info['placeholder'])
         
-        print(f"\n📊 Total image replacements made across all placeholders: {total_replacements_made}")
+        log.info("📊 Total image replacements made across all placeholders: %d", total_replacements_made)
+        timings.lap('image_insert')
+        image_cache = get_image_cache()
+        if image_cache is not None and is_debug(log):
+            log.debug("🗂️ Image cache: %s", image_cache.stats())
         
         # Process text replacements
-        print(f"\n📝 Processing text replacements...")
+        log.debug("📝 Processing text replacements...")
         text_replacements_made = 0
         
-        for slide_num, slide in enumerate(prs.slides):
-            for shape in slide.shapes:
-                # Handle text frames (preserves formatting)
-                if hasattr(shape, "text_frame"):
-                    text_frame = shape.text_frame
-                    for paragraph in text_frame.paragraphs:
-                        for run in paragraph.runs:
-                            original_text = run.text
-                            new_text = original_text
-                            
-                            # Replace placeholders
-                            for placeholder, value in replacements.items():
-                                if placeholder in new_text:
-                                    new_text = new_text.replace(placeholder, value)
-                                    print(f"📝 Replaced '{placeholder}' with '{value}' on slide {slide_num + 1}")
-                                    text_replacements_made += 1
-                            
-                            if new_text != original_text:
-                                run.text = new_text
+        substituter = PlaceholderSubstituter(
+            replacements,
+            ignore_tokens=[info['placeholder'] for info in image_placeholders]
+        )
         
-        print(f"📊 Total text replacements made: {text_replacements_made}")
+        for location, run in compiled.iter_runs(shapes, skip=removed_shapes):
+            # Replace all placeholders in one scan of the run
+            new_text, hits = substituter.substitute(run.text)
+            if hits and is_debug(log):
+                for placeholder in hits:
+                    log.debug("📝 Replaced '%s' on slide %d", placeholder, location['slide'] + 1)
+            
+            if hits:
+                run.text = new_text
+                text_replacements_made += len(hits)
+                touched_slides.add(location['slide'])
+        
+        substituter.report_unknown()
+        timings.lap('text_replace')
+        log.info("📊 Total text replacements made: %d", text_replacements_made)
+        report('text_replaced', replacements=text_replacements_made, slides=len(touched_slides))
         
         # Save the presentation
-        print(f"\n💾 Saving presentation to: {output_path}")
-        prs.save(output_path)
-        print("✅ Presentation saved successfully!")
+        log.debug("💾 Saving presentation to: %s", output_path)
+        report('saving', slides=len(touched_slides))
+        save_stats = save_presentation(prs, compiled, output_path, touched_slides)
+        timings.lap('save')
+        report('saved', **save_stats)
+        log.debug("✅ Presentation saved successfully!")
+        
+        if result_cache is not None:
+            result_cache.store(compiled.digest, result_key, output_path)
+            timings.lap('result_cache')
         
         # Verify the output file was created
         if os.path.exists(output_path):
             file_size = os.path.getsize(output_path)
-            print(f"📁 Output file size: {file_size} bytes")
+            log.info("📁 Output file size: %d bytes", file_size)
+            get_metrics().observe('proposal_output_bytes', file_size, engine=timings.engine)
+            report('done', bytes=file_size)
         else:
-            print("❌ Output file was not created!")
+            log.error("❌ Output file was not created!")
         
         return True
         
     except Exception as e:
-        print(f"❌ Error processing PowerPoint: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error processing PowerPoint: %s", e)
         return False
 
 def format_date(date_string):
@@ -468,112 +451,622 @@ def format_date(date_string):
     except Exception:
         return date_string
 
-def main():
-    parser = argparse.ArgumentParser(description='Generate PowerPoint proposal from template and form data')
-    parser.add_argument('--template', required=True, help='Path to PowerPoint template file')
-    parser.add_argument('--output', required=True, help='Path for output PowerPoint file')
-    parser.add_argument('--data', required=True, help='JSON string containing form data')
-    parser.add_argument('--msb-image', help='Path to MSB image file (optional)', dest='msb_image')
-    parser.add_argument('--mccb-image', help='Path to MCCB image file (optional)', dest='mccb_image')
-    parser.add_argument('--tpsld-image', help='Path to TP_SLD image file (optional)', dest='tpsld_image')
-    parser.add_argument('--tpmccbcompartment-image', help='Path to TP_MCCB_COMPARTMENT image file (optional)', dest='tpmccbcompartment_image')
-    parser.add_argument('--tptappingloc-image', help='Path to TP_TAPPING_LOC image file (optional)', dest='tptappingloc_image')
-    parser.add_argument('--tprouting1-image', help='Path to TP_ROUTING_1 image file (optional)', dest='tprouting1_image')
-    parser.add_argument('--tprouting2-image', help='Path to TP_ROUTING_2 image file (optional)', dest='tprouting2_image')
-    parser.add_argument('--tprouting3-image', help='Path to TP_ROUTING_3 image file (optional)', dest='tprouting3_image')
-    # Keep legacy --image argument for backward compatibility
-    parser.add_argument('--image', help='Path to image file (legacy, maps to MSB image)', dest='legacy_image')
+# Image inputs accepted by jobs, in replace_placeholders_in_pptx argument order
+IMAGE_KEYS = [
+    ('msb', 'MSB'),
+    ('mccb', 'MCCB'),
+    ('tpsld', 'TP_SLD'),
+    ('tpmccbcompartment', 'TP_MCCB_COMPARTMENT'),
+    ('tptappingloc', 'TP_TAPPING_LOC'),
+    ('tprouting1', 'TP_ROUTING_1'),
+    ('tprouting2', 'TP_ROUTING_2'),
+    ('tprouting3', 'TP_ROUTING_3'),
+]
+
+def prepare_job_images(template_path, images, image_workers=None):
+    """
+    Resize images for their placeholders ahead of the generate job that will use
+    them; the results land in the shared image cache, so the later job only
+    assembles the presentation
+    Args:
+        template_path: Template the images will be placed in
+        images: Dictionary of image paths keyed by IMAGE_KEYS
+        image_workers: Thread pool size (defaults to IMAGE_WORKERS)
+    Returns:
+        Number of prepared images
+    """
+    compiled = compile_template(template_path)
     
-    args = parser.parse_args()
+    images_to_prepare = []
+    for key, label in IMAGE_KEYS:
+        image_path = images.get(key)
+        if not image_path or not os.path.exists(image_path):
+            continue
+        
+        placeholder_name = label if label.startswith('TP_') else f'TP_{label}'
+        placeholder = f'{{{{{placeholder_name}}}}}'
+        locations = compiled.image_locations(placeholder, placeholder_name)
+        for width_px, height_px in dict.fromkeys(placeholder_pixel_size(location) for location in locations):
+            images_to_prepare.append({
+                'placeholder': placeholder,
+                'image_path': image_path,
+                'width_px': width_px,
+                'height_px': height_px,
+                'suffix': key,
+            })
+    
+    prepared_images = prepare_placeholder_images(images_to_prepare, image_workers)
+    for prepared in prepared_images.values():
+        discard_image(prepared)
+    return sum(1 for prepared in prepared_images.values() if prepared is not None)
+
+def run_prepare_job(job):
+    """
+    Run a {'prepare': true, 'template', 'images'} job record
+    Returns:
+        Result dictionary with 'id', 'success', 'prepared', 'error' and 'duration_ms'
+    """
+    started = time.perf_counter()
+    result = {'id': job.get('id'), 'success': False, 'prepared': 0, 'error': None}
+    
+    if not job.get('template') or not os.path.exists(job['template']):
+        result['error'] = f"Template file not found: {job.get('template')}"
+    elif get_image_cache() is None:
+        # Without the cache there is nowhere to keep the work for the generate job
+        result['error'] = 'Image cache is disabled'
+    else:
+        try:
+            result['prepared'] = prepare_job_images(job['template'], job.get('images') or {}, job.get('image_workers'))
+            result['success'] = True
+        except Exception as e:
+            result['error'] = f"Unexpected error: {e}"
+    
+    if result['error']:
+        log.error("❌ %s", result['error'])
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def run_job(job, progress=None):
+    """
+    Generate one proposal from a job record
+    Args:
+        job: Dictionary with 'template', 'output', 'data' (dict or JSON string),
+             an optional 'images' dict keyed by IMAGE_KEYS and an optional 'id';
+             jobs with 'prepare': true only prepare their images (see run_prepare_job),
+             jobs with 'profile_memory': true are traced stage by stage;
+             one job in PROPOSAL_CPU_PROFILE_SAMPLE_RATE runs under cProfile
+        progress: Optional callback receiving progress event dicts (see progress_events)
+    Returns:
+        Result dictionary with 'id', 'success', 'output', 'error', 'duration_ms'
+        and, once generation started, 'timings' (see StageTimings.as_dict) and
+        for profiled jobs 'memory' (see MemoryProfile.report)
+    """
+    if job.get('prepare'):
+        return run_prepare_job(job)
+    
+    started = time.perf_counter()
+    result = {'id': job.get('id'), 'success': False, 'output': job.get('output'), 'error': None}
     
     try:
-        # Parse form data
-        form_data = json.loads(args.data)
-        print("📋 Form data loaded successfully")
+        form_data = job.get('data') or {}
+        if isinstance(form_data, str):
+            form_data = json.loads(form_data)
         
         # Validate template file
-        if not os.path.exists(args.template):
-            print(f"❌ Template file not found: {args.template}")
-            sys.exit(1)
+        if not job.get('template') or not os.path.exists(job['template']):
+            result['error'] = f"Template file not found: {job.get('template')}"
+            log.error("❌ %s", result['error'])
+            return result
         
-        # Handle legacy image argument (backward compatibility)
-        msb_image_path = args.msb_image or args.legacy_image
-        mccb_image_path = args.mccb_image
-        tpsld_image_path = args.tpsld_image
-        tpmccbcompartment_image_path = args.tpmccbcompartment_image
-        tptappingloc_image_path = args.tptappingloc_image
-        tprouting1_image_path = args.tprouting1_image
-        tprouting2_image_path = args.tprouting2_image
-        tprouting3_image_path = args.tprouting3_image
+        if not job.get('output'):
+            result['error'] = 'No output path given'
+            log.error("❌ %s", result['error'])
+            return result
         
         # Validate image files if provided
-        if msb_image_path and not os.path.exists(msb_image_path):
-            print(f"⚠️ MSB image file not found: {msb_image_path}")
-            msb_image_path = None
-            
-        if mccb_image_path and not os.path.exists(mccb_image_path):
-            print(f"⚠️ MCCB image file not found: {mccb_image_path}")
-            mccb_image_path = None
-            
-        if tpsld_image_path and not os.path.exists(tpsld_image_path):
-            print(f"⚠️ TP_SLD image file not found: {tpsld_image_path}")
-            tpsld_image_path = None
-            
-        if tpmccbcompartment_image_path and not os.path.exists(tpmccbcompartment_image_path):
-            print(f"⚠️ TP_MCCB_COMPARTMENT image file not found: {tpmccbcompartment_image_path}")
-            tpmccbcompartment_image_path = None
-            
-        if tptappingloc_image_path and not os.path.exists(tptappingloc_image_path):
-            print(f"⚠️ TP_TAPPING_LOC image file not found: {tptappingloc_image_path}")
-            tptappingloc_image_path = None
-            
-        if tprouting1_image_path and not os.path.exists(tprouting1_image_path):
-            print(f"⚠️ TP_ROUTING_1 image file not found: {tprouting1_image_path}")
-            tprouting1_image_path = None
-            
-        if tprouting2_image_path and not os.path.exists(tprouting2_image_path):
-            print(f"⚠️ TP_ROUTING_2 image file not found: {tprouting2_image_path}")
-            tprouting2_image_path = None
-            
-        if tprouting3_image_path and not os.path.exists(tprouting3_image_path):
-            print(f"⚠️ TP_ROUTING_3 image file not found: {tprouting3_image_path}")
-            tprouting3_image_path = None
+        images = job.get('images') or {}
+        image_paths = []
+        for key, label in IMAGE_KEYS:
+            image_path = images.get(key)
+            if image_path and not os.path.exists(image_path):
+                log.warning("⚠️ %s image file not found: %s", label, image_path)
+                image_path = None
+            image_paths.append(image_path)
         
         # Create output directory if it doesn't exist
-        output_dir = os.path.dirname(args.output)
+        output_dir = os.path.dirname(job['output'])
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir, exist_ok=True)
         
         # Process the presentation
-        success = replace_placeholders_in_pptx(
-            args.template,
-            form_data,
-            msb_image_path,
-            mccb_image_path,
-            tpsld_image_path,
-            tpmccbcompartment_image_path,
-            tptappingloc_image_path,
-            tprouting1_image_path,
-            tprouting2_image_path,
-            tprouting3_image_path,
-            args.output
-        )
+        timings = StageTimings('proposal_processor')
+        profile = MemoryProfile() if job.get('profile_memory') else None
+        cpu_profile = sample_cpu_profile('proposal_processor')
+        with profile or nullcontext(), cpu_profile or nullcontext():
+            # Tracing is process-wide and cProfile sees only this thread; one
+            # image thread keeps stages apart and Pillow in the profile
+            profiling = profile is not None or (cpu_profile is not None and cpu_profile.recording)
+            result['success'] = replace_placeholders_in_pptx(
+                job['template'],
+                form_data,
+                *image_paths,
+                job['output'],
+                image_workers=1 if profiling else job.get('image_workers'),
+                progress=progress,
+                timings=timings
+            )
+        if profile is not None:
+            result['memory'] = profile.report()
+        result['timings'] = timings.finish('success' if result['success'] else 'failure')
+        if not result['success']:
+            result['error'] = 'Proposal generation failed'
         
-        if success:
-            print("🎉 Proposal generation completed successfully!")
-            sys.exit(0)
-        else:
-            print("❌ Proposal generation failed!")
-            sys.exit(1)
-            
     except json.JSONDecodeError as e:
-        print(f"❌ Invalid JSON data: {e}")
-        sys.exit(1)
+        result['error'] = f"Invalid JSON data: {e}"
+        log.error("❌ %s", result['error'])
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        result['error'] = f"Unexpected error: {e}"
+        log.exception("❌ %s", result['error'])
+    
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+# Set in --serve worker processes: carries progress records back to the parent
+_progress_queue = None
+
+def run_job_line(line, relay_key=None):
+    """
+    Decode one JSON-lines job record and run it
+    Jobs with 'progress': true also send {'id', 'progress': event} records to
+    the --serve parent while they run
+    """
+    try:
+        job = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {'id': None, 'success': False, 'output': None, 'error': f"Invalid JSON job: {e}", 'duration_ms': 0}
+    if not isinstance(job, dict):
+        return {'id': None, 'success': False, 'output': None, 'error': 'Job must be a JSON object', 'duration_ms': 0}
+    
+    progress = None
+    if job.get('progress') and _progress_queue is not None and relay_key is not None:
+        job_id = job.get('id')
+        progress = lambda record: _progress_queue.put((relay_key, {'id': job_id, 'progress': record}, False))
+    return run_job(job, progress)
+
+def serve_job_line(line, relay_key):
+    """
+    run_job_line for --serve workers
+    The result record is queued behind the job's progress records, so the
+    parent relays them in order and never drops the last events
+    """
+    _progress_queue.put((relay_key, run_job_line(line, relay_key), True))
+
+def job_line_id(line):
+    """
+    The 'id' of a JSON-lines job record, or None if it has none or cannot be read
+    """
+    try:
+        job = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return job.get('id') if isinstance(job, dict) else None
+
+def load_manifest(manifest_path, template_path, output_dir):
+    """
+    Read a batch manifest into job records
+    Args:
+        manifest_path: JSONL file (one {"output", "data", "images"} object per line)
+                       or CSV file (an "output" column, "<key>_image" columns for
+                       images and every other column as form data)
+        template_path: Template used for every row
+        output_dir: Directory that relative output names are placed in
+    Returns:
+        List of job dictionaries, each with a 'row' number and 'id'
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    image_columns = {f'{key}_image': key for key, _ in IMAGE_KEYS}
+    rows = []
+    
+    with open(manifest_path, newline='', encoding='utf-8') as manifest_file:
+        if manifest_path.lower().endswith('.csv'):
+            for record in csv.DictReader(manifest_file):
+                row = {'output': record.pop('output', ''), 'data': {}, 'images': {}}
+                for column, value in record.items():
+                    if column in image_columns:
+                        row['images'][image_columns[column]] = value or None
+                    else:
+                        row['data'][column] = value or ''
+                rows.append(row)
+        else:
+            for line in manifest_file:
+                if line.strip():
+                    rows.append(json.loads(line))
+    
+    jobs = []
+    for row_number, row in enumerate(rows, start=1):
+        output_name = row.get('output') or f'proposal_{row_number:05d}.pptx'
+        images = {}
+        for key, image_path in (row.get('images') or {}).items():
+            if image_path and not os.path.isabs(image_path):
+                image_path = os.path.join(manifest_dir, image_path)
+            images[key] = image_path
+        
+        jobs.append({
+            'id': output_name,
+            'row': row_number,
+            'template': row.get('template') or template_path,
+            'output': os.path.join(output_dir, output_name),
+            'data': row.get('data') or {},
+            'images': images,
+        })
+    return jobs
+
+def load_batch_journal(journal_path):
+    """
+    Return the ids of rows already generated successfully by an earlier run
+    """
+    completed = set()
+    if not os.path.exists(journal_path):
+        return completed
+    
+    with open(journal_path, encoding='utf-8') as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a half-written last line
+                continue
+            if record.get('success'):
+                completed.add(record.get('id'))
+    return completed
+
+def _failed_batch_result(job, error):
+    return {'id': job['id'], 'success': False, 'output': job['output'], 'error': error, 'duration_ms': 0}
+
+def _iter_batch_results(pending, workers):
+    """
+    Run batch jobs and yield (job, result) pairs as they finish
+    With more than one worker the jobs are spread over a forked process pool that
+    shares the parent's compiled templates copy-on-write; at most two jobs per
+    worker are queued at any time so large manifests are not loaded into the pool.
+    If a worker dies (killed, out of memory) the rows in flight are reported as
+    failed and the remaining rows continue on a fresh pool
+    """
+    if workers <= 1:
+        for job in pending:
+            yield job, run_job(job)
+        return
+    
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+    
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        context = multiprocessing.get_context()
+    
+    max_in_flight = workers * 2
+    jobs = iter(pending)
+    requeued = []
+    in_flight = {}
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    
+    def collect(future):
+        job = in_flight.pop(future)
+        try:
+            return job, future.result(), False
+        except BrokenProcessPool:
+            return job, _failed_batch_result(job, "Worker process died (killed or out of memory)"), True
+        except Exception as e:
+            return job, _failed_batch_result(job, f"Worker error: {e}"), False
+    
+    try:
+        while True:
+            broken = False
+            while len(in_flight) < max_in_flight:
+                job = requeued.pop() if requeued else next(jobs, None)
+                if job is None:
+                    break
+                try:
+                    in_flight[executor.submit(run_job, job)] = job
+                except BrokenProcessPool:
+                    # Never started, so it runs again on the next pool
+                    requeued.append(job)
+                    broken = True
+                    break
+            if not in_flight and not requeued:
+                return
+            
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, result, died = collect(future)
+                broken = broken or died
+                yield job, result
+            
+            if broken:
+                # Every job still in the broken pool fails the same way
+                for future in wait(in_flight).done:
+                    job, result, _ = collect(future)
+                    yield job, result
+                log.warning("⚠️ A batch worker process died; continuing on a new pool")
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def run_batch(template_path, manifest_path, output_dir, journal_path=None, workers=1):
+    """
+    Generate every proposal in a manifest from a single template load
+    Successful rows are recorded in a journal file so that rerunning the same
+    command after a crash resumes with the rows that are still missing
+    Args:
+        template_path: Path to PowerPoint template
+        manifest_path: Path to JSONL or CSV manifest
+        output_dir: Directory for generated proposals
+        journal_path: Resume journal (defaults to <manifest>.journal.jsonl)
+        workers: Number of worker processes to spread rows across
+    Returns:
+        Tuple of (succeeded, failed, skipped) row counts
+    """
+    journal_path = journal_path or f'{manifest_path}.journal.jsonl'
+    os.makedirs(output_dir, exist_ok=True)
+    
+    jobs = load_manifest(manifest_path, template_path, output_dir)
+    completed = load_batch_journal(journal_path)
+    pending = [job for job in jobs if job['id'] not in completed]
+    skipped = len(jobs) - len(pending)
+    
+    log.info("📦 Batch manifest: %d rows, %d already done, %d to generate", len(jobs), skipped, len(pending))
+    if skipped:
+        log.info("↩️ Resuming from journal %s", journal_path)
+    
+    # Parse the template once up front; every row (and every forked worker)
+    # reuses the compiled index
+    compile_template(template_path)
+    if workers > 1:
+        log.info("⚙️ Generating with %d worker processes", workers)
+    
+    succeeded = 0
+    failed = 0
+    started = time.perf_counter()
+    
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        for job, result in _iter_batch_results(pending, workers):
+            result['row'] = job['row']
+            
+            journal.write(json.dumps(result) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+            
+            if result['success']:
+                succeeded += 1
+                log.info("✅ [row %s/%d] %s (%s ms)", job['row'], len(jobs), job['output'], result['duration_ms'])
+            else:
+                failed += 1
+                log.error("❌ [row %s/%d] %s: %s", job['row'], len(jobs), job['output'], result['error'])
+    
+    elapsed = time.perf_counter() - started
+    throughput = (succeeded + failed) / elapsed if elapsed > 0 else 0.0
+    log.info("📊 Batch finished in %.1fs: %d succeeded, %d failed, %d skipped", elapsed, succeeded, failed, skipped)
+    log.info("⚡ Throughput: %.2f proposals/sec", throughput)
+    return succeeded, failed, skipped
+
+def _init_serve_worker(template_paths, progress_queue):
+    """
+    Worker process initializer for --serve mode
+    Keeps stdout free for result records and makes sure templates are compiled
+    """
+    global _progress_queue
+    _progress_queue = progress_queue
+    sys.stdout = sys.stderr
+    for template_path in template_paths:
+        compile_template(template_path)
+
+def serve(template_paths, workers, socket_path=None):
+    """
+    Run as a long-lived worker: accept JSON-lines jobs and answer each with one
+    JSON-lines result record
+    Args:
+        template_paths: Templates to compile before accepting jobs
+        workers: Number of worker processes
+        socket_path: Unix socket to listen on, or None to use stdin/stdout
+    """
+    import itertools
+    import multiprocessing
+    import signal
+    import socketserver
+    import threading
+    
+    # Compile in the parent so forked workers inherit the parsed templates
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    for template_path in list(template_paths):
+        if not os.path.exists(template_path):
+            log.warning("⚠️ Template file not found, not preloading: %s", template_path)
+            template_paths.remove(template_path)
+            continue
+        compile_template(template_path)
+    
+    progress_queue = multiprocessing.Queue()
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_serve_worker, initargs=(template_paths, progress_queue))
+    log.info("🚀 Proposal worker ready with %d worker process(es)", workers)
+    
+    # Shut down cleanly (closing the pool and socket) when the parent process stops us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Progress and result records are routed back to the stream their job came in on
+    relays = {}
+    relay_keys = itertools.count()
+    
+    def relay_records():
+        while True:
+            relay_key, record, final = progress_queue.get()
+            # Whoever pops the relay answers the job: its result here, or failed() below
+            emit = relays.pop(relay_key, None) if final else relays.get(relay_key)
+            if emit is not None:
+                emit(record, final=final)
+    
+    threading.Thread(target=relay_records, name='record-relay', daemon=True).start()
+    
+    def submit(line, emit):
+        if line.strip():
+            relay_key = next(relay_keys)
+            relays[relay_key] = emit
+            
+            # A job that dies in the pool must still be answered, or its caller waits forever
+            def failed(error):
+                if relays.pop(relay_key, None) is not None:
+                    emit({'id': job_line_id(line), 'success': False, 'output': None,
+                          'error': f"Worker error: {error}", 'duration_ms': 0})
+            
+            pool.apply_async(serve_job_line, (line, relay_key), error_callback=failed)
+    
+    try:
+        if socket_path:
+            class JobStreamHandler(socketserver.StreamRequestHandler):
+                def handle(self):
+                    write_lock = threading.Lock()
+                    outstanding = threading.Semaphore(0)
+                    submitted = 0
+                    
+                    def emit(record, final=True):
+                        with write_lock:
+                            try:
+                                self.wfile.write((json.dumps(record) + '\n').encode('utf-8'))
+                                self.wfile.flush()
+                            except OSError:
+                                pass
+                        if final:
+                            outstanding.release()
+                    
+                    for raw_line in self.rfile:
+                        line = raw_line.decode('utf-8')
+                        if line.strip():
+                            submitted += 1
+                            submit(line, emit)
+                    
+                    # Keep the connection open until every job on it has answered
+                    for _ in range(submitted):
+                        outstanding.acquire()
+            
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = socketserver.ThreadingUnixStreamServer(socket_path, JobStreamHandler)
+            log.info("🔌 Listening for jobs on %s", socket_path)
+            try:
+                server.serve_forever()
+            finally:
+                server.server_close()
+                os.unlink(socket_path)
+        else:
+            write_lock = threading.Lock()
+            
+            def emit(record, final=True):
+                with write_lock:
+                    real_stdout.write(json.dumps(record) + '\n')
+                    real_stdout.flush()
+            
+            for line in sys.stdin:
+                submit(line, emit)
+    except KeyboardInterrupt:
+        log.info("🔥 Proposal worker stopped by user")
+    finally:
+        pool.close()
+        pool.join()
+        sys.stdout = real_stdout
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate PowerPoint proposal from template and form data')
+    parser.add_argument('--template', help='Path to PowerPoint template file')
+    parser.add_argument('--output', help='Path for output PowerPoint file')
+    parser.add_argument('--data', help='JSON string containing form data')
+    parser.add_argument('--msb-image', help='Path to MSB image file (optional)', dest='msb_image')
+    parser.add_argument('--mccb-image', help='Path to MCCB image file (optional)', dest='mccb_image')
+    parser.add_argument('--tpsld-image', help='Path to TP_SLD image file (optional)', dest='tpsld_image')
+    parser.add_argument('--tpmccbcompartment-image', help='Path to TP_MCCB_COMPARTMENT image file (optional)', dest='tpmccbcompartment_image')
+    parser.add_argument('--tptappingloc-image', help='Path to TP_TAPPING_LOC image file (optional)', dest='tptappingloc_image')
+    parser.add_argument('--tprouting1-image', help='Path to TP_ROUTING_1 image file (optional)', dest='tprouting1_image')
+    parser.add_argument('--tprouting2-image', help='Path to TP_ROUTING_2 image file (optional)', dest='tprouting2_image')
+    parser.add_argument('--tprouting3-image', help='Path to TP_ROUTING_3 image file (optional)', dest='tprouting3_image')
+    # Keep legacy --image argument for backward compatibility
+    parser.add_argument('--image', help='Path to image file (legacy, maps to MSB image)', dest='legacy_image')
+    parser.add_argument('--image-workers', type=int, help='Threads used to prepare placeholder images (default: PROPOSAL_IMAGE_WORKERS or CPU count, max 8)', dest='image_workers')
+    # Long-lived worker mode
+    parser.add_argument('--serve', action='store_true', help='Run as a persistent worker reading JSON-lines jobs from stdin (or --socket)')
+    parser.add_argument('--socket', help='Unix socket path to accept jobs on in --serve mode')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Number of worker processes in --serve and --batch mode')
+    # Batch mode
+    parser.add_argument('--batch', help='JSONL or CSV manifest of proposals to generate from one template load')
+    parser.add_argument('--output-dir', help='Directory for proposals generated in --batch mode', dest='output_dir')
+    parser.add_argument('--journal', help='Resume journal for --batch mode (default: <manifest>.journal.jsonl)')
+    # Logging
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], dest='log_level',
+                        help='Log verbosity (default: PROPOSAL_LOG_LEVEL or info)')
+    parser.add_argument('--log-format', choices=['text', 'json'], dest='log_format',
+                        help='Log output format (default: PROPOSAL_LOG_FORMAT or text)')
+    parser.add_argument('--timings', help='Write the time spent in each generation stage to this JSON file')
+    parser.add_argument('--profile-memory', nargs='?', const='', metavar='OUT.json', dest='profile_memory',
+                        help='Trace peak memory and top allocation sites per stage (slow); optionally write them to OUT.json')
+    
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.log_format)
+    
+    if args.serve:
+        serve([args.template] if args.template else [], max(1, args.workers), args.socket)
+        sys.exit(0)
+    
+    if args.batch:
+        if not (args.template and args.output_dir):
+            parser.error('--batch requires --template and --output-dir')
+        if not os.path.exists(args.template):
+            log.error("❌ Template file not found: %s", args.template)
+            sys.exit(1)
+        succeeded, failed, skipped = run_batch(args.template, args.batch, args.output_dir, args.journal, max(1, args.workers))
+        sys.exit(1 if failed else 0)
+    
+    if not (args.template and args.output and args.data):
+        parser.error('--template, --output and --data are required unless --serve is given')
+    
+    # Handle legacy image argument (backward compatibility)
+    job = {
+        'template': args.template,
+        'output': args.output,
+        'data': args.data,
+        'images': {
+            'msb': args.msb_image or args.legacy_image,
+            'mccb': args.mccb_image,
+            'tpsld': args.tpsld_image,
+            'tpmccbcompartment': args.tpmccbcompartment_image,
+            'tptappingloc': args.tptappingloc_image,
+            'tprouting1': args.tprouting1_image,
+            'tprouting2': args.tprouting2_image,
+            'tprouting3': args.tprouting3_image,
+        },
+        'image_workers': args.image_workers,
+        'profile_memory': args.profile_memory is not None,
+    }
+    
+    result = run_job(job)
+    
+    if args.timings and result.get('timings'):
+        with open(args.timings, 'w', encoding='utf-8') as timings_file:
+            json.dump(result['timings'], timings_file, indent=2)
+        log.info("⏱️ Stage timings written to %s", args.timings)
+    
+    if result.get('memory'):
+        log_memory_report(result['memory'])
+        if args.profile_memory:
+            with open(args.profile_memory, 'w', encoding='utf-8') as profile_file:
+                json.dump(result['memory'], profile_file, indent=2)
+            log.info("🧠 Memory profile written to %s", args.profile_memory)
+    
+    if result['success']:
+        log.info("🎉 Proposal generation completed successfully!")
+        sys.exit(0)
+    else:
+        log.error("❌ Proposal generation failed!")
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Whole-proposal result cache
+When the template bytes, form data and image contents are identical to an
+earlier generation, the stored .pptx is copied to the output path instead of
+rebuilding the presentation from scratch
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from image_pipeline import pipeline_settings
+from proposal_log import get_logger
+from template_index import on_template_compiled
+
+log = get_logger('result_cache')
+
+# Bump when engine output changes so stale artifacts are never served
+RESULT_CACHE_VERSION = 4
+
+# Cache configuration (0 MB disables the cache)
+RESULT_CACHE_MB = float(os.environ.get('PROPOSAL_RESULT_CACHE_MB', '256'))
+RESULT_CACHE_MAX_AGE_HOURS = float(os.environ.get('PROPOSAL_RESULT_CACHE_MAX_AGE_HOURS', '24'))
+RESULT_CACHE_DIR = os.environ.get(
+    'PROPOSAL_RESULT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.result_cache')
+)
+
+
+def hash_image_input(image):
+    """
+    SHA-256 of an image input given as a path, bytes, file-like object or
+    source_crop() dictionary
+    """
+    if not image:
+        return None
+    if isinstance(image, dict):
+        crop_json = json.dumps(image['crop'], sort_keys=True)
+        return hashlib.sha256(image['source_bytes'] + crop_json.encode('utf-8')).hexdigest()
+    if isinstance(image, (bytes, bytearray)):
+        return hashlib.sha256(image).hexdigest()
+    if isinstance(image, str):
+        digest = hashlib.sha256()
+        with open(image, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    if hasattr(image, 'getbuffer'):
+        return hashlib.sha256(image.getbuffer()).hexdigest()
+    position = image.tell()
+    image.seek(0)
+    digest = hashlib.sha256(image.read()).hexdigest()
+    image.seek(position)
+    return digest
+
+
+class ResultCache:
+    """
+    Disk-backed store of generated proposals, bounded by total bytes and age
+
+    Artifacts live under <cache_dir>/<template digest>/<input digest>.pptx so
+    every result built from one version of a template can be dropped at once.
+    """
+
+    def __init__(self, cache_dir, max_bytes, max_age_seconds):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._templates_path = os.path.join(cache_dir, 'templates.json')
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(template_digest, engine, form_data, images):
+        """
+        Canonical digest of everything that determines a generated proposal
+        Args:
+            template_digest: SHA-256 of the template bytes
+            engine: Name of the generating function
+            form_data: Form data dictionary
+            images: Dictionary of placeholder name -> image input (path, bytes or stream)
+        Returns:
+            Hex digest identifying the output
+        """
+        canonical = json.dumps({
+            'version': RESULT_CACHE_VERSION,
+            'template': template_digest,
+            'engine': engine,
+            'form_data': form_data,
+            'images': {name: hash_image_input(image) for name, image in images.items()},
+            'image_settings': pipeline_settings(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _artifact_path(self, template_digest, key):
+        return os.path.join(self.cache_dir, template_digest, f'{key}.pptx')
+
+    def fetch(self, template_digest, key, output_path):
+        """
+        Copy a cached artifact to output_path
+        Returns:
+            True on a hit, False if the result has to be generated
+        """
+        artifact_path = self._artifact_path(template_digest, key)
+        try:
+            if time.time() - os.path.getmtime(artifact_path) > self.max_age_seconds:
+                os.unlink(artifact_path)
+                raise FileNotFoundError(artifact_path)
+            shutil.copyfile(artifact_path, output_path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, template_digest, key, output_path):
+        """
+        Keep a copy of a freshly generated proposal
+        """
+        artifact_path = self._artifact_path(template_digest, key)
+        try:
+            os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+            temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(artifact_path), suffix='.tmp')
+            os.close(temp_fd)
+            shutil.copyfile(output_path, temp_path)
+            os.replace(temp_path, artifact_path)
+        except OSError as e:
+            log.warning("⚠️ Could not store result cache entry: %s", e)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Drop expired artifacts, then the oldest ones until under the byte budget
+        """
+        now = time.time()
+        entries = []
+        with self._lock:
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith('.pptx'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if now - stat.st_mtime > self.max_age_seconds:
+                        self._unlink(path)
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                self._unlink(path)
+                total_bytes -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def invalidate_template(self, template_digest):
+        """
+        Remove every artifact generated from one version of a template
+        """
+        shutil.rmtree(os.path.join(self.cache_dir, template_digest), ignore_errors=True)
+
+    def template_compiled(self, template_path, digest):
+        """
+        Template listener: when a template path now has different bytes than the
+        last time it was seen, drop the results built from the old version
+        """
+        with self._lock:
+            try:
+                with open(self._templates_path, encoding='utf-8') as templates_file:
+                    known = json.load(templates_file)
+            except (OSError, ValueError):
+                known = {}
+
+            previous = known.get(template_path)
+            if previous == digest:
+                return
+
+            known[template_path] = digest
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self._templates_path, 'w', encoding='utf-8') as templates_file:
+                    json.dump(known, templates_file)
+            except OSError as e:
+                log.warning("⚠️ Could not record template digest: %s", e)
+
+        if previous and previous not in known.values():
+            log.info("🧹 Template changed, invalidating cached results for %s", template_path)
+            self.invalidate_template(previous)
+
+    def stats(self):
+        """
+        Hit/miss counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Return the process-wide result cache, or None if it is disabled
+    """
+    global _result_cache
+    if RESULT_CACHE_MB <= 0:
+        return None
+
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                RESULT_CACHE_DIR,
+                max_bytes=int(RESULT_CACHE_MB * 1024 * 1024),
+                max_age_seconds=RESULT_CACHE_MAX_AGE_HOURS * 3600,
+            )
+            on_template_compiled(_result_cache.template_compiled)
+        return _result_cache
@@ -3,6 +3,7 @@ const multer = require('multer');
 const path = require('path');
 const fs = require('fs').promises;
 const { spawn } = require('child_process');
+const crypto = require('crypto');
 const cors = require('cors');
 
 const app = express();
@@ -38,20 +39,236 @@ const storage = multer.diskStorage({
     }
 });
 
-const upload = multer({ 
+// Image parts accepted as binary multipart uploads by /api/generate-proposal; the
+// same names are accepted as base64 data URL fields in JSON bodies for compatibility
+const IMAGE_UPLOAD_FIELDS = [
+    'imageData',
+    'mccbImageData',
+    'tpsldImageData',
+    'tpmccbcompartmentImageData',
+    'tptappinglocImageData',
+    'tprouting1ImageData',
+    'tprouting2ImageData',
+    'tprouting3ImageData'
+];
+
+// Unedited originals are sent as-is, so phone photos must fit; this matches the
+// 50MB JSON body limit the images had before they moved to multipart
+const IMAGE_UPLOAD_MAX_MB = parseInt(process.env.IMAGE_UPLOAD_MAX_MB || '50', 10);
+
+const imageUpload = multer({
     storage: storage,
     limits: {
-        fileSize: 10 * 1024 * 1024 // 10MB limit
+        fileSize: IMAGE_UPLOAD_MAX_MB * 1024 * 1024,
+        // Data URL fallbacks can also arrive as multipart text fields
+        fieldSize: IMAGE_UPLOAD_MAX_MB * 1024 * 1024
+    }
+});
+
+// Persistent Python worker (proposal_processor.py --serve) shared by all requests,
+// so the interpreter, imports and parsed template survive between proposals
+const PYTHON_WORKERS = parseInt(process.env.PYTHON_WORKERS || '2', 10);
+// A job without a result record by then is failed, so requests never hang on the worker
+const PYTHON_JOB_TIMEOUT_MS = parseInt(process.env.PYTHON_JOB_TIMEOUT_SECONDS || '300', 10) * 1000;
+let pythonWorker = null;
+let nextJobId = 1;
+const pendingJobs = new Map();
+
+const failPendingJobs = (error) => {
+    for (const pending of pendingJobs.values()) {
+        clearTimeout(pending.timer);
+        pending.reject(error);
+    }
+    pendingJobs.clear();
+};
+
+const getPythonWorker = () => {
+    if (pythonWorker) {
+        return pythonWorker;
     }
+
+    console.log(`🐍 Starting Python worker with ${PYTHON_WORKERS} process(es)...`);
+    const worker = spawn('python3', [
+        'proposal_processor.py',
+        '--serve',
+        '--template', path.join(__dirname, 'TP_Template.pptx'),
+        '--workers', String(PYTHON_WORKERS)
+    ], {
+        cwd: __dirname,
+        stdio: ['pipe', 'pipe', 'pipe']
+    });
+
+    // stdout carries one JSON result record per line
+    let buffered = '';
+    worker.stdout.on('data', (data) => {
+        buffered += data.toString();
+        let newlineIndex;
+        while ((newlineIndex = buffered.indexOf('\n')) >= 0) {
+            const line = buffered.slice(0, newlineIndex).trim();
+            buffered = buffered.slice(newlineIndex + 1);
+            if (!line) {
+                continue;
+            }
+
+            let result;
+            try {
+                result = JSON.parse(line);
+            } catch (error) {
+                console.warn('⚠️ Unexpected Python worker output:', line);
+                continue;
+            }
+
+            const pending = pendingJobs.get(result.id);
+            if (!pending) {
+                continue;
+            }
+
+            // Progress records arrive while the job runs; the result record ends it
+            if (result.progress) {
+                if (pending.onProgress) {
+                    pending.onProgress(result.progress);
+                }
+                continue;
+            }
+            clearTimeout(pending.timer);
+            pendingJobs.delete(result.id);
+            pending.resolve(result);
+        }
+    });
+
+    // stderr carries the engine's log output
+    worker.stderr.on('data', (data) => {
+        process.stdout.write(data);
+    });
+
+    worker.on('exit', (code) => {
+        console.warn(`⚠️ Python worker exited with code ${code}`);
+        if (pythonWorker === worker) {
+            pythonWorker = null;
+        }
+        failPendingJobs(new Error(`Python worker exited with code ${code}`));
+    });
+
+    worker.on('error', (error) => {
+        console.error('❌ Python worker error:', error);
+        if (pythonWorker === worker) {
+            pythonWorker = null;
+        }
+        failPendingJobs(error);
+    });
+
+    pythonWorker = worker;
+    return worker;
+};
+
+// onProgress, when given, receives the engine's progress events (see progress_events.py)
+const submitProposalJob = (job, onProgress) => new Promise((resolve, reject) => {
+    const worker = getPythonWorker();
+    const id = String(nextJobId++);
+    const timer = setTimeout(() => {
+        // A late result record finds no pending entry and is ignored
+        pendingJobs.delete(id);
+        reject(new Error(`Python job ${id} timed out after ${PYTHON_JOB_TIMEOUT_MS / 1000}s`));
+    }, PYTHON_JOB_TIMEOUT_MS);
+    pendingJobs.set(id, { resolve, reject, onProgress, timer });
+    worker.stdin.write(JSON.stringify({ ...job, id, progress: Boolean(onProgress) }) + '\n');
 });
 
+// Images uploaded ahead of the form submission via /api/prepare-image: the worker
+// resizes them into the shared image cache straight away, and the generate request
+// refers to them by handle (<field>Handle) instead of sending the bytes again
+const PREPARED_IMAGE_TTL_MS = parseInt(process.env.PREPARED_IMAGE_TTL_SECONDS || '900', 10) * 1000;
+const preparedImages = new Map();
+
+const IMAGE_FIELD_KEYS = {
+    imageData: 'msb',
+    mccbImageData: 'mccb',
+    tpsldImageData: 'tpsld',
+    tpmccbcompartmentImageData: 'tpmccbcompartment',
+    tptappinglocImageData: 'tptappingloc',
+    tprouting1ImageData: 'tprouting1',
+    tprouting2ImageData: 'tprouting2',
+    tprouting3ImageData: 'tprouting3'
+};
+
+// Claim a prepared image for a generate request; the request then owns (and removes) the file
+const takePreparedImage = async (handle, field) => {
+    const prepared = handle ? preparedImages.get(handle) : null;
+    if (!prepared || prepared.field !== field) {
+        return null;
+    }
+    preparedImages.delete(handle);
+    await prepared.ready;
+    console.log(`⚡ ${field} was prepared ahead of the request (${prepared.state})`);
+    return prepared.path;
+};
+
+// Drop prepared images that were never used by a generate request
+setInterval(async () => {
+    const now = Date.now();
+    for (const [handle, prepared] of preparedImages) {
+        if (prepared.state !== 'pending' && now - prepared.created > PREPARED_IMAGE_TTL_MS) {
+            preparedImages.delete(handle);
+            try {
+                await fs.unlink(prepared.path);
+            } catch (cleanupError) {
+                console.warn('⚠️ Could not clean up expired prepared image:', cleanupError);
+            }
+        }
+    }
+}, 60 * 1000).unref();
+
 // Serve the main HTML file
 app.get('/', (req, res) => {
     res.sendFile(path.join(__dirname, 'index.html'));
 });
 
+// Prepare images as soon as the user has finished editing them
+app.post('/api/prepare-image', imageUpload.fields(IMAGE_UPLOAD_FIELDS.map(name => ({ name, maxCount: 1 }))), (req, res) => {
+    const templatePath = path.join(__dirname, 'TP_Template.pptx');
+    const handles = {};
+
+    for (const [field, files] of Object.entries(req.files || {})) {
+        const handle = crypto.randomUUID();
+        const prepared = {
+            field,
+            path: path.resolve(files[0].path),
+            created: Date.now(),
+            state: 'pending'
+        };
+        // A failed preparation only means the generate job resizes the image itself
+        prepared.ready = submitProposalJob({
+            prepare: true,
+            template: templatePath,
+            images: { [IMAGE_FIELD_KEYS[field]]: prepared.path }
+        }).then(
+            (result) => { prepared.state = result.success ? 'ready' : 'failed'; },
+            () => { prepared.state = 'failed'; }
+        );
+        preparedImages.set(handle, prepared);
+        handles[field] = handle;
+        console.log(`⏳ Preparing ${field} in the background (${handle})`);
+    }
+
+    if (Object.keys(handles).length === 0) {
+        return res.status(400).json({
+            success: false,
+            message: 'No image provided'
+        });
+    }
+    res.status(202).json({ success: true, handles });
+});
+
+app.get('/api/prepare-image/:handle', (req, res) => {
+    const prepared = preparedImages.get(req.params.handle);
+    if (!prepared) {
+        return res.status(404).json({ handle: req.params.handle, state: 'unknown' });
+    }
+    res.json({ handle: req.params.handle, field: prepared.field, state: prepared.state });
+});
+
 // Generate proposal endpoint
-app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
+app.post('/api/generate-proposal', imageUpload.fields(IMAGE_UPLOAD_FIELDS.map(name => ({ name, maxCount: 1 }))), async (req, res) => {
     try {
         console.log('📝 Processing proposal generation request...');
         
@@ -128,17 +345,28 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         };
 
         // Save image data if provided
-        let msbImagePath = null;
-        let mccbImagePath = null;
-        let tpsldImagePath = null;
-        let tpmccbcompartmentImagePath = null;
-        let tptappinglocImagePath = null;
-        let tprouting1ImagePath = null;
-        let tprouting2ImagePath = null;
-        let tprouting3ImagePath = null;
+        // Binary multipart parts were already streamed to temp_images by multer, and
+        // images sent earlier to /api/prepare-image are referenced by <field>Handle;
+        // base64 data URL fields are only decoded when neither was sent
+        const uploadedImagePath = async (field) => {
+            if (req.files && req.files[field]) {
+                return path.resolve(req.files[field][0].path);
+            }
+            return takePreparedImage(req.body[`${field}Handle`], field);
+        };
+        let msbImagePath = await uploadedImagePath('imageData');
+        let mccbImagePath = await uploadedImagePath('mccbImageData');
+        let tpsldImagePath = await uploadedImagePath('tpsldImageData');
+        let tpmccbcompartmentImagePath = await uploadedImagePath('tpmccbcompartmentImageData');
+        let tptappinglocImagePath = await uploadedImagePath('tptappinglocImageData');
+        let tprouting1ImagePath = await uploadedImagePath('tprouting1ImageData');
+        let tprouting2ImagePath = await uploadedImagePath('tprouting2ImageData');
+        let tprouting3ImagePath = await uploadedImagePath('tprouting3ImageData');
         
         // Process MSB image
-        if (imageData && imageData.startsWith('data:image/')) {
+        if (msbImagePath) {
+            console.log('✅ MSB image received as binary upload:', msbImagePath);
+        } else if (imageData && imageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing MSB image data...');
                 console.log('📊 MSB Image data length:', imageData.length);
@@ -171,7 +399,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
         
         // Process MCCB image
-        if (mccbImageData && mccbImageData.startsWith('data:image/')) {
+        if (mccbImagePath) {
+            console.log('✅ MCCB image received as binary upload:', mccbImagePath);
+        } else if (mccbImageData && mccbImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing MCCB image data...');
                 console.log('📊 MCCB Image data length:', mccbImageData.length);
@@ -204,7 +434,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
         
         // Process TP_SLD image
-        if (tpsldImageData && tpsldImageData.startsWith('data:image/')) {
+        if (tpsldImagePath) {
+            console.log('✅ TP_SLD image received as binary upload:', tpsldImagePath);
+        } else if (tpsldImageData && tpsldImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing TP_SLD image data...');
                 console.log('📊 TP_SLD Image data length:', tpsldImageData.length);
@@ -237,7 +469,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
         
         // Process TP_MCCB_COMPARTMENT image
-        if (tpmccbcompartmentImageData && tpmccbcompartmentImageData.startsWith('data:image/')) {
+        if (tpmccbcompartmentImagePath) {
+            console.log('✅ TP_MCCB_COMPARTMENT image received as binary upload:', tpmccbcompartmentImagePath);
+        } else if (tpmccbcompartmentImageData && tpmccbcompartmentImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing TP_MCCB_COMPARTMENT image data...');
                 console.log('📊 TP_MCCB_COMPARTMENT Image data length:', tpmccbcompartmentImageData.length);
@@ -270,7 +504,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
         
         // Process TP_TAPPING_LOC image
-        if (tptappinglocImageData && tptappinglocImageData.startsWith('data:image/')) {
+        if (tptappinglocImagePath) {
+            console.log('✅ TP_TAPPING_LOC image received as binary upload:', tptappinglocImagePath);
+        } else if (tptappinglocImageData && tptappinglocImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing TP_TAPPING_LOC image data...');
                 console.log('📊 TP_TAPPING_LOC Image data length:', tptappinglocImageData.length);
@@ -303,7 +539,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
 
         // Process TP_ROUTING_1 image
-        if (tprouting1ImageData && tprouting1ImageData.startsWith('data:image/')) {
+        if (tprouting1ImagePath) {
+            console.log('✅ TP_ROUTING_1 image received as binary upload:', tprouting1ImagePath);
+        } else if (tprouting1ImageData && tprouting1ImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing TP_ROUTING_1 image data...');
                 console.log('📊 TP_ROUTING_1 Image data length:', tprouting1ImageData.length);
@@ -336,7 +574,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
 
         // Process TP_ROUTING_2 image
-        if (tprouting2ImageData && tprouting2ImageData.startsWith('data:image/')) {
+        if (tprouting2ImagePath) {
+            console.log('✅ TP_ROUTING_2 image received as binary upload:', tprouting2ImagePath);
+        } else if (tprouting2ImageData && tprouting2ImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing TP_ROUTING_2 image data...');
                 console.log('📊 TP_ROUTING_2 Image data length:', tprouting2ImageData.length);
@@ -369,7 +609,9 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         }
 
         // Process TP_ROUTING_3 image
-        if (tprouting3ImageData && tprouting3ImageData.startsWith('data:image/')) {
+        if (tprouting3ImagePath) {
+            console.log('✅ TP_ROUTING_3 image received as binary upload:', tprouting3ImagePath);
+        } else if (tprouting3ImageData && tprouting3ImageData.startsWith('data:image/')) {
             try {
                 console.log('🖼️ Processing TP_ROUTING_3 image data...');
                 console.log('📊 TP_ROUTING_3 Image data length:', tprouting3ImageData.length);
@@ -407,179 +649,171 @@ app.post('/api/generate-proposal', upload.single('image'), async (req, res) => {
         const outputFilename = `${safeClientName}_${timestamp}.pptx`;
         const outputPath = path.join(__dirname, 'generated_proposals', outputFilename);
 
-        // Call Python script to generate PowerPoint
-        console.log('🐍 Calling Python script to generate proposal...');
+        // Hand the job to the persistent Python worker to generate PowerPoint
+        console.log('🐍 Sending proposal job to Python worker...');
         
-        const pythonArgs = [
-            'proposal_processor.py',
-            '--template', templatePath,
-            '--output', outputPath,
-            '--data', JSON.stringify(proposalData)
-        ];
+        const job = {
+            template: templatePath,
+            output: outputPath,
+            data: proposalData,
+            images: {
+                msb: msbImagePath,
+                mccb: mccbImagePath,
+                tpsld: tpsldImagePath,
+                tpmccbcompartment: tpmccbcompartmentImagePath,
+                tptappingloc: tptappinglocImagePath,
+                tprouting1: tprouting1ImagePath,
+                tprouting2: tprouting2ImagePath,
+                tprouting3: tprouting3ImagePath
+            }
+        };
 
-        if (msbImagePath) {
-            pythonArgs.push('--msb-image', msbImagePath);
-        }
-        
-        if (mccbImagePath) {
-            pythonArgs.push('--mccb-image', mccbImagePath);
-        }
-        
-        if (tpsldImagePath) {
-            pythonArgs.push('--tpsld-image', tpsldImagePath);
-        }
-        
-        if (tpmccbcompartmentImagePath) {
-            pythonArgs.push('--tpmccbcompartment-image', tpmccbcompartmentImagePath);
-        }
-        
-        if (tptappinglocImagePath) {
-            pythonArgs.push('--tptappingloc-image', tptappinglocImagePath);
-        }
-        
-        if (tprouting1ImagePath) {
-            pythonArgs.push('--tprouting1-image', tprouting1ImagePath);
+        let code;
+        let stderr = '';
+        try {
+            const result = await submitProposalJob(job, (event) => {
+                console.log(`⏱️ [${event.elapsed_ms} ms] ${event.event}`);
+            });
+            code = result.success ? 0 : 1;
+            stderr = result.error || '';
+        } catch (error) {
+            console.error('❌ Python worker error:', error);
+            return res.status(500).json({
+                success: false,
+                message: 'Failed to start Python script. Please ensure Python 3 is installed.'
+            });
         }
-        
-        if (tprouting2ImagePath) {
-            pythonArgs.push('--tprouting2-image', tprouting2ImagePath);
+
+        console.log(`🐍 Python job completed with code: ${code}`);
+        if (stderr) {
+            console.log('⚠️ Python job error:');
+            console.log(stderr);
         }
         
-        if (tprouting3ImagePath) {
-            pythonArgs.push('--tprouting3-image', tprouting3ImagePath);
-        }
-
-        const pythonProcess = spawn('python3', pythonArgs, {
-            cwd: __dirname,
-            stdio: ['pipe', 'pipe', 'pipe']
-        });
-
-        let stdout = '';
-        let stderr = '';
-
-        pythonProcess.stdout.on('data', (data) => {
-            stdout += data.toString();
-        });
-
-        pythonProcess.stderr.on('data', (data) => {
-            stderr += data.toString();
-        });
-
-        pythonProcess.on('close', async (code) => {
-            console.log(`🐍 Python process completed with code: ${code}`);
-            console.log('📝 Python stdout output:');
-            console.log(stdout);
-            if (stderr) {
-                console.log('⚠️ Python stderr output:');
-                console.log(stderr);
+        try {
+            // Clean up temporary image files
+            if (msbImagePath) {
+                try {
+                    await fs.unlink(msbImagePath);
+                    console.log('🗑️ Cleaned up temporary MSB image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary MSB image:', cleanupError);
+                }
             }
             
-            try {
-                // Clean up temporary image files
-                if (msbImagePath) {
-                    try {
-                        await fs.unlink(msbImagePath);
-                        console.log('🗑️ Cleaned up temporary MSB image file');
-                    } catch (cleanupError) {
-                        console.warn('⚠️ Could not clean up temporary MSB image:', cleanupError);
-                    }
+            if (mccbImagePath) {
+                try {
+                    await fs.unlink(mccbImagePath);
+                    console.log('🗑️ Cleaned up temporary MCCB image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary MCCB image:', cleanupError);
                 }
-                
-                if (mccbImagePath) {
-                    try {
-                        await fs.unlink(mccbImagePath);
-                        console.log('🗑️ Cleaned up temporary MCCB image file');
-                    } catch (cleanupError) {
-                        console.warn('⚠️ Could not clean up temporary MCCB image:', cleanupError);
-                    }
+            }
+            
+            if (tpsldImagePath) {
+                try {
+                    await fs.unlink(tpsldImagePath);
+                    console.log('🗑️ Cleaned up temporary TP_SLD image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary TP_SLD image:', cleanupError);
                 }
-                
-                if (tpsldImagePath) {
-                    try {
-                        await fs.unlink(tpsldImagePath);
-                        console.log('🗑️ Cleaned up temporary TP_SLD image file');
-                    } catch (cleanupError) {
-                        console.warn('⚠️ Could not clean up temporary TP_SLD image:', cleanupError);
-                    }
+            }
+            
+            if (tpmccbcompartmentImagePath) {
+                try {
+                    await fs.unlink(tpmccbcompartmentImagePath);
+                    console.log('🗑️ Cleaned up temporary TP_MCCB_COMPARTMENT image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary TP_MCCB_COMPARTMENT image:', cleanupError);
                 }
-                
-                if (tpmccbcompartmentImagePath) {
-                    try {
-                        await fs.unlink(tpmccbcompartmentImagePath);
-                        console.log('🗑️ Cleaned up temporary TP_MCCB_COMPARTMENT image file');
-                    } catch (cleanupError) {
-                        console.warn('⚠️ Could not clean up temporary TP_MCCB_COMPARTMENT image:', cleanupError);
-                    }
+            }
+            
+            if (tptappinglocImagePath) {
+                try {
+                    await fs.unlink(tptappinglocImagePath);
+                    console.log('🗑️ Cleaned up temporary TP_TAPPING_LOC image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary TP_TAPPING_LOC image:', cleanupError);
                 }
-                
-                if (tptappinglocImagePath) {
-                    try {
-                        await fs.unlink(tptappinglocImagePath);
-                        console.log('🗑️ Cleaned up temporary TP_TAPPING_LOC image file');
-                    } catch (cleanupError) {
-                        console.warn('⚠️ Could not clean up temporary TP_TAPPING_LOC image:', cleanupError);
-                    }
+            }
+            
+            if (tprouting1ImagePath) {
+                try {
+                    await fs.unlink(tprouting1ImagePath);
+                    console.log('🗑️ Cleaned up temporary TP_ROUTING_1 image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary TP_ROUTING_1 image:', cleanupError);
                 }
+            }
+            
+            if (tprouting2ImagePath) {
+                try {
+                    await fs.unlink(tprouting2ImagePath);
+                    console.log('🗑️ Cleaned up temporary TP_ROUTING_2 image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary TP_ROUTING_2 image:', cleanupError);
+                }
+            }
+            
+            if (tprouting3ImagePath) {
+                try {
+                    await fs.unlink(tprouting3ImagePath);
+                    console.log('🗑️ Cleaned up temporary TP_ROUTING_3 image file');
+                } catch (cleanupError) {
+                    console.warn('⚠️ Could not clean up temporary TP_ROUTING_3 image:', cleanupError);
+                }
+            }
+
+            if (code === 0) {
+                console.log('✅ Python script completed successfully');
 
-                if (code === 0) {
-                    console.log('✅ Python script completed successfully');
-
-                    // Check if output file was created
-                    try {
-                        await fs.access(outputPath);
-                        const fileStats = await fs.stat(outputPath);
-                        console.log('📁 Output file created successfully');
-                        console.log('📊 Output file size:', fileStats.size, 'bytes');
-                        
-                        // Return file download response
-                        res.setHeader('Content-Disposition', `attachment; filename="${outputFilename}"`);
-                        res.setHeader('Content-Type', 'application/vnd.openxmlformats-officedocument.presentationml.presentation');
-                        
-                        const fileBuffer = await fs.readFile(outputPath);
-                        console.log('📤 Sending file to client');
-                        res.send(fileBuffer);
-                        
-                        // Clean up output file after sending
-                        setTimeout(async () => {
-                            try {
-                                await fs.unlink(outputPath);
-                                console.log('🗑️ Cleaned up output file');
-                            } catch (cleanupError) {
-                                console.warn('⚠️ Could not clean up output file:', cleanupError);
-                            }
-                        }, 5000); // 5 second delay to ensure download completes
-
-                    } catch (error) {
-                        console.error('❌ Output file not found or not accessible:', outputPath);
-                        console.error('File access error:', error);
-                        res.status(500).json({
-                            success: false,
-                            message: 'Proposal generation completed but output file not found'
-                        });
-                    }
-                } else {
-                    console.error('❌ Python script failed with code:', code);
+                // Check if output file was created
+                try {
+                    await fs.access(outputPath);
+                    const fileStats = await fs.stat(outputPath);
+                    console.log('📁 Output file created successfully');
+                    console.log('📊 Output file size:', fileStats.size, 'bytes');
+                    
+                    // Return file download response
+                    res.setHeader('Content-Disposition', `attachment; filename="${outputFilename}"`);
+                    res.setHeader('Content-Type', 'application/vnd.openxmlformats-officedocument.presentationml.presentation');
+                    
+                    const fileBuffer = await fs.readFile(outputPath);
+                    console.log('📤 Sending file to client');
+                    res.send(fileBuffer);
+                    
+                    // Clean up output file after sending
+                    setTimeout(async () => {
+                        try {
+                            await fs.unlink(outputPath);
+                            console.log('🗑️ Cleaned up output file');
+                        } catch (cleanupError) {
+                            console.warn('⚠️ Could not clean up output file:', cleanupError);
+                        }
+                    }, 5000); // 5 second delay to ensure download completes
+
+                } catch (error) {
+                    console.error('❌ Output file not found or not accessible:', outputPath);
+                    console.error('File access error:', error);
                     res.status(500).json({
                         success: false,
-                        message: `Proposal generation failed (code ${code}): ${stderr || 'Unknown error'}`
+                        message: 'Proposal generation completed but output file not found'
                     });
                 }
-            } catch (error) {
-                console.error('❌ Error in Python process completion handler:', error);
+            } else {
+                console.error('❌ Python script failed with code:', code);
                 res.status(500).json({
                     success: false,
-                    message: 'Internal server error during proposal generation'
+                    message: `Proposal generation failed (code ${code}): ${stderr || 'Unknown error'}`
                 });
             }
-        });
-
-        pythonProcess.on('error', (error) => {
-            console.error('❌ Python process error:', error);
+        } catch (error) {
+            console.error('❌ Error in Python process completion handler:', error);
             res.status(500).json({
                 success: false,
-                message: 'Failed to start Python script. Please ensure Python 3 is installed.'
+                message: 'Internal server error during proposal generation'
             });
-        });
+        }
 
     } catch (error) {
         console.error('❌ Unexpected error in proposal generation:', error);
@@ -602,10 +836,10 @@ app.get('/api/health', (req, res) => {
 // Error handling middleware
 app.use((error, req, res, next) => {
     if (error instanceof multer.MulterError) {
-        if (error.code === 'LIMIT_FILE_SIZE') {
+        if (error.code === 'LIMIT_FILE_SIZE' || error.code === 'LIMIT_FIELD_VALUE') {
             return res.status(400).json({
                 success: false,
-                message: 'File too large. Maximum size is 10MB.'
+                message: `Image too large. Maximum size is ${IMAGE_UPLOAD_MAX_MB}MB per image.`
             });
         }
     }
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Compiled template index for the proposal generators
+Scans a PowerPoint template once and records where every placeholder lives,
+so rendering only has to touch the indexed locations
+"""
+
+import hashlib
+import os
+import re
+import threading
+from io import BytesIO
+
+from pptx import Presentation
+
+from package_writer import remember_template_parts
+from proposal_log import get_logger
+
+log = get_logger('template_index')
+
+# Matches any {{...}} text token
+TOKEN_PATTERN = re.compile(r'\{\{[^{}]+\}\}')
+
+# A run or shape whose whole text is one of these is treated as a placeholder
+# by itself (e.g. "{{TP_MSB}}" or the bare "TP_MSB" form)
+STANDALONE_PATTERN = re.compile(r'\{\{[^{}]+\}\}|[A-Z][A-Z0-9_]*')
+
+# Compiled templates keyed by absolute template path
+_compiled_templates = {}
+_compiled_lock = threading.Lock()
+
+# Callbacks run as callback(template_path, digest) whenever a template is (re)compiled
+_template_listeners = []
+
+
+class CompiledTemplate:
+    """
+    Index of every placeholder location in a template
+
+    Locations are stored as slide/shape indexes into the top-level shape tree
+    (plus paragraph/run, or row/column for tables), so they can be resolved
+    against any presentation opened from the same template bytes.
+    """
+
+    def __init__(self, template_path, template_bytes, key):
+        self.path = template_path
+        self.key = key
+        self.template_bytes = template_bytes
+        self.digest = hashlib.sha256(template_bytes).hexdigest()
+        self.slide_count = 0
+        self.slide_partnames = []
+        # Runs containing at least one {{...}} token
+        self.text_runs = []
+        # Table cell runs containing at least one {{...}} token
+        self.table_runs = []
+        # Shape name -> list of shape locations
+        self.named_shapes = {}
+        # Standalone placeholder text -> list of shape locations
+        self.text_shapes = {}
+        # Every {{...}} token seen anywhere in the template
+        self.tokens = set()
+
+        self._scan()
+
+    def _scan(self):
+        """
+        Walk the template once and fill in the index
+        """
+        prs = Presentation(BytesIO(self.template_bytes))
+        self.slide_count = len(prs.slides)
+
+        for slide_idx, slide in enumerate(prs.slides):
+            self.slide_partnames.append(str(slide.part.partname))
+
+            for shape_idx, shape in enumerate(slide.shapes):
+                location = {
+                    'slide': slide_idx,
+                    'shape': shape_idx,
+                    'left': shape.left,
+                    'top': shape.top,
+                    'width': shape.width,
+                    'height': shape.height,
+                }
+
+                if shape.name:
+                    self.named_shapes.setdefault(shape.name, []).append(location)
+
+                if shape.has_text_frame:
+                    self._scan_text_frame(shape.text_frame, location)
+
+                if shape.has_table:
+                    for row_idx, row in enumerate(shape.table.rows):
+                        for col_idx, cell in enumerate(row.cells):
+                            for para_idx, paragraph in enumerate(cell.text_frame.paragraphs):
+                                for run_idx, run in enumerate(paragraph.runs):
+                                    tokens = TOKEN_PATTERN.findall(run.text)
+                                    if tokens:
+                                        self.tokens.update(tokens)
+                                        self.table_runs.append({
+                                            'slide': slide_idx,
+                                            'shape': shape_idx,
+                                            'row': row_idx,
+                                            'col': col_idx,
+                                            'paragraph': para_idx,
+                                            'run': run_idx,
+                                            'tokens': tokens,
+                                        })
+
+    def _scan_text_frame(self, text_frame, location):
+        """
+        Record token runs and standalone placeholder text for one shape
+        """
+        standalone = set()
+
+        for para_idx, paragraph in enumerate(text_frame.paragraphs):
+            for run_idx, run in enumerate(paragraph.runs):
+                stripped = run.text.strip()
+                if STANDALONE_PATTERN.fullmatch(stripped):
+                    standalone.add(stripped)
+
+                tokens = TOKEN_PATTERN.findall(run.text)
+                if tokens:
+                    self.tokens.update(tokens)
+                    self.text_runs.append({
+                        'slide': location['slide'],
+                        'shape': location['shape'],
+                        'paragraph': para_idx,
+                        'run': run_idx,
+                        'tokens': tokens,
+                    })
+
+        shape_text = text_frame.text.strip()
+        if STANDALONE_PATTERN.fullmatch(shape_text):
+            standalone.add(shape_text)
+
+        for text in standalone:
+            self.text_shapes.setdefault(text, []).append(location)
+
+    def open(self):
+        """
+        Open a fresh, independently mutable presentation from the template bytes
+        Its template parts are recorded so save_presentation() can copy the
+        unchanged ones raw
+        """
+        return remember_template_parts(Presentation(BytesIO(self.template_bytes)))
+
+    @staticmethod
+    def resolve_shapes(prs):
+        """
+        Snapshot the top-level shapes of every slide so indexed locations stay
+        valid while shapes are removed or added during rendering
+        """
+        return [list(slide.shapes) for slide in prs.slides]
+
+    def image_locations(self, *names):
+        """
+        Find every shape that acts as an image placeholder for the given names
+        Args:
+            names: Placeholder names, matched against shape names and against
+                   text that consists of nothing but the placeholder
+        Returns:
+            List of location dicts, each shape reported once, in template order
+        """
+        seen = set()
+        locations = []
+        for name in names:
+            for location in self.named_shapes.get(name, []) + self.text_shapes.get(name, []):
+                shape_key = (location['slide'], location['shape'])
+                if shape_key not in seen:
+                    seen.add(shape_key)
+                    locations.append(location)
+        locations.sort(key=lambda loc: (loc['slide'], loc['shape']))
+        return locations
+
+    def iter_runs(self, shapes, skip=()):
+        """
+        Yield (location, run) for every indexed text and table run
+        Args:
+            shapes: Result of resolve_shapes() for the presentation being rendered
+            skip: Set of (slide, shape) keys for shapes removed during rendering
+        """
+        for location in self.text_runs:
+            if (location['slide'], location['shape']) in skip:
+                continue
+            shape = shapes[location['slide']][location['shape']]
+            paragraph = shape.text_frame.paragraphs[location['paragraph']]
+            yield location, paragraph.runs[location['run']]
+
+        for location in self.table_runs:
+            if (location['slide'], location['shape']) in skip:
+                continue
+            shape = shapes[location['slide']][location['shape']]
+            cell = shape.table.cell(location['row'], location['col'])
+            paragraph = cell.text_frame.paragraphs[location['paragraph']]
+            yield location, paragraph.runs[location['run']]
+
+
+def compile_template(template_path):
+    """
+    Return the compiled index for a template, building it only when the
+    template has never been seen or has changed on disk
+    Args:
+        template_path: Path to PowerPoint template
+    Returns:
+        CompiledTemplate instance
+    """
+    abs_path = os.path.abspath(template_path)
+    stat = os.stat(abs_path)
+    key = (abs_path, stat.st_mtime_ns, stat.st_size)
+
+    with _compiled_lock:
+        compiled = _compiled_templates.get(abs_path)
+        if compiled is not None and compiled.key == key:
+            return compiled
+
+        with open(abs_path, 'rb') as template_file:
+            template_bytes = template_file.read()
+
+        # Touched but unchanged templates keep their existing index
+        if compiled is not None and compiled.digest == hashlib.sha256(template_bytes).hexdigest():
+            compiled.key = key
+            return compiled
+
+        compiled = CompiledTemplate(abs_path, template_bytes, key)
+        _compiled_templates[abs_path] = compiled
+        log.info("📚 Compiled template index for %s: %d slides, %d tokens, %d token runs",
+                 abs_path, compiled.slide_count, len(compiled.tokens),
+                 len(compiled.text_runs) + len(compiled.table_runs))
+
+    for callback in list(_template_listeners):
+        try:
+            callback(abs_path, compiled.digest)
+        except Exception as e:
+            log.warning("⚠️ Template listener failed: %s", e)
+    return compiled
+
+
+def on_template_compiled(callback):
+    """
+    Register a callback run as callback(template_path, digest) each time a
+    template is compiled, e.g. to invalidate caches built from an older version
+    """
+    if callback not in _template_listeners:
+        _template_listeners.append(callback)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Single-pass placeholder substitution for the proposal generators
+Every {{TOKEN}} in a piece of text is found by one regex scan and looked up in
+the replacement mapping, so cost grows with the amount of text rather than
+with text size times the number of placeholders
+"""
+
+from collections import Counter
+
+from proposal_log import get_logger
+from template_index import TOKEN_PATTERN
+
+log = get_logger('text_substitution')
+
+
+class PlaceholderSubstituter:
+    """
+    Replace {{TOKEN}} placeholders from a mapping in a single scan per text
+
+    Tokens found in the text but missing from the mapping are left untouched
+    and counted in `unknown_tokens`, unless they are listed in `ignore_tokens`
+    (e.g. image placeholders that are handled elsewhere).
+    """
+
+    def __init__(self, replacements, ignore_tokens=()):
+        self.replacements = dict(replacements)
+        self.ignore_tokens = set(ignore_tokens)
+        self.replaced_tokens = Counter()
+        self.unknown_tokens = Counter()
+
+    def _replace_match(self, match, hits):
+        token = match.group(0)
+        value = self.replacements.get(token)
+        if value is None:
+            if token not in self.ignore_tokens:
+                self.unknown_tokens[token] += 1
+            return token
+        hits.append(token)
+        return value
+
+    def substitute(self, text):
+        """
+        Substitute every known placeholder in text
+        Args:
+            text: Text to process
+        Returns:
+            Tuple of (new_text, list of tokens that were replaced)
+        """
+        if '{{' not in text:
+            return text, []
+
+        hits = []
+        new_text = TOKEN_PATTERN.sub(lambda match: self._replace_match(match, hits), text)
+        self.replaced_tokens.update(hits)
+        return new_text, hits
+
+    def report_unknown(self):
+        """
+        Log the placeholders that were found but had no value
+        """
+        if self.unknown_tokens:
+            log.warning("⚠️ Unknown placeholders left in output: %s",
+                        ", ".join(f"{token} (x{count})" for token, count in sorted(self.unknown_tokens.items())))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store of original image uploads
+Each original is kept once under the SHA-256 of its bytes, so the web form can
+refer to it by ID plus a crop rectangle; resubmitting, regenerating or changing
+a crop sends no image bytes again
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from proposal_log import get_logger
+
+log = get_logger('upload_store')
+
+# Store configuration (0 MB disables the store); named PROPOSAL_UPLOAD_STORE_*
+# like the cache settings, since this is a store of originals rather than a cache
+UPLOAD_STORE_MB = float(os.environ.get('PROPOSAL_UPLOAD_STORE_MB', '1024'))
+UPLOAD_MAX_AGE_HOURS = float(os.environ.get('PROPOSAL_UPLOAD_MAX_AGE_HOURS', '24'))
+UPLOAD_STORE_DIR = os.environ.get(
+    'PROPOSAL_UPLOAD_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'originals')
+)
+
+IMAGE_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadStore:
+    """
+    Disk store of original uploads, bounded by total bytes and age
+    """
+
+    def __init__(self, store_dir, max_bytes, max_age_seconds):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+    def _path(self, image_id):
+        return os.path.join(self.store_dir, image_id[:2], f'{image_id}.bin')
+
+    def put(self, image_bytes):
+        """
+        Store an original upload
+        Args:
+            image_bytes: Encoded image bytes as uploaded
+        Returns:
+            Dictionary with image_id, width, height and bytes
+        Raises:
+            ValueError: If the bytes are not a readable image
+            OSError: If the upload cannot be written to the store
+        """
+        try:
+            with Image.open(BytesIO(image_bytes)) as image:
+                width, height = image.size
+        except Exception as e:
+            raise ValueError(f"Not a readable image: {e}")
+
+        image_id = hashlib.sha256(image_bytes).hexdigest()
+        path = self._path(image_id)
+        if os.path.exists(path):
+            # Uploading the same image again only refreshes its age
+            os.utime(path)
+        else:
+            temp_path = None
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                with os.fdopen(temp_fd, 'wb') as temp_file:
+                    temp_file.write(image_bytes)
+                os.replace(temp_path, path)
+            except OSError as e:
+                # Unlike a cache entry, a client would be handed an ID that does not exist
+                log.error("❌ Could not store upload %s: %s", image_id[:12], e)
+                if temp_path is not None:
+                    self._unlink(temp_path)
+                raise
+            self.evict()
+
+        return {'image_id': image_id, 'width': width, 'height': height, 'bytes': len(image_bytes)}
+
+    def get(self, image_id):
+        """
+        Read an original upload back
+        Returns:
+            The image bytes, or None if the ID is unknown or expired
+        """
+        if not IMAGE_ID_PATTERN.fullmatch(image_id or ''):
+            return None
+
+        path = self._path(image_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                os.unlink(path)
+                return None
+            with open(path, 'rb') as image_file:
+                image_bytes = image_file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return image_bytes
+
+    def contains(self, image_id):
+        """
+        Whether an upload is present, so clients can skip sending it again
+        """
+        if not IMAGE_ID_PATTERN.fullmatch(image_id or ''):
+            return False
+        try:
+            return time.time() - os.path.getmtime(self._path(image_id)) <= self.max_age_seconds
+        except OSError:
+            return False
+
+    def evict(self):
+        """
+        Drop expired uploads, then the least recently used ones until under the byte budget
+        """
+        now = time.time()
+        entries = []
+        expired = evicted = evicted_bytes = 0
+        with self._lock:
+            for root, _, files in os.walk(self.store_dir):
+                for name in files:
+                    if not name.endswith('.bin'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if now - stat.st_mtime > self.max_age_seconds:
+                        self._unlink(path)
+                        expired += 1
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                self._unlink(path)
+                total_bytes -= size
+                evicted += 1
+                evicted_bytes += size
+
+        if expired or evicted:
+            log.info("🗑️ Upload store: dropped %d expired and %d least recently used uploads (%.1f MB)",
+                     expired, evicted, evicted_bytes / 1024 ** 2)
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning("⚠️ Could not remove stored upload %s: %s", path, e)
+
+
+_upload_store = None
+_upload_store_lock = threading.Lock()
+
+
+def get_upload_store():
+    """
+    Return the process-wide upload store, or None if it is disabled
+    """
+    global _upload_store
+    if UPLOAD_STORE_MB <= 0:
+        return None
+
+    with _upload_store_lock:
+        if _upload_store is None:
+            _upload_store = UploadStore(
+                UPLOAD_STORE_DIR,
+                max_bytes=int(UPLOAD_STORE_MB * 1024 * 1024),
+                max_age_seconds=UPLOAD_MAX_AGE_HOURS * 3600,
+            )
+        return _upload_store